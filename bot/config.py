@@ -8,6 +8,43 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bot.db")
 TIMEZONE = os.getenv("TIMEZONE", "UTC")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+# Материализованная таблица доступности мастеров (availability_days)
+# Если включено, выбор времени читает одну строку на день вместо пересчета расписания и записей
+AVAILABILITY_MATERIALIZED = os.getenv("AVAILABILITY_MATERIALIZED", "false").lower() == "true"
+
+# Выбор лидера через таблицу leader_locks при запуске нескольких экземпляров бота
+# Если включено, напоминания обрабатывает только текущий лидер; без него экземпляры
+# делят работу через аренду строк (claimed_by / lease_until)
+LEADER_ELECTION = os.getenv("LEADER_ELECTION", "false").lower() == "true"
+
+# Хранить удержания выбранного времени (до подтверждения записи) в таблице slot_holds,
+# а не в памяти процесса; нужно при нескольких экземплярах бота. При SHARD_WORKERS > 1
+# включается автоматически
+SLOT_HOLDS_SHARED = os.getenv("SLOT_HOLDS_SHARED", "false").lower() == "true"
+
+# Количество процессов-воркеров для обработки обновлений (шардирование по chat id)
+# 0 или 1 - обычный режим в одном процессе
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+
+# Пулы HTTP-соединений к Bot API: прием обновлений, ответы пользователям и фоновые
+# отправки (outbox, напоминания, рассылки) не делят соединения друг с другом
+HTTP_UPDATES_POOL_SIZE = int(os.getenv("HTTP_UPDATES_POOL_SIZE", "2"))
+HTTP_INTERACTIVE_POOL_SIZE = int(os.getenv("HTTP_INTERACTIVE_POOL_SIZE", "32"))
+HTTP_BULK_POOL_SIZE = int(os.getenv("HTTP_BULK_POOL_SIZE", "8"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+# HTTP/2 к Bot API (нужен пакет httpx[http2])
+HTTP2 = os.getenv("HTTP2", "false").lower() == "true"
+
+# Профиль запуска: время импорта модулей и этапов инициализации в логе
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "false").lower() == "true"
+
+# Хранение данных: через сколько завершенные/отмененные записи и отправленные
+# уведомления переносятся в архивные таблицы (0 - не переносить)
+RETENTION_APPOINTMENTS_MONTHS = int(os.getenv("RETENTION_APPOINTMENTS_MONTHS", "12"))
+RETENTION_NOTIFICATIONS_DAYS = int(os.getenv("RETENTION_NOTIFICATIONS_DAYS", "30"))
+
 # Настройки платежей через Telegram Bot Payments
 # Токен провайдера получается от @BotFather в разделе Payments
 # Для FreedomPay KG используется тестовый токен от BotFather
@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine
+import hashlib
+from datetime import datetime
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 from bot.models import Base
 from bot.config import DATABASE_URL
 import logging
@@ -20,6 +22,17 @@ else:
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine для рабочих потоков (asyncio.to_thread). У SQLite через StaticPool
+# одно соединение на процесс, и поток не должен работать с ним, пока его
+# использует цикл событий; поток получает собственное соединение к файлу БД
+_worker_engine = None
+
+# Объекты БД вне моделей, которые создают миграции (индекс поиска, триггеры);
+# версия входит в отпечаток схемы, чтобы после ее изменения миграции выполнились
+EXTRA_SCHEMA_OBJECTS = [
+    "master_search:1",
+]
+
 
 def init_db():
     """Инициализация базы данных"""
@@ -27,6 +40,57 @@ def init_db():
     logger.info("База данных инициализирована")
 
 
+def schema_fingerprint() -> str:
+    """
+    Отпечаток схемы по моделям: таблицы, столбцы, типы и индексы
+    
+    Меняется при любом изменении моделей или EXTRA_SCHEMA_OBJECTS, после
+    которого нужны create_all и миграции.
+    """
+    parts = []
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(f"table:{table.name}")
+        for column in table.columns:
+            parts.append(
+                f"column:{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}:{column.unique}"
+            )
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            columns = ",".join(column.name for column in index.columns)
+            parts.append(f"index:{index.name}:{columns}:{index.unique}")
+    parts.extend(f"extra:{name}" for name in EXTRA_SCHEMA_OBJECTS)
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def is_schema_current() -> bool:
+    """
+    Проверка, что схема БД соответствует моделям
+    
+    Один SELECT по таблице schema_version вместо create_all и рефлексии
+    таблиц в миграциях. Отсутствие таблицы означает, что схема не актуальна.
+    """
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(text("SELECT fingerprint FROM schema_version WHERE id = 1")).first()
+    except Exception:
+        return False
+    return row is not None and row[0] == schema_fingerprint()
+
+
+def store_schema_fingerprint():
+    """Сохранение отпечатка схемы после create_all и миграций"""
+    from bot.models import SchemaVersion
+    
+    db = SessionLocal()
+    try:
+        db.merge(SchemaVersion(id=1, fingerprint=schema_fingerprint(), updated_at=datetime.utcnow()))
+        db.commit()
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить отпечаток схемы БД: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
 def get_db() -> Session:
     """Получение сессии БД"""
     db = SessionLocal()
@@ -36,9 +100,82 @@ def get_db() -> Session:
         db.close()
 
 
+def insert_or_ignore(db: Session, model, values: dict) -> bool:
+    """
+    Вставка строки с игнорированием конфликта уникального ключа
+    
+    Выполняется одним INSERT ... ON CONFLICT DO NOTHING в текущей транзакции.
+    
+    Args:
+        db: Сессия БД
+        model: Модель SQLAlchemy
+        values: Значения столбцов
+    
+    Returns:
+        True если строка вставлена, False если такая уже есть
+    """
+    dialect = db.get_bind().dialect.name
+    
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.exc import IntegrityError
+        try:
+            with db.begin_nested():
+                db.execute(model.__table__.insert().values(**values))
+            return True
+        except IntegrityError:
+            return False
+    
+    result = db.execute(insert(model.__table__).values(**values).on_conflict_do_nothing())
+    return result.rowcount == 1
+
+
 def get_db_session() -> Session:
     """Получение сессии БД без генератора (для прямого использования)"""
     return SessionLocal()
 
 
+def worker_sessions_available() -> bool:
+    """
+    Можно ли работать с БД из отдельного потока
+    
+    Для SQLite в памяти нельзя: база существует только в общем соединении
+    процесса, поэтому такие задачи выполняются в цикле событий.
+    """
+    if not DATABASE_URL.startswith("sqlite"):
+        return True
+    return ":memory:" not in DATABASE_URL and DATABASE_URL.rstrip("/") != "sqlite:"
+
+
+def get_worker_session() -> Session:
+    """
+    Сессия БД для рабочего потока (asyncio.to_thread)
+    
+    Для SQLite открывается отдельное соединение к файлу БД (NullPool), а не
+    общее соединение StaticPool; при занятой записи оно ждет до 30 секунд.
+    Для остальных СУБД пул engine и так выдает потоку свое соединение.
+    
+    Raises:
+        RuntimeError: БД SQLite в памяти (см. worker_sessions_available)
+    """
+    global _worker_engine
+    
+    if not DATABASE_URL.startswith("sqlite"):
+        return SessionLocal()
+    if not worker_sessions_available():
+        raise RuntimeError("SQLite в памяти недоступна из рабочих потоков")
+    
+    if _worker_engine is None:
+        _worker_engine = create_engine(
+            DATABASE_URL,
+            connect_args={"check_same_thread": False, "timeout": 30},
+            poolclass=NullPool,
+            echo=False
+        )
+    return Session(bind=_worker_engine, autoflush=False)
+
+
 
@@ -5,8 +5,12 @@ from sqlalchemy.orm import Session
 from bot.models import User, MasterProfile, Service, Appointment, AppointmentStatus
 from bot.utils.validators import check_appointment_overlap, validate_time_slot
 from bot.utils.calendar import get_month_keyboard, get_time_keyboard, parse_date_from_callback, parse_time_from_callback
-from bot.utils.notifications import schedule_notifications
-from bot.utils.schedule import get_available_time_slots
+from bot.utils.schedule import get_available_start_mask
+from bot.utils.availability import mark_appointment_busy, release_appointment, count_quanta, get_slot_rules
+from bot.utils.holds import HOLD_TTL_SECONDS, place_hold, release_hold
+from bot.utils.i18n import format_datetime, t, user_language
+from bot.utils.outbox import enqueue_message, kick_outbox
+from bot.utils.timezones import MAX_UTC_OFFSET, local_to_utc, master_now, master_timezone
 from bot.utils.telegram_helpers import safe_edit_message_text
 from bot.handlers.common import get_db_from_context
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
@@ -17,6 +21,12 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def _client_id(db: Session, telegram_id: int):
+    """ID пользователя по Telegram ID (None, если он еще не зарегистрирован)"""
+    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    return user.id if user else None
+
+
 async def book_by_link_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начало процесса записи по ссылке"""
     query = update.callback_query
@@ -33,9 +43,128 @@ async def book_by_link_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
     else:
         await update.message.reply_text(message_text)
     
+    context.user_data.pop('waiting_for_search', None)
+    context.user_data.pop('waiting_for_broadcast', None)
     context.user_data['waiting_for_link'] = True
 
 
+async def search_masters_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начало поиска мастера"""
+    query = update.callback_query
+    await query.answer()
+    
+    await query.edit_message_text(
+        "🔎 Поиск мастера\n\n"
+        "Введите название, услугу или слова из описания мастера\n"
+        "(например: маникюр, барбершоп, массаж спины):"
+    )
+    
+    context.user_data.pop('waiting_for_link', None)
+    context.user_data.pop('waiting_for_broadcast', None)
+    context.user_data['waiting_for_search'] = True
+
+
+def _search_results_view(db: Session, search_text: str, page: int):
+    """Текст и клавиатура страницы результатов поиска"""
+    from bot.utils.search import SEARCH_PAGE_SIZE, search_masters
+    
+    masters, has_next = search_masters(db, search_text, page)
+    
+    buttons = []
+    if masters:
+        first = page * SEARCH_PAGE_SIZE + 1
+        message = f"🔎 Мастера по запросу «{search_text}» ({first}-{first + len(masters) - 1}):\n\n"
+        for master_profile in masters:
+            name = master_profile.business_name or master_profile.user.full_name
+            message += f"• {name}\n"
+            if master_profile.description:
+                message += f"   {master_profile.description[:80]}\n"
+            buttons.append([InlineKeyboardButton(name, callback_data=f"search_master_{master_profile.id}")])
+    else:
+        message = f"😔 По запросу «{search_text}» мастера не найдены."
+    
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️", callback_data=f"search_page_{page - 1}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=f"search_page_{page + 1}"))
+    if navigation:
+        buttons.append(navigation)
+    
+    buttons.append([InlineKeyboardButton("🔎 Новый поиск", callback_data="search_masters")])
+    buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="start_menu")])
+    
+    return message, InlineKeyboardMarkup(buttons)
+
+
+async def handle_search_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка текста поискового запроса"""
+    if not context.user_data.get('waiting_for_search'):
+        return
+    
+    search_text = update.message.text.strip()[:100]
+    
+    from bot.utils.search import search_terms
+    if not search_terms(search_text):
+        await update.message.reply_text("Введите хотя бы одно слово из двух и более букв:")
+        return
+    
+    context.user_data.pop('waiting_for_search', None)
+    context.user_data['search_query'] = search_text
+    
+    db = get_db_from_context(context)
+    message, reply_markup = _search_results_view(db, search_text, 0)
+    
+    await update.message.reply_text(message, reply_markup=reply_markup)
+
+
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Переход по страницам результатов поиска"""
+    query = update.callback_query
+    await query.answer()
+    
+    search_text = context.user_data.get('search_query')
+    if not search_text:
+        await safe_edit_message_text(query, "Поиск устарел. Начните заново: /start")
+        return
+    
+    page = max(int(query.data.split("_")[-1]), 0)
+    
+    db = get_db_from_context(context)
+    message, reply_markup = _search_results_view(db, search_text, page)
+    
+    await safe_edit_message_text(query, message, reply_markup=reply_markup)
+
+
+async def search_master_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор мастера из результатов поиска"""
+    query = update.callback_query
+    
+    master_id = int(query.data.split("_")[-1])
+    
+    db = get_db_from_context(context)
+    master_profile = db.query(MasterProfile).filter(MasterProfile.id == master_id).first()
+    
+    if not master_profile:
+        await query.answer()
+        await safe_edit_message_text(query, "❌ Мастер не найден")
+        return
+    
+    # Проверка: мастер не может записаться к самому себе
+    # (на callback можно ответить только один раз: alert или обычный ответ)
+    user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    if user and user.master_profile and user.master_profile.id == master_profile.id:
+        await query.answer("❌ Вы не можете записаться к самому себе", show_alert=True)
+        return
+    
+    await query.answer()
+    
+    context.user_data['selected_master_id'] = master_profile.id
+    context.user_data['master_link'] = master_profile.unique_link
+    
+    await show_services(update, context, master_profile.id)
+
+
 async def handle_master_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка ссылки мастера из команды /start"""
     if not context.args:
@@ -50,7 +179,7 @@ async def handle_master_link(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user = db.query(User).filter(User.telegram_id == user_data.id).first()
     if not user:
         from bot.handlers.common import get_or_create_user
-        user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name)
+        user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name, user_data.language_code)
     
     # Поиск мастера по уникальной ссылке
     master_profile = db.query(MasterProfile).filter(
@@ -117,7 +246,14 @@ async def handle_link_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Проверка: мастер не может записаться к самому себе
     from bot.handlers.common import get_or_create_user
-    user = await get_or_create_user(db, update.effective_user.id, update.effective_user.username, update.effective_user.full_name)
+    user_data = update.effective_user
+    user = await get_or_create_user(
+        db,
+        user_data.id,
+        user_data.username,
+        user_data.full_name,
+        user_data.language_code
+    )
     if user.master_profile and user.master_profile.id == master_profile.id:
         await update.message.reply_text(
             "❌ Вы не можете записаться к самому себе. Используйте ссылку другого мастера."
@@ -195,9 +331,9 @@ async def service_select_callback(update: Update, context: ContextTypes.DEFAULT_
     context.user_data['selected_service_id'] = service_id
     context.user_data['selected_service'] = service
     
-    # Показываем календарь
-    today = datetime.now()
-    keyboard = get_month_keyboard(today.year, today.month)
+    # Показываем календарь (сегодня - по часам мастера)
+    today = master_now(db, service.master_id)
+    keyboard = get_month_keyboard(today.year, today.month, today.date())
     
     message = (
         f"📅 Выберите дату для услуги:\n\n"
@@ -231,30 +367,54 @@ async def date_selected_callback(update: Update, context: ContextTypes.DEFAULT_T
         await query.answer("Ошибка: потеряны данные. Начните заново.")
         return
     
-    # Получаем доступные слоты
-    available_slots = get_available_time_slots(
+    # Шаг и буферы: настройки услуги, а если не заданы - мастера
+    rules = get_slot_rules(db, master_id, service.id)
+    
+    # Получаем маску доступных начал записи
+    start_mask = get_available_start_mask(
         db,
         master_id,
         selected_date,
         service.duration_minutes,
-        step_minutes=30
+        step_minutes=rules.step_minutes,
+        buffer_before_minutes=rules.buffer_before_minutes,
+        buffer_after_minutes=rules.buffer_after_minutes,
+        exclude_client_id=_client_id(db, update.effective_user.id)
     )
     
-    if not available_slots:
-        await query.answer(
-            "❌ На эту дату нет доступного времени. Выберите другую дату.",
-            show_alert=True
-        )
+    # Лист ожидания имеет смысл, только если мастер в этот день работает:
+    # в выходной отмена записи времени не освободит
+    work_mask = 0
+    if not start_mask:
+        from bot.utils.availability import get_day_masks
+        work_mask, _ = get_day_masks(db, master_id, selected_date.date())
+    
+    # Строка availability_days, пересчитанная при чтении, сохраняется здесь
+    db.commit()
+    
+    if not start_mask:
+        message = f"❌ На {selected_date.strftime('%d.%m.%Y')} нет доступного времени."
+        keyboard = [
+            [InlineKeyboardButton("◀️ Выбрать другую дату", callback_data="calendar_back")]
+        ]
+        if work_mask:
+            # Свободного времени нет - предлагаем встать в лист ожидания
+            message += (
+                "\n\nМожно встать в лист ожидания: если кто-то отменит запись, "
+                "мы сразу предложим вам освободившееся время."
+            )
+            keyboard.insert(0, [InlineKeyboardButton("🔔 Сообщить, если освободится", callback_data="waitlist_join")])
+        await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
         return
     
     # Показываем выбор времени
-    keyboard = get_time_keyboard(selected_date, available_slots)
+    keyboard = get_time_keyboard(selected_date, start_mask=start_mask)
     
     message = (
         f"⏰ Выберите время:\n\n"
         f"📅 Дата: {selected_date.strftime('%d.%m.%Y')}\n"
         f"🛠 Услуга: {service.name}\n\n"
-        f"Доступно {len(available_slots)} временных слотов"
+        f"Доступно {count_quanta(start_mask)} временных слотов"
     )
     
     await query.edit_message_text(message, reply_markup=keyboard)
@@ -283,23 +443,44 @@ async def time_selected_callback(update: Update, context: ContextTypes.DEFAULT_T
     start_time = datetime.combine(selected_date.date(), datetime.min.time().replace(hour=hour, minute=minute))
     end_time = start_time + timedelta(minutes=service.duration_minutes)
     
-    # Валидация временного слота
-    is_valid, error_msg = validate_time_slot(start_time, end_time)
+    db = get_db_from_context(context)
+    
+    # Валидация временного слота (по часам мастера)
+    is_valid, error_msg = validate_time_slot(start_time, end_time, now=master_now(db, master_id))
     if not is_valid:
         await query.answer(f"❌ {error_msg}", show_alert=True)
         return
     
     # Проверка пересечений
-    db = get_db_from_context(context)
-    
-    if check_appointment_overlap(db, master_id, start_time, end_time):
+    rules = get_slot_rules(db, master_id, service.id)
+    client_id = _client_id(db, update.effective_user.id)
+    
+    if check_appointment_overlap(
+        db, master_id, start_time, end_time,
+        buffer_before_minutes=rules.buffer_before_minutes,
+        buffer_after_minutes=rules.buffer_after_minutes,
+        exclude_client_id=client_id
+    ):
         await query.answer("❌ Это время уже занято. Выберите другое.", show_alert=True)
         return
     
+    # Время удерживается за клиентом, пока он отправляет телефон и подтверждает запись
+    if client_id:
+        place_hold(
+            db,
+            master_id,
+            client_id,
+            start_time - timedelta(minutes=rules.buffer_before_minutes),
+            end_time + timedelta(minutes=rules.buffer_after_minutes)
+        )
+        db.commit()
+    
     # Сохраняем выбранное время
     context.user_data['start_time'] = start_time
     context.user_data['end_time'] = end_time
     
+    hold_text = f"⏳ Время закреплено за вами на {HOLD_TTL_SECONDS // 60} мин.\n" if client_id else ""
+    
     # Проверяем, запрашивали ли уже телефон
     if not context.user_data.get('phone_requested'):
         # Запрос номера телефона
@@ -315,7 +496,8 @@ async def time_selected_callback(update: Update, context: ContextTypes.DEFAULT_T
             f"🛠 Услуга: {service.name}\n"
             f"💰 Стоимость: {service.price} ₽\n"
             f"📅 Дата и время: {start_time.strftime('%d.%m.%Y %H:%M')}\n"
-            f"⏱ Длительность: {service.duration_minutes} мин.\n\n"
+            f"⏱ Длительность: {service.duration_minutes} мин.\n"
+            f"{hold_text}\n"
             f"Пожалуйста, отправьте ваш номер телефона для связи:"
         )
         
@@ -335,7 +517,8 @@ async def time_selected_callback(update: Update, context: ContextTypes.DEFAULT_T
                 [
                     InlineKeyboardButton("✅ Подтвердить", callback_data="appointment_confirm"),
                     InlineKeyboardButton("❌ Отмена", callback_data="services_back")
-                ]
+                ],
+                [InlineKeyboardButton("🔁 Повторять запись", callback_data="series_options")]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await safe_edit_message_text(
@@ -355,7 +538,8 @@ async def time_selected_callback(update: Update, context: ContextTypes.DEFAULT_T
         [
             InlineKeyboardButton("✅ Подтвердить", callback_data="appointment_confirm"),
             InlineKeyboardButton("❌ Отмена", callback_data="services_back")
-        ]
+        ],
+        [InlineKeyboardButton("🔁 Повторять запись", callback_data="series_options")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -364,7 +548,8 @@ async def time_selected_callback(update: Update, context: ContextTypes.DEFAULT_T
         f"🛠 Услуга: {service.name}\n"
         f"💰 Стоимость: {service.price} ₽\n"
         f"📅 Дата и время: {start_time.strftime('%d.%m.%Y %H:%M')}\n"
-        f"⏱ Длительность: {service.duration_minutes} мин.\n\n"
+        f"⏱ Длительность: {service.duration_minutes} мин.\n"
+        f"{hold_text}\n"
         f"Подтвердите запись:"
     )
     
@@ -390,7 +575,7 @@ async def appointment_confirm_callback(update: Update, context: ContextTypes.DEF
     
     # Получаем или создаем пользователя
     from bot.handlers.common import get_or_create_user
-    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name)
+    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name, user_data.language_code)
     
     # Получаем профиль мастера
     master_profile = db.query(MasterProfile).filter(MasterProfile.id == master_id).first()
@@ -401,7 +586,13 @@ async def appointment_confirm_callback(update: Update, context: ContextTypes.DEF
         return
     
     # Повторная проверка пересечений
-    if check_appointment_overlap(db, master_id, start_time, end_time):
+    rules = get_slot_rules(db, master_id, service_id)
+    if check_appointment_overlap(
+        db, master_id, start_time, end_time,
+        buffer_before_minutes=rules.buffer_before_minutes,
+        buffer_after_minutes=rules.buffer_after_minutes,
+        exclude_client_id=user.id
+    ):
         await query.edit_message_text(
             "❌ К сожалению, это время уже занято. Выберите другое время."
         )
@@ -423,17 +614,46 @@ async def appointment_confirm_callback(update: Update, context: ContextTypes.DEF
     )
     
     db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
+    mark_appointment_busy(db, appointment)
+    
+    # Подписки клиента на эту дату (и удерживаемое для него время) закрываются
+    from bot.utils.waitlist import mark_booked
+    mark_booked(db, user.id, master_id, start_time, end_time)
+    release_hold(db, user.id)
+    db.flush()
+    
+    service = db.query(Service).filter(Service.id == service_id).first()
     
-    # Отправка уведомления о подтверждении сразу
-    try:
-        from bot.utils.notifications import send_confirmation_notification
-        await send_confirmation_notification(context.bot, appointment)
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления о подтверждении: {e}")
+    # Уведомления клиенту и мастеру уходят через outbox в той же транзакции
+    from bot.utils.notifications import build_confirmation_message
+    enqueue_message(
+        db,
+        user.telegram_id,
+        build_confirmation_message(appointment),
+        kind="appointment",
+        dedup_key=f"appointment:{appointment.id}:confirmed:client"
+    )
+    master_language = user_language(master_profile.user)
+    phone_line = t("phone_line", master_language, phone=appointment.client_phone) if appointment.client_phone else ""
+    enqueue_message(
+        db,
+        master_profile.user.telegram_id,
+        t(
+            "appointment_new",
+            master_language,
+            when=format_datetime(start_time, master_language),
+            service=service.name,
+            client=user.full_name,
+            phone_line=phone_line
+        ),
+        kind="appointment",
+        dedup_key=f"appointment:{appointment.id}:confirmed:master"
+    )
+    db.commit()
+    kick_outbox()
     
     # Планирование напоминания
+    from bot.utils.notifications import schedule_notifications
     reminder_hours = master_profile.default_notification_hours or 24
     schedule_notifications(db, appointment, reminder_hours)
     
@@ -447,8 +667,6 @@ async def appointment_confirm_callback(update: Update, context: ContextTypes.DEF
     context.user_data.pop('client_phone', None)
     context.user_data.pop('phone_requested', None)
     
-    service = db.query(Service).filter(Service.id == service_id).first()
-    
     keyboard = [
         [InlineKeyboardButton("🏠 Главное меню", callback_data="start_menu")]
     ]
@@ -465,23 +683,214 @@ async def appointment_confirm_callback(update: Update, context: ContextTypes.DEF
     await safe_edit_message_text(query, message, reply_markup=reply_markup)
     
     logger.info(f"Создана запись {appointment.id} для клиента {user.id} к мастеру {master_id}")
+
+
+def _series_occurrences(db: Session, context: ContextTypes.DEFAULT_TYPE, client_id, interval_weeks: int, count: int):
+    """Повторы серии от выбранного времени с результатом проверки"""
+    from bot.utils.series import check_series, series_times
+    
+    times = series_times(
+        context.user_data['start_time'],
+        context.user_data['end_time'],
+        interval_weeks,
+        count
+    )
+    return check_series(
+        db,
+        context.user_data['selected_master_id'],
+        context.user_data['selected_service_id'],
+        times,
+        exclude_client_id=client_id
+    )
+
+
+async def series_options_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор периодичности регулярной записи"""
+    query = update.callback_query
+    await query.answer()
     
-    # Уведомление мастеру
-    try:
-        master_user = master_profile.user
-        phone_text = f"\n📱 Телефон: {appointment.client_phone}" if appointment.client_phone else ""
-        master_message = (
-            f"📅 Новая запись!\n\n"
-            f"Дата и время: {start_time.strftime('%d.%m.%Y %H:%M')}\n"
-            f"Услуга: {service.name}\n"
-            f"Клиент: {user.full_name}{phone_text}"
-        )
-        await context.bot.send_message(
-            chat_id=master_user.telegram_id,
-            text=master_message
+    start_time = context.user_data.get('start_time')
+    if not start_time or not context.user_data.get('selected_master_id'):
+        await safe_edit_message_text(query, "Ошибка: потеряны данные. Начните заново.")
+        return
+    
+    from bot.utils.series import SERIES_OPTIONS
+    
+    keyboard = []
+    for interval_weeks, count in SERIES_OPTIONS:
+        period = "Каждую неделю" if interval_weeks == 1 else f"Раз в {interval_weeks} нед."
+        keyboard.append([InlineKeyboardButton(
+            f"{period} × {count}",
+            callback_data=f"series_{interval_weeks}_{count}"
+        )])
+    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="services_back")])
+    
+    await safe_edit_message_text(
+        query,
+        f"🔁 Регулярная запись\n\n"
+        f"Первая запись: {start_time.strftime('%d.%m.%Y %H:%M')}\n"
+        f"Следующие - в тот же день недели и время.\n\n"
+        f"Выберите периодичность и количество записей:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def series_selected_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Проверка повторов выбранной серии"""
+    query = update.callback_query
+    await query.answer()
+    
+    # callback_data: series_{interval_weeks}_{count}
+    parts = query.data.split('_')
+    interval_weeks, count = int(parts[1]), int(parts[2])
+    
+    service = context.user_data.get('selected_service')
+    if not service or not context.user_data.get('start_time'):
+        await safe_edit_message_text(query, "Ошибка: потеряны данные. Начните заново.")
+        return
+    
+    db = get_db_from_context(context)
+    occurrences = _series_occurrences(db, context, _client_id(db, update.effective_user.id), interval_weeks, count)
+    free_count = sum(1 for occurrence in occurrences if occurrence.is_free)
+    
+    context.user_data['series'] = (interval_weeks, count)
+    
+    lines = [
+        f"{'✅' if occurrence.is_free else '❌'} {occurrence.start_time.strftime('%d.%m.%Y %H:%M')}"
+        for occurrence in occurrences
+    ]
+    message = (
+        f"🔁 Регулярная запись\n\n"
+        f"🛠 {service.name}\n"
+        f"💰 {service.price} ₽ за визит\n\n"
+        + "\n".join(lines)
+    )
+    
+    keyboard = []
+    if free_count:
+        if free_count < len(occurrences):
+            message += "\n\n❌ - время занято или мастер не работает, эти даты будут пропущены."
+        keyboard.append([InlineKeyboardButton(
+            f"✅ Записаться ({free_count})",
+            callback_data="series_confirm"
+        )])
+    else:
+        message += "\n\nНи одна дата серии не свободна."
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="series_options")])
+    
+    await safe_edit_message_text(query, message, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+async def series_confirm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Создание регулярной записи одной транзакцией"""
+    query = update.callback_query
+    await query.answer()
+    
+    db = get_db_from_context(context)
+    user_data = update.effective_user
+    
+    master_id = context.user_data.get('selected_master_id')
+    service_id = context.user_data.get('selected_service_id')
+    series = context.user_data.get('series')
+    
+    if not all([master_id, service_id, series, context.user_data.get('start_time')]):
+        await safe_edit_message_text(query, "Ошибка: потеряны данные. Начните заново.")
+        return
+    
+    from bot.handlers.common import get_or_create_user
+    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name, user_data.language_code)
+    
+    if user.master_profile and user.master_profile.id == master_id:
+        await safe_edit_message_text(query, "❌ Вы не можете записаться к самому себе.")
+        return
+    
+    master_profile = db.query(MasterProfile).filter(MasterProfile.id == master_id).first()
+    service = db.query(Service).filter(Service.id == service_id).first()
+    
+    # Повторная проверка всех повторов перед созданием
+    from bot.utils.series import create_series
+    occurrences = _series_occurrences(db, context, user.id, *series)
+    appointments = create_series(
+        db,
+        master_id,
+        user.id,
+        service,
+        occurrences,
+        client_name=user.full_name,
+        client_phone=context.user_data.get('client_phone'),
+        reminder_hours=master_profile.default_notification_hours or 24
+    )
+    
+    if not appointments:
+        db.rollback()
+        await safe_edit_message_text(
+            query,
+            "❌ К сожалению, все даты серии уже заняты. Выберите другое время."
         )
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления мастеру: {e}")
+        return
+    
+    from bot.utils.waitlist import mark_booked
+    for appointment in appointments:
+        mark_booked(db, user.id, master_id, appointment.start_time, appointment.end_time)
+    release_hold(db, user.id)
+    
+    series_id = appointments[0].series_id
+    client_language = user_language(user)
+    dates = "\n".join(format_datetime(appointment.start_time, client_language) for appointment in appointments)
+    enqueue_message(
+        db,
+        user.telegram_id,
+        t(
+            "series_created",
+            client_language,
+            service=service.name,
+            dates=dates
+        ),
+        kind="appointment",
+        dedup_key=f"series:{series_id}:confirmed:client"
+    )
+    master_language = user_language(master_profile.user)
+    client_phone = appointments[0].client_phone
+    enqueue_message(
+        db,
+        master_profile.user.telegram_id,
+        t(
+            "series_new",
+            master_language,
+            count=len(appointments),
+            service=service.name,
+            client=user.full_name,
+            phone_line=t("phone_line", master_language, phone=client_phone) if client_phone else "",
+            dates="\n".join(format_datetime(appointment.start_time, master_language) for appointment in appointments)
+        ),
+        kind="appointment",
+        dedup_key=f"series:{series_id}:confirmed:master"
+    )
+    db.commit()
+    kick_outbox()
+    
+    # Очистка данных
+    for key in ('selected_service_id', 'selected_service', 'selected_master_id', 'selected_date',
+                'start_time', 'end_time', 'client_phone', 'phone_requested', 'series'):
+        context.user_data.pop(key, None)
+    
+    skipped = len(occurrences) - len(appointments)
+    skipped_text = f"\n\nПропущено занятых дат: {skipped}" if skipped else ""
+    
+    keyboard = [
+        [InlineKeyboardButton("📅 Мои записи", callback_data="client_appointments")],
+        [InlineKeyboardButton("🏠 Главное меню", callback_data="start_menu")]
+    ]
+    await safe_edit_message_text(
+        query,
+        f"✅ Регулярная запись создана!\n\n"
+        f"🛠 {service.name}\n"
+        f"📅 Даты:\n{dates}{skipped_text}\n\n"
+        f"Мы напомним о каждой записи заранее.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    
+    logger.info(f"Создана серия {series_id} ({len(appointments)} записей) для клиента {user.id}")
 
 
 async def handle_phone_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -518,7 +927,8 @@ async def handle_phone_contact(update: Update, context: ContextTypes.DEFAULT_TYP
         [
             InlineKeyboardButton("✅ Подтвердить", callback_data="appointment_confirm"),
             InlineKeyboardButton("❌ Отмена", callback_data="services_back")
-        ]
+        ],
+        [InlineKeyboardButton("🔁 Повторять запись", callback_data="series_options")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -545,13 +955,20 @@ async def client_appointments_callback(update: Update, context: ContextTypes.DEF
     
     # Получаем пользователя
     from bot.handlers.common import get_or_create_user
-    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name)
-    
-    # Получаем все записи клиента
-    appointments = db.query(Appointment).filter(
-        Appointment.client_id == user.id,
-        Appointment.start_time >= datetime.utcnow()
-    ).order_by(Appointment.start_time).limit(20).all()
+    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name, user_data.language_code)
+    
+    # Получаем все записи клиента. Время записи - на часах мастера, поэтому
+    # в запросе берется запас на максимальное смещение пояса, а прошедшие
+    # записи отсекаются по поясу каждого мастера
+    now = datetime.utcnow()
+    appointments = [
+        appointment
+        for appointment in db.query(Appointment).filter(
+            Appointment.client_id == user.id,
+            Appointment.start_time >= now - MAX_UTC_OFFSET
+        ).order_by(Appointment.start_time).limit(20).all()
+        if local_to_utc(appointment.start_time, master_timezone(appointment.master_profile)) >= now
+    ]
     
     if not appointments:
         keyboard = [
@@ -596,7 +1013,7 @@ async def client_appointments_callback(update: Update, context: ContextTypes.DEF
         # Добавляем кнопку отмены для подтвержденных и ожидающих записей
         if appointment.status in [AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED]:
             # Проверяем, можно ли отменить (не менее 2 часов до начала)
-            time_until = appointment.start_time - datetime.utcnow()
+            time_until = appointment.start_time - master_now(db, appointment.master_id)
             if time_until >= timedelta(hours=2):
                 buttons.append([InlineKeyboardButton(
                     f"❌ Отменить: {appointment.start_time.strftime('%d.%m %H:%M')}",
@@ -674,7 +1091,7 @@ async def cancel_appointment_callback(update: Update, context: ContextTypes.DEFA
         return
     
     # Проверка: можно отменить только за определенное время до начала
-    time_until = appointment.start_time - datetime.utcnow()
+    time_until = appointment.start_time - master_now(db, appointment.master_id)
     
     if time_until < timedelta(hours=2):
         await query.answer(
@@ -685,25 +1102,33 @@ async def cancel_appointment_callback(update: Update, context: ContextTypes.DEFA
     
     # Отмена записи
     appointment.status = AppointmentStatus.CANCELLED
-    db.commit()
+    release_appointment(db, appointment)
+    
+    # Напоминание об отмененной записи не отправляется
+    from bot.utils.notifications import void_reminders
+    void_reminders(db, appointment)
+    
+    # Освободившееся время предлагается клиентам из листа ожидания
+    from bot.utils.waitlist import offer_freed_slot
+    offer_freed_slot(
+        db,
+        appointment.master_id,
+        appointment.start_time.date(),
+        appointment.start_time,
+        appointment.end_time
+    )
     
     # Уведомление мастеру
-    try:
-        master_user = appointment.master_profile.user
-        service = appointment.service
-        await context.bot.send_message(
-            chat_id=master_user.telegram_id,
-            text=(
-                f"⚠️ Запись отменена клиентом\n\n"
-                f"Услуга: {service.name}\n"
-                f"Дата: {appointment.start_time.strftime('%d.%m.%Y %H:%M')}\n"
-                f"Клиент: {appointment.client_name or appointment.client.full_name}\n"
-                f"Телефон: {appointment.client_phone or 'Не указан'}\n\n"
-                f"Слот освобожден и доступен для записи."
-            )
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления мастеру: {e}")
+    from bot.utils.notifications import build_client_cancellation_message
+    enqueue_message(
+        db,
+        appointment.master_profile.user.telegram_id,
+        build_client_cancellation_message(appointment),
+        kind="appointment",
+        dedup_key=f"appointment:{appointment.id}:cancelled:master"
+    )
+    db.commit()
+    kick_outbox()
     
     # Показываем подтверждение отмены
     keyboard = [
@@ -721,6 +1146,134 @@ async def cancel_appointment_callback(update: Update, context: ContextTypes.DEFA
     logger.info(f"Запись {appointment_id} отменена клиентом {user.id}")
 
 
+async def waitlist_join_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Постановка в лист ожидания на выбранную дату"""
+    query = update.callback_query
+    await query.answer()
+    
+    master_id = context.user_data.get('selected_master_id')
+    service = context.user_data.get('selected_service')
+    selected_date = context.user_data.get('selected_date')
+    
+    if not all([master_id, service, selected_date]):
+        await safe_edit_message_text(query, "Ошибка: потеряны данные. Начните заново.")
+        return
+    
+    db = get_db_from_context(context)
+    user_data = update.effective_user
+    
+    from bot.handlers.common import get_or_create_user
+    from bot.utils.waitlist import WAITLIST_OFFER_MINUTES, join_waitlist
+    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name, user_data.language_code)
+    
+    if user.master_profile and user.master_profile.id == master_id:
+        await safe_edit_message_text(query, "❌ Вы не можете записаться к самому себе.")
+        return
+    
+    if join_waitlist(db, user.id, master_id, service.id, selected_date.date()):
+        db.commit()
+        message = (
+            f"🔔 Вы в листе ожидания\n\n"
+            f"📅 Дата: {selected_date.strftime('%d.%m.%Y')}\n"
+            f"🛠 Услуга: {service.name}\n\n"
+            f"Если время освободится, мы пришлем предложение. "
+            f"Оно будет закреплено за вами {WAITLIST_OFFER_MINUTES} мин."
+        )
+    else:
+        db.rollback()
+        message = "🔔 Вам уже предложено время на эту дату - проверьте сообщения."
+    
+    keyboard = [
+        [InlineKeyboardButton("◀️ Выбрать другую дату", callback_data="calendar_back")],
+        [InlineKeyboardButton("🏠 Главное меню", callback_data="start_menu")]
+    ]
+    await safe_edit_message_text(query, message, reply_markup=InlineKeyboardMarkup(keyboard))
+    
+    logger.info(f"Клиент {user.id} встал в лист ожидания к мастеру {master_id} на {selected_date.date()}")
+
+
+async def waitlist_accept_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Принятие предложенного из листа ожидания времени"""
+    query = update.callback_query
+    await query.answer()
+    
+    # Извлекаем ID подписки из callback_data: waitlist_accept_{id}
+    entry_id = int(query.data.split('_')[-1])
+    
+    db = get_db_from_context(context)
+    client_id = _client_id(db, update.effective_user.id)
+    
+    from bot.utils.waitlist import get_active_offer
+    entry = get_active_offer(db, entry_id, client_id) if client_id else None
+    
+    if not entry or not entry.service or not entry.service.is_active:
+        await safe_edit_message_text(
+            query,
+            "⌛ Предложение больше не действует: время истекло или уже занято."
+        )
+        return
+    
+    service = entry.service
+    start_time = entry.offer_start_time
+    end_time = start_time + timedelta(minutes=service.duration_minutes)
+    
+    # Дальше - обычное подтверждение записи (удержание снимется при записи)
+    context.user_data['selected_master_id'] = entry.master_id
+    context.user_data['selected_service_id'] = service.id
+    context.user_data['selected_service'] = service
+    context.user_data['selected_date'] = datetime.combine(entry.date, datetime.min.time())
+    context.user_data['start_time'] = start_time
+    context.user_data['end_time'] = end_time
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Подтвердить", callback_data="appointment_confirm"),
+            InlineKeyboardButton("❌ Отказаться", callback_data=f"waitlist_decline_{entry.id}")
+        ]
+    ]
+    
+    message = (
+        f"📋 Подтверждение записи\n\n"
+        f"🛠 Услуга: {service.name}\n"
+        f"💰 Стоимость: {service.price} ₽\n"
+        f"📅 Дата и время: {start_time.strftime('%d.%m.%Y %H:%M')}\n"
+        f"⏱ Длительность: {service.duration_minutes} мин.\n\n"
+        f"Подтвердите запись:"
+    )
+    
+    await safe_edit_message_text(query, message, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+async def waitlist_decline_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отказ от предложенного из листа ожидания времени"""
+    query = update.callback_query
+    await query.answer()
+    
+    # Извлекаем ID подписки из callback_data: waitlist_decline_{id}
+    entry_id = int(query.data.split('_')[-1])
+    
+    db = get_db_from_context(context)
+    client_id = _client_id(db, update.effective_user.id)
+    
+    from bot.utils.waitlist import decline_offer, get_active_offer
+    entry = get_active_offer(db, entry_id, client_id) if client_id else None
+    
+    if entry:
+        # Время сразу предлагается следующему в очереди
+        decline_offer(db, entry)
+        db.commit()
+        kick_outbox()
+    
+    keyboard = [
+        [InlineKeyboardButton("🏠 Главное меню", callback_data="start_menu")]
+    ]
+    await safe_edit_message_text(
+        query,
+        "👌 Хорошо, предложение отменено.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
 async def month_navigation_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Навигация по месяцам"""
     query = update.callback_query
@@ -730,7 +1283,9 @@ async def month_navigation_callback(update: Update, context: ContextTypes.DEFAUL
     year = int(parts[1])
     month = int(parts[2])
     
-    keyboard = get_month_keyboard(year, month)
+    master_id = context.user_data.get('selected_master_id')
+    today = master_now(get_db_from_context(context), master_id).date() if master_id else None
+    keyboard = get_month_keyboard(year, month, today)
     
     service = context.user_data.get('selected_service')
     if service:
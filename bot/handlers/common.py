@@ -19,16 +19,28 @@ def get_db_from_context(context: ContextTypes.DEFAULT_TYPE):
         return db_func
 
 
-async def get_or_create_user(db: Session, telegram_id: int, username: str = None, full_name: str = None) -> User:
-    """Получение или создание пользователя"""
+async def get_or_create_user(
+    db: Session,
+    telegram_id: int,
+    username: str = None,
+    full_name: str = None,
+    language_code: str = None
+) -> User:
+    """
+    Получение или создание пользователя
+    
+    Новому пользователю язык уведомлений берется из language_code Telegram.
+    """
     user = db.query(User).filter(User.telegram_id == telegram_id).first()
     
     if not user:
+        from bot.utils.i18n import normalize_language
         user = User(
             telegram_id=telegram_id,
             username=username,
             full_name=full_name,
-            role=UserRole.CLIENT
+            role=UserRole.CLIENT,
+            language=normalize_language(language_code)
         )
         db.add(user)
         db.commit()
@@ -50,6 +62,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db = get_db_from_context(context)
     user_data = update.effective_user
     
+    # Возврат в главное меню прерывает незаконченную рассылку
+    context.user_data.pop('waiting_for_broadcast', None)
+    
     # Проверяем, есть ли параметр после /start
     if context.args and len(context.args) > 0:
         start_param = context.args[0]
@@ -85,6 +100,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         invoice.paid_at = datetime.utcnow()
                         db.commit()
                         
+                        from bot.utils.payments import forget_open_invoice
+                        forget_open_invoice(invoice.id)
+                        
                         await update.message.reply_text(
                             f"✅ Чек оплачен!\n\n"
                             f"Услуга: {invoice.description}\n"
@@ -110,7 +128,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         db,
         user_data.id,
         user_data.username,
-        user_data.full_name
+        user_data.full_name,
+        user_data.language_code
     )
     
     if user.role == UserRole.MASTER:
@@ -118,15 +137,18 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard = [
             [InlineKeyboardButton("📋 Мои услуги", callback_data="master_services")],
             [InlineKeyboardButton("📅 Мои записи", callback_data="master_appointments")],
+            [InlineKeyboardButton("📊 Статистика", callback_data="master_stats")],
             [InlineKeyboardButton("⚙️ Настройки", callback_data="master_settings")],
             [InlineKeyboardButton("🔗 Моя ссылка", callback_data="master_link")],
-            [InlineKeyboardButton("📝 Записаться к мастеру", callback_data="book_by_link")]
+            [InlineKeyboardButton("📝 Записаться к мастеру", callback_data="book_by_link")],
+            [InlineKeyboardButton("🔎 Найти мастера", callback_data="search_masters")]
         ]
     else:
         # Обычный пользователь
         keyboard = [
             [InlineKeyboardButton("👤 Стать мастером", callback_data="become_master")],
             [InlineKeyboardButton("📝 Записаться к мастеру", callback_data="book_by_link")],
+            [InlineKeyboardButton("🔎 Найти мастера", callback_data="search_masters")],
             [InlineKeyboardButton("📅 Мои записи", callback_data="client_appointments")],
             [InlineKeyboardButton("💬 Обратная связь", callback_data="feedback")]
         ]
@@ -155,16 +177,64 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• /start - главное меню\n"
         "• Создайте профиль мастера через меню\n"
         "• Добавьте услуги и настройте расписание\n"
-        "• Получите уникальную ссылку для записи клиентов\n\n"
+        "• Получите уникальную ссылку для записи клиентов\n"
+        "• /stats - статистика, /export - выгрузка истории\n\n"
         "Для клиентов:\n"
         "• Перейдите по ссылке мастера\n"
         "• Выберите услугу и удобное время\n"
         "• Получите уведомления о записи\n\n"
+        "🌐 /language - язык уведомлений (Русский, Кыргызча, English)\n\n"
         "💬 По вопросам обращайтесь через меню 'Обратная связь'"
     )
     await update.message.reply_text(help_text)
 
 
+async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /language - выбор языка уведомлений"""
+    from bot.utils.i18n import LANGUAGES, t, user_language
+    
+    db = get_db_from_context(context)
+    user_data = update.effective_user
+    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name, user_data.language_code)
+    
+    keyboard = [
+        [InlineKeyboardButton(name, callback_data=f"language_set_{code}")]
+        for code, name in LANGUAGES.items()
+    ]
+    await update.message.reply_text(
+        t("language_choose", user_language(user)),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def language_selected_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сохранение выбранного языка уведомлений"""
+    from bot.utils.i18n import LANGUAGES, t
+    
+    query = update.callback_query
+    await query.answer()
+    
+    code = query.data.replace("language_set_", "")
+    if code not in LANGUAGES:
+        return
+    
+    db = get_db_from_context(context)
+    user_data = update.effective_user
+    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name, user_data.language_code)
+    user.language = code
+    db.commit()
+    
+    keyboard = [
+        [InlineKeyboardButton("🏠 Главное меню", callback_data="start_menu")]
+    ]
+    await query.edit_message_text(
+        t("language_changed", code, language=LANGUAGES[code]),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    
+    logger.info(f"Пользователь {user_data.id} выбрал язык {code}")
+
+
 async def feedback_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик обратной связи"""
     query = update.callback_query
@@ -176,6 +246,7 @@ async def feedback_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Пожалуйста, опишите ваше предложение, замечание или проблему:"
     )
     
+    context.user_data.pop('waiting_for_broadcast', None)
     context.user_data['waiting_for_feedback'] = True
     
     if query:
@@ -202,7 +273,7 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db = get_db_from_context(context)
     from bot.models import Feedback, User
     
-    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name)
+    user = await get_or_create_user(db, user_data.id, user_data.username, user_data.full_name, user_data.language_code)
     
     feedback = Feedback(
         user_id=user.id,
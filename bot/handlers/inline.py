@@ -0,0 +1,60 @@
+"""
+Обработчик inline-режима: @bot <название> - поиск мастера или услуги
+"""
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup,
+    InlineQueryResultArticle, InputTextMessageContent
+)
+from telegram.ext import ContextTypes
+from bot.utils.prefix_index import get_prefix_index, lookup
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Результатов на страницу (максимум Telegram - 50)
+INLINE_PAGE_SIZE = 20
+
+# Сколько секунд Telegram может кэшировать ответ на своей стороне
+INLINE_CACHE_TIME = 60
+
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ответ на inline-запрос из префиксного индекса (без запросов к БД)"""
+    inline_query = update.inline_query
+    text = inline_query.query.strip()
+    
+    try:
+        offset = int(inline_query.offset or 0)
+    except ValueError:
+        offset = 0
+    
+    if not text:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME)
+        return
+    
+    index = await get_prefix_index(context.bot_data.get('db_session'))
+    entries = lookup(index, text)
+    page = entries[offset:offset + INLINE_PAGE_SIZE]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(entries) else ""
+    
+    bot_username = context.bot.username
+    results = []
+    for entry in page:
+        link = f"https://t.me/{bot_username}?start={entry.unique_link}"
+        icon = "👤" if entry.kind == "master" else "🛠"
+        results.append(InlineQueryResultArticle(
+            id=f"{entry.kind}_{entry.item_id}",
+            title=f"{icon} {entry.title}",
+            description=entry.description,
+            input_message_content=InputTextMessageContent(
+                f"{icon} {entry.title}\n{entry.description}\n\n📝 Запись: {link}"
+            ),
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📝 Записаться", url=link)]]),
+        ))
+    
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=False,
+        next_offset=next_offset
+    )
@@ -2,6 +2,7 @@
 Обработчики для работы с чеками и оплатами
 """
 import logging
+import time
 from datetime import datetime
 from sqlalchemy.orm import Session
 from bot.models import Invoice, Appointment, AppointmentStatus, PaymentStatus, User
@@ -145,7 +146,8 @@ async def payment_method_callback(update: Update, context: ContextTypes.DEFAULT_
             )
         ]
         
-        # Отправляем счет клиенту через sendInvoice
+        # Отправляем счет клиенту через sendInvoice (класс payment в очереди исходящих запросов)
+        from bot.utils.outbound import PRIORITY_PAYMENT, priority_kwargs
         await context.bot.send_invoice(
             chat_id=client.telegram_id,
             title=invoice.description[:32],  # Название счета (макс 32 символа)
@@ -155,9 +157,14 @@ async def payment_method_callback(update: Update, context: ContextTypes.DEFAULT_
             currency="KGS",  # Валюта KGS для FreedomPay KG
             prices=prices,
             start_parameter=f"invoice_{invoice_id}",  # Уникальный параметр для deep linking
-            is_flexible=False  # Не гибкая цена
+            is_flexible=False,  # Не гибкая цена
+            **priority_kwargs(context.bot, PRIORITY_PAYMENT)
         )
         
+        # Кэшируем открытый чек для быстрого ответа на PreCheckoutQuery
+        from bot.utils.payments import remember_open_invoice
+        remember_open_invoice(invoice_id, invoice.amount, "KGS")
+        
         # Обновляем сообщение для мастера
         success_message = (
             f"✅ Счет отправлен клиенту\n\n"
@@ -282,66 +289,81 @@ async def check_payment_status_callback(update: Update, context: ContextTypes.DE
 
 
 async def pre_checkout_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик PreCheckoutQuery - подтверждение платежа перед оплатой"""
+    """
+    Обработчик PreCheckoutQuery - подтверждение платежа перед оплатой
+    
+    Быстрый путь: чек проверяется по горячему кэшу открытых чеков без обращения к БД.
+    К БД обращаемся только при промахе кэша (например, после перезапуска бота).
+    """
+    from bot.utils.payments import (
+        get_open_invoice, remember_open_invoice, record_pre_checkout_latency
+    )
+    
+    started = time.perf_counter()
     query = update.pre_checkout_query
-    db = get_db_from_context(context)
+    invoice_id = None
     
     try:
-        logger.info(f"Получен PreCheckoutQuery: payload={query.invoice_payload}, amount={query.total_amount}, currency={query.currency}")
-        
         # Извлекаем invoice_id из payload
         invoice_id = int(query.invoice_payload)
         
-        # Получаем чек
-        invoice_obj = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+        open_invoice = get_open_invoice(invoice_id)
         
-        if not invoice_obj:
-            logger.error(f"Чек {invoice_id} не найден для PreCheckoutQuery")
-            await query.answer(ok=False, error_message="Чек не найден")
-            return
+        if open_invoice is None:
+            db = get_db_from_context(context)
+            invoice_obj = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+            
+            if not invoice_obj:
+                logger.error(f"Чек {invoice_id} не найден для PreCheckoutQuery")
+                await query.answer(ok=False, error_message="Чек не найден")
+                return
+            
+            # Проверяем, что чек еще не оплачен
+            if invoice_obj.payment_status == PaymentStatus.SUCCEEDED:
+                logger.warning(f"Чек {invoice_id} уже оплачен")
+                await query.answer(ok=False, error_message="Чек уже оплачен")
+                return
+            
+            remember_open_invoice(invoice_id, invoice_obj.amount, "KGS", invoice_obj.payment_status.value)
+            open_invoice = get_open_invoice(invoice_id)
         
-        # Проверяем, что чек еще не оплачен
-        if invoice_obj.payment_status == PaymentStatus.SUCCEEDED:
-            logger.warning(f"Чек {invoice_id} уже оплачен")
-            await query.answer(ok=False, error_message="Чек уже оплачен")
+        # Оплатить можно только чек, ожидающий оплаты: при промахе в кэш
+        # попадает текущий статус из БД, оплаченный чек из кэша удаляется
+        if open_invoice.status != PaymentStatus.PENDING.value:
+            logger.warning(f"Чек {invoice_id} в статусе {open_invoice.status}, оплата отклонена")
+            await query.answer(ok=False, error_message="Чек недоступен для оплаты")
             return
         
         # Проверяем сумму (в тийинах для KGS)
-        # Допускаем небольшую погрешность для округления (до 1 тийина)
-        expected_amount = int(invoice_obj.amount * 100)  # В тийинах (1 KGS = 100 тийинов)
-        actual_amount = query.total_amount
-        
-        logger.info(f"Сравнение сумм для чека {invoice_id}: ожидается {expected_amount} тийинов ({invoice_obj.amount} KGS), получено {actual_amount} тийинов")
-        
         # Допускаем разницу в 1 тийин из-за округления
-        amount_diff = abs(expected_amount - actual_amount)
+        amount_diff = abs(open_invoice.amount_minor - query.total_amount)
         if amount_diff > 1:
             logger.warning(
                 f"Неверная сумма для чека {invoice_id}: "
-                f"ожидается {expected_amount} тийинов ({invoice_obj.amount} KGS), "
-                f"получено {actual_amount} тийинов (разница: {amount_diff})"
+                f"ожидается {open_invoice.amount_minor} тийинов, "
+                f"получено {query.total_amount} тийинов (разница: {amount_diff})"
             )
             await query.answer(
                 ok=False,
-                error_message=f"Неверная сумма. Ожидается {invoice_obj.amount:.2f} KGS"
+                error_message=f"Неверная сумма. Ожидается {open_invoice.amount_minor / 100:.2f} KGS"
             )
             return
         
         # Проверяем валюту (допускаем KGS, даже если в базе другая)
-        if query.currency != "KGS":
+        if query.currency != open_invoice.currency:
             logger.warning(
                 f"Неверная валюта для чека {invoice_id}: "
-                f"ожидается KGS, получено {query.currency}"
+                f"ожидается {open_invoice.currency}, получено {query.currency}"
             )
             await query.answer(
                 ok=False,
-                error_message="Неверная валюта. Ожидается KGS"
+                error_message=f"Неверная валюта. Ожидается {open_invoice.currency}"
             )
             return
         
         # Подтверждаем платеж (Telegram требует ответ в течение 10 секунд)
         await query.answer(ok=True)
-        logger.info(f"✓ PreCheckoutQuery подтвержден для чека {invoice_id}, сумма {actual_amount} тийинов ({actual_amount/100:.2f} KGS)")
+        logger.debug(f"PreCheckoutQuery подтвержден для чека {invoice_id}, сумма {query.total_amount} тийинов")
         
     except ValueError as e:
         logger.error(f"Неверный формат invoice_payload в PreCheckoutQuery: {query.invoice_payload}, ошибка: {e}")
@@ -349,6 +371,8 @@ async def pre_checkout_query_handler(update: Update, context: ContextTypes.DEFAU
     except Exception as e:
         logger.error(f"Ошибка обработки PreCheckoutQuery: {e}", exc_info=True)
         await query.answer(ok=False, error_message="Ошибка обработки платежа")
+    finally:
+        record_pre_checkout_latency(invoice_id, time.perf_counter() - started)
 
 
 async def successful_payment_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -365,10 +389,26 @@ async def successful_payment_handler(update: Update, context: ContextTypes.DEFAU
         # Извлекаем invoice_id из payload
         invoice_id = int(payment.invoice_payload)
         
+        # Журнал платежей: повторная доставка того же платежа ничего не меняет
+        from bot.utils.payments import record_payment
+        if not record_payment(
+            db,
+            payment.telegram_payment_charge_id,
+            payment.provider_payment_charge_id,
+            invoice_id,
+            payment.total_amount,
+            payment.currency
+        ):
+            db.rollback()
+            logger.info(f"Платеж {payment.telegram_payment_charge_id} уже обработан, повтор пропущен")
+            return
+        
         # Получаем чек
         invoice_obj = db.query(Invoice).filter(Invoice.id == invoice_id).first()
         
         if not invoice_obj:
+            # Платеж все равно фиксируем в журнале
+            db.commit()
             logger.error(f"Чек {invoice_id} не найден для успешного платежа")
             return
         
@@ -376,40 +416,52 @@ async def successful_payment_handler(update: Update, context: ContextTypes.DEFAU
         invoice_obj.payment_status = PaymentStatus.SUCCEEDED
         invoice_obj.paid_at = datetime.utcnow()
         invoice_obj.payment_method = payment.currency  # Сохраняем валюту
+        
+        # Уведомления клиенту и мастеру уходят через outbox в той же транзакции
+        from bot.utils.i18n import format_datetime, t, user_language
+        from bot.utils.outbox import enqueue_message, kick_outbox
+        charge_id = payment.telegram_payment_charge_id
+        client_user = invoice_obj.client
+        master_user = invoice_obj.master_profile.user
+        master_language = user_language(master_user)
+        enqueue_message(
+            db,
+            client_user.telegram_id,
+            t(
+                "payment_succeeded",
+                user_language(client_user),
+                service=invoice_obj.description,
+                amount=invoice_obj.amount,
+                currency=invoice_obj.currency
+            ),
+            kind="payment",
+            dedup_key=f"payment:{charge_id}:client"
+        )
+        enqueue_message(
+            db,
+            master_user.telegram_id,
+            t(
+                "invoice_paid",
+                master_language,
+                service=invoice_obj.description,
+                client=client_user.full_name,
+                amount=invoice_obj.amount,
+                currency=invoice_obj.currency,
+                when=format_datetime(invoice_obj.paid_at, master_language)
+            ),
+            kind="payment",
+            dedup_key=f"payment:{charge_id}:master"
+        )
         db.commit()
+        kick_outbox()
         
-        logger.info(f"✓ Чек {invoice_id} успешно оплачен через Telegram Bot Payments")
+        from bot.utils.stats import invalidate_master_stats
+        invalidate_master_stats(invoice_obj.master_id)
         
-        # Уведомляем клиента
-        client = invoice_obj.client
-        try:
-            await context.bot.send_message(
-                chat_id=client.telegram_id,
-                text=(
-                    f"✅ Платеж успешно завершен!\n\n"
-                    f"Услуга: {invoice_obj.description}\n"
-                    f"Сумма: {invoice_obj.amount:.2f} {invoice_obj.currency}\n"
-                    f"Спасибо за оплату!"
-                )
-            )
-        except Exception as e:
-            logger.error(f"Ошибка отправки уведомления клиенту: {e}")
+        from bot.utils.payments import forget_open_invoice
+        forget_open_invoice(invoice_id)
         
-        # Уведомляем мастера
-        try:
-            master_user = invoice_obj.master_profile.user
-            await context.bot.send_message(
-                chat_id=master_user.telegram_id,
-                text=(
-                    f"✅ Чек оплачен!\n\n"
-                    f"Услуга: {invoice_obj.description}\n"
-                    f"Клиент: {invoice_obj.client.full_name}\n"
-                    f"Сумма: {invoice_obj.amount:.2f} {invoice_obj.currency}\n"
-                    f"Дата оплаты: {invoice_obj.paid_at.strftime('%d.%m.%Y %H:%M')}"
-                )
-            )
-        except Exception as e:
-            logger.error(f"Ошибка отправки уведомления мастеру: {e}")
+        logger.info(f"✓ Чек {invoice_id} успешно оплачен через Telegram Bot Payments")
         
     except ValueError as e:
         logger.error(f"Неверный формат invoice_payload: {payment.invoice_payload}, ошибка: {e}")
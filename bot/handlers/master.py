@@ -127,6 +127,7 @@ async def service_create_start(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
+    _clear_broadcast_state(context)
     context.user_data['creating_service'] = True
     context.user_data['service_data'] = {}
     
@@ -257,6 +258,9 @@ async def handle_service_duration(update: Update, context: ContextTypes.DEFAULT_
         db.add(service)
         db.commit()
         
+        from bot.utils.prefix_index import invalidate_prefix_index
+        invalidate_prefix_index()
+        
         context.user_data.pop('creating_service', None)
         context.user_data.pop('service_data', None)
         
@@ -347,6 +351,7 @@ async def service_edit_form_callback(update: Update, context: ContextTypes.DEFAU
         [InlineKeyboardButton("📄 Описание", callback_data=f"edit_service_description_{service_id}")],
         [InlineKeyboardButton("💰 Цена", callback_data=f"edit_service_price_{service_id}")],
         [InlineKeyboardButton("⏱ Длительность", callback_data=f"edit_service_duration_{service_id}")],
+        [InlineKeyboardButton("🕒 Шаг и буферы", callback_data=f"service_slots_{service_id}")],
         [InlineKeyboardButton("◀️ Назад", callback_data=f"service_edit_{service_id}")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -371,6 +376,7 @@ async def service_edit_name_start(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     await query.answer()
     
+    _clear_broadcast_state(context)
     service_id = int(query.data.split("_")[-1])
     
     context.user_data['editing_service'] = True
@@ -389,6 +395,7 @@ async def service_edit_description_start(update: Update, context: ContextTypes.D
     query = update.callback_query
     await query.answer()
     
+    _clear_broadcast_state(context)
     service_id = int(query.data.split("_")[-1])
     
     context.user_data['editing_service'] = True
@@ -407,6 +414,7 @@ async def service_edit_price_start(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
     
+    _clear_broadcast_state(context)
     service_id = int(query.data.split("_")[-1])
     
     context.user_data['editing_service'] = True
@@ -425,6 +433,7 @@ async def service_edit_duration_start(update: Update, context: ContextTypes.DEFA
     query = update.callback_query
     await query.answer()
     
+    _clear_broadcast_state(context)
     service_id = int(query.data.split("_")[-1])
     
     context.user_data['editing_service'] = True
@@ -480,6 +489,9 @@ async def handle_service_name_edit(update: Update, context: ContextTypes.DEFAULT
     service.name = service_name
     db.commit()
     
+    from bot.utils.prefix_index import invalidate_prefix_index
+    invalidate_prefix_index()
+    
     context.user_data.pop('editing_service', None)
     context.user_data.pop('editing_field', None)
     context.user_data.pop('editing_service_id', None)
@@ -599,6 +611,9 @@ async def handle_service_price_edit(update: Update, context: ContextTypes.DEFAUL
         service.price = price
         db.commit()
         
+        from bot.utils.prefix_index import invalidate_prefix_index
+        invalidate_prefix_index()
+        
         context.user_data.pop('editing_service', None)
         context.user_data.pop('editing_field', None)
         context.user_data.pop('editing_service_id', None)
@@ -663,6 +678,9 @@ async def handle_service_duration_edit(update: Update, context: ContextTypes.DEF
         service.duration_minutes = duration
         db.commit()
         
+        from bot.utils.prefix_index import invalidate_prefix_index
+        invalidate_prefix_index()
+        
         context.user_data.pop('editing_service', None)
         context.user_data.pop('editing_field', None)
         context.user_data.pop('editing_service_id', None)
@@ -703,6 +721,9 @@ async def service_toggle_hidden(update: Update, context: ContextTypes.DEFAULT_TY
     service.is_hidden = not service.is_hidden
     db.commit()
     
+    from bot.utils.prefix_index import invalidate_prefix_index
+    invalidate_prefix_index()
+    
     await query.answer(f"Услуга {'скрыта' if service.is_hidden else 'показана'}")
     # Обновляем сообщение с новой информацией
     keyboard = [
@@ -750,6 +771,9 @@ async def service_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db.delete(service)
     db.commit()
     
+    from bot.utils.prefix_index import invalidate_prefix_index
+    invalidate_prefix_index()
+    
     keyboard = [
         [InlineKeyboardButton("📋 Мои услуги", callback_data="master_services")],
         [InlineKeyboardButton("◀️ Главное меню", callback_data="start_menu")]
@@ -803,6 +827,9 @@ async def master_appointments_callback(update: Update, context: ContextTypes.DEF
     query = update.callback_query
     await query.answer()
     
+    # Сюда ведут "Назад" и "Отмена" рассылки
+    _clear_broadcast_state(context)
+    
     db = get_db_from_context(context)
     user_data = update.effective_user
     
@@ -912,12 +939,385 @@ async def master_appointments_callback(update: Update, context: ContextTypes.DEF
             url=client_link
         )])
     
+    buttons.append([InlineKeyboardButton("📣 Сообщение всем клиентам", callback_data="broadcast_start")])
     buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="start_menu")])
     
     reply_markup = InlineKeyboardMarkup(buttons)
     await safe_edit_message_text(query, message, reply_markup=reply_markup)
 
 
+def _clear_broadcast_state(context: ContextTypes.DEFAULT_TYPE):
+    """Очистка состояния рассылки: иначе следующий текст мастера уйдет в рассылку"""
+    context.user_data.pop('waiting_for_broadcast', None)
+    context.user_data.pop('broadcast_range', None)
+    context.user_data.pop('broadcast_text', None)
+
+
+async def broadcast_start_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Рассылка клиентам: выбор периода записей"""
+    query = update.callback_query
+    await query.answer()
+    
+    # Сюда же возвращает кнопка "Назад" с запроса текста
+    _clear_broadcast_state(context)
+    
+    from bot.utils.broadcast import BROADCAST_RANGES
+    
+    keyboard = [
+        [InlineKeyboardButton(title, callback_data=f"broadcast_range_{key}")]
+        for key, (title, _, _) in BROADCAST_RANGES.items()
+    ]
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="master_appointments")])
+    
+    await safe_edit_message_text(
+        query,
+        "📣 Сообщение клиентам\n\n"
+        "Сообщение получат все клиенты с записями на выбранный период\n"
+        "(каждый - один раз, даже если у него несколько записей).\n\n"
+        "Выберите период:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def broadcast_range_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Рассылка клиентам: выбран период, запрос текста"""
+    query = update.callback_query
+    
+    from bot.utils.broadcast import BROADCAST_RANGES, broadcast_period, get_broadcast_recipients
+    from bot.utils.timezones import master_now
+    
+    # На callback можно ответить только один раз: с ошибкой или обычный ответ
+    range_key = query.data[len("broadcast_range_"):]
+    if range_key not in BROADCAST_RANGES:
+        await query.answer("Неизвестный период")
+        return
+    await query.answer()
+    
+    db = get_db_from_context(context)
+    user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    
+    if not user or not user.master_profile:
+        await safe_edit_message_text(query, "Ошибка: профиль мастера не найден")
+        return
+    
+    master_id = user.master_profile.id
+    range_start, range_end = broadcast_period(range_key, master_now(db, master_id))
+    recipients = get_broadcast_recipients(db, master_id, range_start, range_end)
+    
+    if not recipients:
+        keyboard = [[InlineKeyboardButton("◀️ Назад", callback_data="broadcast_start")]]
+        await safe_edit_message_text(
+            query,
+            "На выбранный период нет клиентов с записями.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return
+    
+    context.user_data['waiting_for_broadcast'] = True
+    context.user_data['broadcast_range'] = range_key
+    context.user_data.pop('broadcast_text', None)
+    
+    keyboard = [[InlineKeyboardButton("◀️ Назад", callback_data="broadcast_start")]]
+    await safe_edit_message_text(
+        query,
+        f"📣 {BROADCAST_RANGES[range_key][0]}: клиентов - {len(recipients)}\n\n"
+        f"Отправьте текст сообщения (например, «Опаздываю на 15 минут»):",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def handle_broadcast_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Рассылка клиентам: текст получен, подтверждение"""
+    if not context.user_data.get('waiting_for_broadcast'):
+        return
+    
+    from bot.utils.broadcast import BROADCAST_MAX_LENGTH, BROADCAST_RANGES
+    
+    text = (update.message.text or "").strip()
+    if not text:
+        await update.message.reply_text("Отправьте текст сообщения:")
+        return
+    if len(text) > BROADCAST_MAX_LENGTH:
+        await update.message.reply_text(
+            f"❌ Слишком длинное сообщение (максимум {BROADCAST_MAX_LENGTH} символов). Сократите текст:"
+        )
+        return
+    
+    context.user_data.pop('waiting_for_broadcast', None)
+    context.user_data['broadcast_text'] = text
+    range_title = BROADCAST_RANGES[context.user_data.get('broadcast_range', 'today')][0]
+    
+    keyboard = [
+        [InlineKeyboardButton("✅ Отправить", callback_data="broadcast_send")],
+        [InlineKeyboardButton("❌ Отмена", callback_data="master_appointments")]
+    ]
+    await update.message.reply_text(
+        f"📣 Рассылка ({range_title.lower()})\n\n{text}\n\nОтправить клиентам?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def broadcast_send_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Рассылка клиентам: постановка сообщений в outbox"""
+    query = update.callback_query
+    await query.answer()
+    
+    text = context.user_data.get('broadcast_text')
+    range_key = context.user_data.get('broadcast_range')
+    
+    if not text or not range_key:
+        await safe_edit_message_text(query, "Ошибка: потеряны данные. Начните заново.")
+        return
+    
+    db = get_db_from_context(context)
+    user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    
+    if not user or not user.master_profile:
+        await safe_edit_message_text(query, "Ошибка: профиль мастера не найден")
+        return
+    
+    from bot.utils.broadcast import broadcast_period, create_broadcast
+    from bot.utils.outbox import kick_outbox
+    from bot.utils.timezones import master_now
+    
+    master_id = user.master_profile.id
+    range_start, range_end = broadcast_period(range_key, master_now(db, master_id))
+    
+    # Получатели и сообщения фиксируются одной транзакцией - рассылка переживет перезапуск
+    broadcast = create_broadcast(db, master_id, text, range_start, range_end)
+    db.commit()
+    kick_outbox()
+    
+    context.user_data.pop('broadcast_text', None)
+    context.user_data.pop('broadcast_range', None)
+    
+    await _show_broadcast_progress(query, db, broadcast.id)
+
+
+async def broadcast_status_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обновление прогресса рассылки"""
+    query = update.callback_query
+    await query.answer()
+    
+    # callback_data: broadcast_status_{id}
+    broadcast_id = int(query.data.split("_")[-1])
+    
+    db = get_db_from_context(context)
+    user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    
+    from bot.models import Broadcast
+    broadcast = db.get(Broadcast, broadcast_id)
+    
+    if not broadcast or not user or not user.master_profile or broadcast.master_id != user.master_profile.id:
+        await safe_edit_message_text(query, "❌ Рассылка не найдена")
+        return
+    
+    await _show_broadcast_progress(query, db, broadcast_id)
+
+
+async def _show_broadcast_progress(query, db: Session, broadcast_id: int):
+    """Экран прогресса рассылки"""
+    from bot.models import Broadcast, OutboxStatus
+    from bot.utils.broadcast import get_broadcast_progress
+    
+    broadcast = db.get(Broadcast, broadcast_id)
+    progress = get_broadcast_progress(db, broadcast_id)
+    sent = progress.get(OutboxStatus.SENT, 0)
+    failed = progress.get(OutboxStatus.FAILED, 0)
+    pending = progress.get(OutboxStatus.PENDING, 0)
+    
+    keyboard = []
+    if pending:
+        keyboard.append([InlineKeyboardButton("🔄 Обновить", callback_data=f"broadcast_status_{broadcast_id}")])
+    keyboard.append([InlineKeyboardButton("◀️ К записям", callback_data="master_appointments")])
+    
+    message = (
+        f"📣 Рассылка {'отправляется' if pending else 'завершена'}\n\n"
+        f"Получателей: {broadcast.recipients}\n"
+        f"✅ Доставлено: {sent}\n"
+        f"⏳ В очереди: {pending}"
+    )
+    if failed:
+        message += f"\n❌ Не доставлено: {failed} (например, клиент заблокировал бота)"
+    
+    await safe_edit_message_text(query, message, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+def _format_master_stats(stats: dict) -> str:
+    """Текст статистики мастера"""
+    from bot.utils.stats import STATS_PERIOD_DAYS
+    
+    booked_hours = stats['booked_minutes'] / 60
+    scheduled_hours = stats['scheduled_minutes'] / 60
+    
+    message = (
+        f"📊 Статистика\n\n"
+        f"💰 Выручка (оплаченные чеки):\n"
+        f"   Сегодня: {stats['revenue_today']:.2f}\n"
+        f"   7 дней: {stats['revenue_week']:.2f}\n"
+        f"   30 дней: {stats['revenue_month']:.2f}\n"
+        f"   Всего: {stats['revenue_total']:.2f}\n\n"
+        f"📅 За последние {STATS_PERIOD_DAYS} дней:\n"
+        f"   Записей: {stats['appointments_total']}\n"
+        f"   Завершено: {stats['completed']}\n"
+        f"   Отмены: {stats['cancelled']} ({stats['cancellation_rate']:.0%})\n"
+        f"   Неявки: {stats['no_show']} ({stats['no_show_rate']:.0%})\n"
+        f"   Загрузка: {booked_hours:.1f} из {scheduled_hours:.1f} ч. ({stats['utilization']:.0%})\n"
+    )
+    
+    if stats['top_services']:
+        message += "\n🏆 Популярные услуги:\n"
+        for i, (name, count, total) in enumerate(stats['top_services'], start=1):
+            message += f"   {i}. {name} - {count} зап. ({total:.2f})\n"
+    
+    return message
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /stats"""
+    db = get_db_from_context(context)
+    user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    
+    if not user or not user.master_profile:
+        await update.message.reply_text("❌ Статистика доступна только мастерам")
+        return
+    
+    from bot.utils.stats import get_master_stats
+    stats = get_master_stats(db, user.master_profile.id)
+    
+    await update.message.reply_text(_format_master_stats(stats))
+
+
+async def master_stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Просмотр статистики мастера"""
+    query = update.callback_query
+    await query.answer()
+    
+    db = get_db_from_context(context)
+    user_data = update.effective_user
+    
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile:
+        await safe_edit_message_text(query, "Ошибка: профиль мастера не найден")
+        return
+    
+    from bot.utils.stats import get_master_stats
+    stats = get_master_stats(db, user.master_profile.id)
+    
+    keyboard = [
+        [InlineKeyboardButton("◀️ Назад", callback_data="start_menu")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await safe_edit_message_text(query, _format_master_stats(stats), reply_markup=reply_markup)
+
+
+def _export_format_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура выбора формата выгрузки"""
+    keyboard = [
+        [
+            InlineKeyboardButton("📊 CSV", callback_data="master_export_csv"),
+            InlineKeyboardButton("🧾 JSONL", callback_data="master_export_jsonl")
+        ],
+        [InlineKeyboardButton("◀️ Назад", callback_data="master_settings")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+EXPORT_MENU_TEXT = (
+    "📤 Экспорт истории\n\n"
+    "Выгрузка всех записей, услуг и чеков для бухгалтерии.\n\n"
+    "Выберите формат файла:"
+)
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /export"""
+    db = get_db_from_context(context)
+    user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    
+    if not user or not user.master_profile:
+        await update.message.reply_text("❌ Экспорт доступен только мастерам")
+        return
+    
+    await update.message.reply_text(EXPORT_MENU_TEXT, reply_markup=_export_format_keyboard())
+
+
+async def master_export_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Меню экспорта истории мастера"""
+    query = update.callback_query
+    await query.answer()
+    
+    await safe_edit_message_text(query, EXPORT_MENU_TEXT, reply_markup=_export_format_keyboard())
+
+
+async def master_export_format_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузка истории мастера в выбранном формате и отправка файлом"""
+    query = update.callback_query
+    await query.answer()
+    
+    export_format = query.data.split("_")[-1]
+    
+    db = get_db_from_context(context)
+    user_data = update.effective_user
+    
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile:
+        await safe_edit_message_text(query, "Ошибка: профиль мастера не найден")
+        return
+    
+    master_id = user.master_profile.id
+    
+    await safe_edit_message_text(query, "⏳ Готовим файл с историей записей...")
+    
+    import asyncio
+    import os
+    from pathlib import Path
+    from bot.database import worker_sessions_available
+    from bot.utils.export import export_master_history_to_file
+    
+    # Выгрузка выполняется в отдельном потоке с собственным соединением к БД,
+    # чтобы не блокировать обработку других пользователей; SQLite в памяти
+    # доступна только из цикла событий
+    try:
+        if worker_sessions_available():
+            path, rows = await asyncio.to_thread(export_master_history_to_file, master_id, export_format)
+        else:
+            path, rows = export_master_history_to_file(master_id, export_format, db)
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки истории мастера {master_id}: {e}")
+        await safe_edit_message_text(query, "❌ Не удалось подготовить выгрузку. Попробуйте позже.")
+        return
+    
+    try:
+        filename = f"history_{datetime.now().strftime('%Y%m%d')}.{export_format}"
+        # PTB читает файл синхронно, поэтому содержимое читается в отдельном потоке
+        content = await asyncio.to_thread(Path(path).read_bytes)
+        await context.bot.send_document(
+            chat_id=user_data.id,
+            document=content,
+            filename=filename,
+            caption=f"📤 История записей: {rows} строк"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка отправки выгрузки мастеру {master_id}: {e}")
+        await safe_edit_message_text(query, "❌ Не удалось отправить файл. Попробуйте позже.")
+        return
+    finally:
+        os.remove(path)
+    
+    keyboard = [
+        [InlineKeyboardButton("◀️ Назад в настройки", callback_data="master_settings")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await safe_edit_message_text(query, f"✅ Файл отправлен ({rows} строк)", reply_markup=reply_markup)
+    
+    logger.info(f"Мастер {user.id} выгрузил историю в формате {export_format}")
+
+
 async def master_settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Настройки мастера"""
     query = update.callback_query
@@ -935,19 +1335,26 @@ async def master_settings_callback(update: Update, context: ContextTypes.DEFAULT
     
     master_profile = user.master_profile
     
+    from bot.utils.timezones import master_timezone
+    
     keyboard = [
         [InlineKeyboardButton(
             f"🔔 Уведомления: за {master_profile.default_notification_hours} ч.",
             callback_data="settings_notifications"
         )],
         [InlineKeyboardButton("📅 Расписание работы", callback_data="schedule_settings")],
+        [InlineKeyboardButton("🕒 Шаг записи и буферы", callback_data="settings_slots")],
+        [InlineKeyboardButton(f"🌍 Часовой пояс: {master_timezone(master_profile)}", callback_data="settings_timezone")],
+        [InlineKeyboardButton("📤 Экспорт истории", callback_data="master_export")],
         [InlineKeyboardButton("◀️ Назад", callback_data="start_menu")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     message = (
         f"⚙️ Настройки\n\n"
-        f"🔔 Напоминание клиентам: за {master_profile.default_notification_hours} часов до записи\n\n"
+        f"🔔 Напоминание клиентам: за {master_profile.default_notification_hours} часов до записи\n"
+        f"🕒 Шаг записи: {master_profile.slot_step_minutes or 30} мин., "
+        f"буферы: {master_profile.buffer_before_minutes or 0} / {master_profile.buffer_after_minutes or 0} мин.\n\n"
         f"Выберите настройку:"
     )
     
@@ -1021,6 +1428,299 @@ async def set_notification_hours(update: Update, context: ContextTypes.DEFAULT_T
     logger.info(f"Мастер {user.id} установил время уведомлений: {hours} часов")
 
 
+async def settings_timezone_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Настройка часового пояса мастера"""
+    query = update.callback_query
+    await query.answer()
+    
+    db = get_db_from_context(context)
+    
+    user_data = update.effective_user
+    
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile:
+        await safe_edit_message_text(query, "Ошибка: профиль мастера не найден")
+        return
+    
+    from bot.utils.timezones import COMMON_TIMEZONES, local_now, master_timezone
+    
+    current = master_timezone(user.master_profile)
+    
+    keyboard = []
+    for index, name in enumerate(COMMON_TIMEZONES):
+        mark = "✓ " if name == current else ""
+        keyboard.append([InlineKeyboardButton(
+            f"{mark}{name} ({local_now(name).strftime('%H:%M')})",
+            callback_data=f"set_tz_{index}"
+        )])
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="master_settings")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    message = (
+        "🌍 Часовой пояс\n\n"
+        "Расписание и время записей показываются по вашим часам, а по поясу\n"
+        "определяется, какое время уже прошло и когда отправлять напоминания.\n\n"
+        f"Сейчас: {current}"
+    )
+    
+    await safe_edit_message_text(query, message, reply_markup=reply_markup)
+
+
+async def set_timezone_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Установка часового пояса мастера"""
+    query = update.callback_query
+    
+    from bot.utils.timezones import COMMON_TIMEZONES
+    
+    index = int(query.data.split("_")[-1])
+    if not 0 <= index < len(COMMON_TIMEZONES):
+        await query.answer("Ошибка выбора")
+        return
+    
+    db = get_db_from_context(context)
+    
+    user_data = update.effective_user
+    
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile:
+        await query.answer("Ошибка: профиль мастера не найден")
+        return
+    
+    master_profile = user.master_profile
+    master_profile.timezone = COMMON_TIMEZONES[index]
+    
+    # Напоминания хранятся в UTC - пересчитываем неотправленные под новый пояс
+    from bot.models import Notification, NotificationType
+    from bot.utils.notifications import reschedule_reminders
+    
+    appointments = db.query(Appointment).filter(
+        Appointment.master_id == master_profile.id,
+        Appointment.id.in_(
+            db.query(Notification.appointment_id).filter(
+                Notification.is_sent == False,
+                Notification.notification_type == NotificationType.REMINDER
+            )
+        )
+    ).all()
+    for appointment in appointments:
+        reschedule_reminders(db, appointment, master_profile.default_notification_hours or 24)
+    
+    db.commit()
+    
+    from bot.utils.stats import invalidate_master_stats
+    invalidate_master_stats(master_profile.id)
+    
+    logger.info(f"Мастер {user.id} установил часовой пояс {master_profile.timezone}")
+    
+    await settings_timezone_callback(update, context)
+
+
+# Шаг записи и буферы
+
+# Допустимые значения шага и буферов в минутах
+SLOT_STEP_OPTIONS = [5, 10, 15, 20, 30, 60]
+BUFFER_OPTIONS = [0, 5, 10, 15, 30]
+
+# Поля настроек и подписи
+SLOT_RULE_FIELDS = {
+    "step": ("slot_step_minutes", "Шаг начала записи", SLOT_STEP_OPTIONS),
+    "before": ("buffer_before_minutes", "Буфер до записи", BUFFER_OPTIONS),
+    "after": ("buffer_after_minutes", "Буфер после записи", BUFFER_OPTIONS),
+}
+
+
+def _slot_rules_keyboard(current: dict, callback_prefix: str, inherit: bool = False) -> list:
+    """
+    Строки клавиатуры выбора шага и буферов
+    
+    Args:
+        current: Текущие значения по ключам SLOT_RULE_FIELDS (None - как у мастера)
+        callback_prefix: Префикс callback_data, к нему добавляется "{ключ}_{значение}"
+        inherit: Добавить вариант "как у мастера" (значение -1)
+    """
+    keyboard = []
+    for key, (_, title, options) in SLOT_RULE_FIELDS.items():
+        keyboard.append([InlineKeyboardButton(f"— {title} —", callback_data="ignore")])
+        row = []
+        if inherit:
+            mark = "✓ " if current[key] is None else ""
+            row.append(InlineKeyboardButton(f"{mark}мастер", callback_data=f"{callback_prefix}{key}_-1"))
+        for value in options:
+            mark = "✓ " if current[key] == value else ""
+            row.append(InlineKeyboardButton(f"{mark}{value}", callback_data=f"{callback_prefix}{key}_{value}"))
+        keyboard.append(row)
+    return keyboard
+
+
+async def settings_slots_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Настройка шага записи и буферов мастера"""
+    query = update.callback_query
+    await query.answer()
+    
+    db = get_db_from_context(context)
+    
+    user_data = update.effective_user
+    
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile:
+        await safe_edit_message_text(query, "Ошибка: профиль мастера не найден")
+        return
+    
+    from bot.utils.availability import resolve_slot_rules
+    
+    rules = resolve_slot_rules(user.master_profile)
+    current = {
+        "step": rules.step_minutes,
+        "before": rules.buffer_before_minutes,
+        "after": rules.buffer_after_minutes,
+    }
+    
+    keyboard = _slot_rules_keyboard(current, "set_slot_")
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="master_settings")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    message = (
+        "🕒 Шаг записи и буферы\n\n"
+        "Шаг - с какой периодичностью клиенту предлагается время начала.\n"
+        "Буферы - свободное время до и после каждой записи (подготовка, уборка).\n"
+        "Для отдельной услуги их можно изменить в ее настройках.\n\n"
+        f"Сейчас: шаг {current['step']} мин., буферы {current['before']} / {current['after']} мин."
+    )
+    
+    await safe_edit_message_text(query, message, reply_markup=reply_markup)
+
+
+async def set_slot_rule_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Установка шага записи или буфера мастера"""
+    query = update.callback_query
+    
+    # set_slot_{ключ}_{значение}
+    _, _, key, value = query.data.split("_")
+    if key not in SLOT_RULE_FIELDS:
+        await query.answer("Ошибка выбора")
+        return
+    field, _, options = SLOT_RULE_FIELDS[key]
+    value = int(value)
+    if value not in options:
+        await query.answer("Ошибка выбора")
+        return
+    
+    db = get_db_from_context(context)
+    
+    user_data = update.effective_user
+    
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile:
+        await query.answer("Ошибка: профиль мастера не найден")
+        return
+    
+    setattr(user.master_profile, field, value)
+    
+    # Буферы входят в занятое время всех записей мастера
+    from bot.utils.availability import invalidate_availability
+    invalidate_availability(db, user.master_profile.id)
+    db.commit()
+    
+    logger.info(f"Мастер {user.id} установил {field} = {value}")
+    
+    await settings_slots_callback(update, context)
+
+
+async def service_slots_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Настройка шага записи и буферов отдельной услуги"""
+    query = update.callback_query
+    await query.answer()
+    
+    service_id = int(query.data.split("_")[-1])
+    
+    db = get_db_from_context(context)
+    service = db.query(Service).filter(Service.id == service_id).first()
+    
+    if not service:
+        await safe_edit_message_text(query, "Услуга не найдена")
+        return
+    
+    # Проверка владельца услуги
+    user_data = update.effective_user
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile or user.master_profile.id != service.master_id:
+        await safe_edit_message_text(query, "❌ У вас нет прав для редактирования этой услуги")
+        return
+    
+    await _show_service_slots(query, user.master_profile, service)
+
+
+async def _show_service_slots(query, master_profile: MasterProfile, service: Service):
+    """Экран шага записи и буферов услуги"""
+    from bot.utils.availability import resolve_slot_rules
+    
+    service_id = service.id
+    current = {
+        key: getattr(service, field)
+        for key, (field, _, _) in SLOT_RULE_FIELDS.items()
+    }
+    rules = resolve_slot_rules(master_profile, service)
+    
+    keyboard = _slot_rules_keyboard(current, f"service_rule_{service_id}_", inherit=True)
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data=f"service_edit_form_{service_id}")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    message = (
+        f"🕒 Шаг и буферы: {service.name}\n\n"
+        f"«мастер» - использовать общие настройки мастера.\n\n"
+        f"Действует: шаг {rules.step_minutes} мин., "
+        f"буферы {rules.buffer_before_minutes} / {rules.buffer_after_minutes} мин."
+    )
+    
+    await safe_edit_message_text(query, message, reply_markup=reply_markup)
+
+
+async def set_service_slot_rule_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Установка шага записи или буфера услуги"""
+    query = update.callback_query
+    
+    # service_rule_{service_id}_{ключ}_{значение}
+    parts = query.data.split("_")
+    service_id, key, value = int(parts[2]), parts[3], int(parts[4])
+    if key not in SLOT_RULE_FIELDS:
+        await query.answer("Ошибка выбора")
+        return
+    field, _, options = SLOT_RULE_FIELDS[key]
+    if value != -1 and value not in options:
+        await query.answer("Ошибка выбора")
+        return
+    
+    db = get_db_from_context(context)
+    service = db.query(Service).filter(Service.id == service_id).first()
+    
+    if not service:
+        await query.answer("Услуга не найдена")
+        return
+    
+    user_data = update.effective_user
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile or user.master_profile.id != service.master_id:
+        await query.answer("❌ У вас нет прав для редактирования этой услуги")
+        return
+    
+    setattr(service, field, None if value == -1 else value)
+    
+    from bot.utils.availability import invalidate_availability
+    invalidate_availability(db, service.master_id)
+    db.commit()
+    
+    logger.info(f"Мастер {user.id} установил для услуги {service_id} {field} = {getattr(service, field)}")
+    
+    await query.answer()
+    await _show_service_slots(query, user.master_profile, service)
+
+
 # Обработчики расписания мастера
 
 async def schedule_settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1077,7 +1777,8 @@ async def schedule_settings_callback(update: Update, context: ContextTypes.DEFAU
     
     keyboard = [
         [InlineKeyboardButton("📅 Общее расписание (дни недели)", callback_data="schedule_weekly")],
-        [InlineKeyboardButton("📆 Календарь месяца", callback_data="schedule_calendar_month")]
+        [InlineKeyboardButton("📆 Календарь месяца", callback_data="schedule_calendar_month")],
+        [InlineKeyboardButton("🗓 Массовое заполнение", callback_data="schedule_bulk")]
     ]
     keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="master_settings")])
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1088,7 +1789,8 @@ async def schedule_settings_callback(update: Update, context: ContextTypes.DEFAU
         f"Текущее общее расписание:\n{schedule_info}\n"
         f"Вы можете настроить:\n"
         f"• Общее расписание - рабочие дни недели\n"
-        f"• Календарь месяца - индивидуальные дни с особым расписанием\n\n"
+        f"• Календарь месяца - индивидуальные дни с особым расписанием\n"
+        f"• Массовое заполнение - часы работы или выходные сразу на период\n\n"
         f"Если день месяца не отредактирован, применяется общее расписание."
     )
     
@@ -1177,8 +1879,9 @@ async def schedule_calendar_month_callback(update: Update, context: ContextTypes
         await safe_edit_message_text(query, "Ошибка: профиль мастера не найден")
         return
     
-    # Показываем текущий месяц
-    today = datetime.now()
+    # Показываем текущий месяц (по часам мастера)
+    from bot.utils.timezones import master_now
+    today = master_now(db, user.master_profile.id)
     from bot.utils.schedule_calendar import get_schedule_month_keyboard
     
     keyboard = get_schedule_month_keyboard(
@@ -1443,6 +2146,9 @@ async def schedule_set_day_off(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     
     db.add(slot)
+    
+    from bot.utils.availability import invalidate_availability
+    invalidate_availability(db, user.master_profile.id, days=[selected_date])
     db.commit()
     
     await query.answer("✅ Выходной день установлен")
@@ -1483,6 +2189,8 @@ async def schedule_remove_date(update: Update, context: ContextTypes.DEFAULT_TYP
     for slot in existing_slots:
         db.delete(slot)
     
+    from bot.utils.availability import invalidate_availability
+    invalidate_availability(db, user.master_profile.id, days=[selected_date])
     db.commit()
     
     await query.answer("✅ Индивидуальное расписание удалено")
@@ -1496,6 +2204,7 @@ async def schedule_set_time_start(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     await query.answer()
     
+    _clear_broadcast_state(context)
     parts = query.data.split("_")
     # Формат: schedule_set_time_{year}_{month:02d}_{day:02d}
     # parts[0]=schedule, parts[1]=set, parts[2]=time, parts[3]=year, parts[4]=month, parts[5]=day
@@ -1623,6 +2332,9 @@ async def handle_schedule_date_end_time(update: Update, context: ContextTypes.DE
         )
         
         db.add(slot)
+        
+        from bot.utils.availability import invalidate_availability
+        invalidate_availability(db, user.master_profile.id, days=[selected_date])
         db.commit()
         
         context.user_data.pop('setting_schedule_date', None)
@@ -1652,6 +2364,228 @@ async def handle_schedule_date_end_time(update: Update, context: ContextTypes.DE
         )
 
 
+def _clear_bulk_schedule_state(context: ContextTypes.DEFAULT_TYPE):
+    """Очистка состояния массового редактирования расписания"""
+    context.user_data.pop('setting_schedule_bulk', None)
+    context.user_data.pop('schedule_bulk_weekdays', None)
+    context.user_data.pop('schedule_data', None)
+
+
+async def schedule_bulk_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Массовое заполнение расписания - выбор дней недели и действия"""
+    query = update.callback_query
+    await query.answer()
+    
+    if query.data.startswith("schedule_bulk_day_"):
+        day_num = int(query.data.split("_")[-1])
+        weekdays = set(context.user_data.get('schedule_bulk_weekdays', range(7)))
+        if day_num in weekdays:
+            weekdays.discard(day_num)
+        else:
+            weekdays.add(day_num)
+        context.user_data['schedule_bulk_weekdays'] = sorted(weekdays)
+    elif 'schedule_bulk_weekdays' not in context.user_data:
+        context.user_data['schedule_bulk_weekdays'] = list(range(7))
+    
+    from bot.utils.schedule import DAYS_OF_WEEK
+    weekdays = context.user_data['schedule_bulk_weekdays']
+    
+    keyboard = []
+    for day_num in range(7):
+        mark = "✅" if day_num in weekdays else "▫️"
+        keyboard.append([InlineKeyboardButton(
+            f"{mark} {DAYS_OF_WEEK[day_num]}",
+            callback_data=f"schedule_bulk_day_{day_num}"
+        )])
+    
+    keyboard.append([InlineKeyboardButton("🕐 Установить рабочие часы", callback_data="schedule_bulk_hours")])
+    keyboard.append([InlineKeyboardButton("❌ Отметить выходными", callback_data="schedule_bulk_off")])
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="schedule_settings")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    message = (
+        f"🗓 Массовое заполнение расписания\n\n"
+        f"Отметьте дни недели, к которым нужно применить изменения,\n"
+        f"затем выберите действие и укажите период.\n\n"
+        f"Индивидуальное расписание выбранных дат будет заменено."
+    )
+    
+    await safe_edit_message_text(query, message, reply_markup=reply_markup)
+
+
+async def schedule_bulk_action_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор действия массового заполнения и запрос периода"""
+    query = update.callback_query
+    
+    # На callback можно ответить только один раз: alert или обычный ответ
+    weekdays = context.user_data.get('schedule_bulk_weekdays', list(range(7)))
+    if not weekdays:
+        await query.answer("Выберите хотя бы один день недели", show_alert=True)
+        return
+    await query.answer()
+    _clear_broadcast_state(context)
+    
+    is_day_off = query.data == "schedule_bulk_off"
+    
+    context.user_data['setting_schedule_bulk'] = True
+    context.user_data['schedule_data'] = {
+        'weekdays': weekdays,
+        'is_day_off': is_day_off
+    }
+    
+    action_text = "выходные дни" if is_day_off else "рабочие часы"
+    
+    await safe_edit_message_text(
+        query,
+        f"🗓 Массовое заполнение: {action_text}\n\n"
+        f"Введите период в формате ДД.ММ.ГГГГ-ДД.ММ.ГГГГ\n"
+        f"(например: 01.03.2025-31.05.2025):"
+    )
+
+
+async def handle_schedule_bulk_range(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка периода массового заполнения расписания"""
+    text = update.message.text.strip()
+    
+    try:
+        start_str, end_str = [part.strip() for part in text.split("-")]
+        start_date = datetime.strptime(start_str, "%d.%m.%Y").date()
+        end_date = datetime.strptime(end_str, "%d.%m.%Y").date()
+    except ValueError:
+        await update.message.reply_text(
+            "❌ Неверный формат периода. Введите период в формате ДД.ММ.ГГГГ-ДД.ММ.ГГГГ:"
+        )
+        return
+    
+    from bot.utils.schedule import MAX_BULK_SCHEDULE_DAYS
+    
+    if end_date < start_date:
+        await update.message.reply_text(
+            "❌ Дата окончания должна быть не раньше даты начала. Введите период заново:"
+        )
+        return
+    
+    if (end_date - start_date).days >= MAX_BULK_SCHEDULE_DAYS:
+        await update.message.reply_text(
+            f"❌ Период не может превышать {MAX_BULK_SCHEDULE_DAYS} дней. Введите период заново:"
+        )
+        return
+    
+    # Сегодня - по часам мастера
+    from bot.utils.timezones import local_now, master_timezone
+    db = get_db_from_context(context)
+    user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    today = local_now(master_timezone(user.master_profile if user else None)).date()
+    
+    if start_date < today:
+        await update.message.reply_text(
+            "❌ Период не может начинаться в прошлом. Введите период заново:"
+        )
+        return
+    
+    schedule_data = context.user_data.get('schedule_data', {})
+    schedule_data['start_date'] = start_date
+    schedule_data['end_date'] = end_date
+    context.user_data['schedule_data'] = schedule_data
+    
+    if schedule_data.get('is_day_off'):
+        await _apply_bulk_schedule(update, context)
+        return
+    
+    await update.message.reply_text(
+        f"✅ Период: {start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}\n\n"
+        f"Введите рабочие часы в формате ЧЧ:ММ-ЧЧ:ММ (например: 09:00-18:00):"
+    )
+
+
+async def handle_schedule_bulk_hours(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка рабочих часов массового заполнения расписания"""
+    text = update.message.text.strip()
+    
+    try:
+        start_str, end_str = [part.strip() for part in text.split("-")]
+        work_start = datetime.strptime(start_str, "%H:%M").time()
+        work_end = datetime.strptime(end_str, "%H:%M").time()
+    except ValueError:
+        await update.message.reply_text(
+            "❌ Неверный формат времени. Введите часы в формате ЧЧ:ММ-ЧЧ:ММ (например: 09:00-18:00):"
+        )
+        return
+    
+    if work_end <= work_start:
+        await update.message.reply_text(
+            "❌ Время окончания должно быть позже времени начала. Введите корректное время:"
+        )
+        return
+    
+    schedule_data = context.user_data.get('schedule_data', {})
+    schedule_data['work_start'] = work_start
+    schedule_data['work_end'] = work_end
+    context.user_data['schedule_data'] = schedule_data
+    
+    await _apply_bulk_schedule(update, context)
+
+
+async def _apply_bulk_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Применение массового заполнения расписания одной транзакцией"""
+    schedule_data = context.user_data.get('schedule_data', {})
+    
+    db = get_db_from_context(context)
+    user_data = update.effective_user
+    
+    user = db.query(User).filter(User.telegram_id == user_data.id).first()
+    
+    if not user or not user.master_profile:
+        await update.message.reply_text("❌ Ошибка: профиль мастера не найден")
+        _clear_bulk_schedule_state(context)
+        return
+    
+    from bot.utils.schedule import apply_schedule_template, DAYS_OF_WEEK
+    
+    try:
+        inserted, deleted = apply_schedule_template(
+            db,
+            user.master_profile.id,
+            schedule_data['start_date'],
+            schedule_data['end_date'],
+            weekdays=schedule_data.get('weekdays'),
+            work_start=schedule_data.get('work_start'),
+            work_end=schedule_data.get('work_end'),
+            is_day_off=schedule_data.get('is_day_off', False)
+        )
+    except (ValueError, KeyError) as e:
+        logger.error(f"Ошибка массового заполнения расписания: {e}")
+        await update.message.reply_text("❌ Не удалось применить расписание. Начните заново.")
+        _clear_bulk_schedule_state(context)
+        return
+    
+    _clear_bulk_schedule_state(context)
+    
+    start_date = schedule_data['start_date']
+    days_text = ", ".join(DAYS_OF_WEEK[d] for d in schedule_data.get('weekdays', []))
+    if schedule_data.get('is_day_off'):
+        action_text = "❌ Выходной"
+    else:
+        action_text = f"🕐 {schedule_data['work_start'].strftime('%H:%M')} - {schedule_data['work_end'].strftime('%H:%M')}"
+    
+    keyboard = [
+        [InlineKeyboardButton("📆 Календарь", callback_data=f"schedule_month_{start_date.year}_{start_date.month:02d}")],
+        [InlineKeyboardButton("◀️ Назад", callback_data="schedule_settings")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await update.message.reply_text(
+        f"✅ Расписание обновлено\n\n"
+        f"📅 Период: {start_date.strftime('%d.%m.%Y')} - {schedule_data['end_date'].strftime('%d.%m.%Y')}\n"
+        f"📆 Дни: {days_text}\n"
+        f"{action_text}\n\n"
+        f"Изменено дат: {inserted}",
+        reply_markup=reply_markup
+    )
+    
+    logger.info(f"Мастер {user.id} применил массовое расписание: добавлено {inserted}, удалено {deleted}")
+
+
 async def schedule_day_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка выбора дня недели для настройки"""
     query = update.callback_query
@@ -1723,6 +2657,7 @@ async def schedule_set_work_hours_start(update: Update, context: ContextTypes.DE
     query = update.callback_query
     await query.answer()
     
+    _clear_broadcast_state(context)
     day_num = int(query.data.split("_")[-1])
     
     context.user_data['setting_schedule'] = True
@@ -1754,6 +2689,12 @@ async def schedule_remove_day(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         if slot:
             db.delete(slot)
+            
+            from bot.utils.availability import invalidate_availability
+            if slot.specific_date:
+                invalidate_availability(db, slot.master_id, days=[slot.specific_date])
+            else:
+                invalidate_availability(db, slot.master_id)
             db.commit()
             await query.answer("Расписание удалено")
             # Обновляем экран
@@ -1782,6 +2723,9 @@ async def schedule_remove_day(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         for slot in slots:
             db.delete(slot)
+        
+        from bot.utils.availability import invalidate_availability
+        invalidate_availability(db, user.master_profile.id)
         db.commit()
         
         await query.answer("Расписание для дня удалено")
@@ -1888,6 +2832,9 @@ async def handle_schedule_end_time(update: Update, context: ContextTypes.DEFAULT
         )
         
         db.add(slot)
+        
+        from bot.utils.availability import invalidate_availability
+        invalidate_availability(db, user.master_profile.id)
         db.commit()
         
         context.user_data.pop('setting_schedule', None)
@@ -1948,20 +2895,28 @@ async def complete_appointment_callback(update: Update, context: ContextTypes.DE
     
     # Помечаем запись как завершенную
     appointment.status = AppointmentStatus.COMPLETED
-    db.commit()
     
     # Уведомляем клиента
-    try:
-        client = appointment.client
-        await context.bot.send_message(
-            chat_id=client.telegram_id,
-            text=f"✅ Услуга оказана!\n\n"
-                 f"Услуга: {appointment.service.name}\n"
-                 f"Дата: {appointment.start_time.strftime('%d.%m.%Y %H:%M')}\n\n"
-                 f"Мастер выставит чек для оплаты."
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления клиенту: {e}")
+    from bot.utils.i18n import format_datetime, t, user_language
+    from bot.utils.outbox import enqueue_message, kick_outbox
+    client_language = user_language(appointment.client)
+    enqueue_message(
+        db,
+        appointment.client.telegram_id,
+        t(
+            "appointment_completed",
+            client_language,
+            service=appointment.service.name,
+            when=format_datetime(appointment.start_time, client_language)
+        ),
+        kind="appointment",
+        dedup_key=f"appointment:{appointment.id}:completed:client"
+    )
+    db.commit()
+    kick_outbox()
+    
+    from bot.utils.stats import invalidate_master_stats
+    invalidate_master_stats(appointment.master_id)
     
     # Обновляем сообщение для мастера
     await safe_edit_message_text(
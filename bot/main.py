@@ -1,10 +1,16 @@
 """
 Главный файл Telegram-бота для записи к мастерам
 """
-import logging
-import sys
-from telegram import Update
-from telegram.ext import (
+import time
+
+# Время начала запуска процесса (для профиля запуска)
+_process_started = time.perf_counter()
+
+import logging  # noqa: E402 - импорты после отметки времени начала запуска
+import sys  # noqa: E402
+from contextlib import contextmanager  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import (  # noqa: E402
     Application,
     CommandHandler,
     CallbackQueryHandler,
@@ -12,10 +18,15 @@ from telegram.ext import (
     filters,
     ContextTypes
 )
-from bot.config import BOT_TOKEN, LOG_LEVEL
-from bot.database import init_db, get_db_session
-from bot.handlers import common, master, client, invoice
-from bot.utils.notifications import start_scheduler
+from bot.config import BOT_TOKEN, LOG_LEVEL, SHARD_WORKERS, STARTUP_PROFILE, TIMEZONE  # noqa: E402
+from bot.database import init_db, get_db_session, is_schema_current, store_schema_fingerprint  # noqa: E402
+# Модуль чеков (bot.handlers.invoice) и планировщик импортируются при первом обращении
+from bot.handlers import common, master, client  # noqa: E402
+
+_imports_seconds = time.perf_counter() - _process_started
+
+# Префиксы callback_data обработчиков чеков
+INVOICE_CALLBACK_PREFIXES = ("create_invoice_", "payment_method_", "pay_invoice_", "check_payment_")
 
 # Настройка логирования
 logging.basicConfig(
@@ -30,6 +41,17 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@contextmanager
+def startup_phase(name: str):
+    """Замер длительности этапа запуска (логируется при STARTUP_PROFILE=true)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if STARTUP_PROFILE:
+            logger.info(f"⏱ Запуск: {name} - {(time.perf_counter() - started) * 1000:.1f} мс")
+
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик ошибок"""
     logger.error(f"Exception while handling an update: {context.error}", exc_info=context.error)
@@ -64,9 +86,15 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
     
     if query.data == "calendar_back":
         # Возврат к календарю
-        today = __import__('datetime').datetime.now()
         from bot.utils.calendar import get_month_keyboard
-        keyboard = get_month_keyboard(today.year, today.month)
+        from bot.utils.timezones import local_now, master_now
+        master_id = context.user_data.get('selected_master_id')
+        if master_id:
+            today = master_now(common.get_db_from_context(context), master_id)
+        else:
+            # Мастер не выбран - календарь по поясу TIMEZONE из конфигурации
+            today = local_now(TIMEZONE)
+        keyboard = get_month_keyboard(today.year, today.month, today.date())
         service = context.user_data.get('selected_service')
         message = (
             f"📅 Выберите дату для услуги:\n\n"
@@ -98,6 +126,12 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
         await master.master_appointments_callback(update, context)
     elif query.data == "master_settings":
         await master.master_settings_callback(update, context)
+    elif query.data == "master_stats":
+        await master.master_stats_callback(update, context)
+    elif query.data == "master_export":
+        await master.master_export_callback(update, context)
+    elif query.data in ("master_export_csv", "master_export_jsonl"):
+        await master.master_export_format_callback(update, context)
     elif query.data == "schedule_settings":
         await master.schedule_settings_callback(update, context)
     elif query.data == "schedule_weekly":
@@ -126,20 +160,41 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
         await master.schedule_remove_date(update, context)
     elif query.data.startswith("schedule_set_time_"):
         await master.schedule_set_time_start(update, context)
-    elif query.data.startswith("create_invoice_"):
-        await invoice.create_invoice_callback(update, context)
-    elif query.data.startswith("payment_method_"):
-        await invoice.payment_method_callback(update, context)
+    elif query.data == "schedule_bulk" or query.data.startswith("schedule_bulk_day_"):
+        await master.schedule_bulk_callback(update, context)
+    elif query.data in ("schedule_bulk_hours", "schedule_bulk_off"):
+        await master.schedule_bulk_action_start(update, context)
+    elif query.data == "broadcast_start":
+        await master.broadcast_start_callback(update, context)
+    elif query.data.startswith("broadcast_range_"):
+        await master.broadcast_range_callback(update, context)
+    elif query.data == "broadcast_send":
+        await master.broadcast_send_callback(update, context)
+    elif query.data.startswith("broadcast_status_"):
+        await master.broadcast_status_callback(update, context)
     elif query.data.startswith("complete_appointment_"):
         await master.complete_appointment_callback(update, context)
-    elif query.data.startswith("pay_invoice_"):
-        await invoice.pay_invoice_callback(update, context)
-    elif query.data.startswith("check_payment_"):
-        await invoice.check_payment_status_callback(update, context)
+    elif query.data.startswith(INVOICE_CALLBACK_PREFIXES):
+        # Модуль чеков импортируется при первом обращении
+        from bot.handlers import invoice
+        if query.data.startswith("create_invoice_"):
+            await invoice.create_invoice_callback(update, context)
+        elif query.data.startswith("payment_method_"):
+            await invoice.payment_method_callback(update, context)
+        elif query.data.startswith("pay_invoice_"):
+            await invoice.pay_invoice_callback(update, context)
+        else:
+            await invoice.check_payment_status_callback(update, context)
     
     # Обработка callback для клиентов
     elif query.data == "book_by_link":
         await client.book_by_link_start(update, context)
+    elif query.data == "search_masters":
+        await client.search_masters_start(update, context)
+    elif query.data.startswith("search_page_"):
+        await client.search_page_callback(update, context)
+    elif query.data.startswith("search_master_"):
+        await client.search_master_selected(update, context)
     elif query.data.startswith("service_select_"):
         await client.service_select_callback(update, context)
     elif query.data.startswith("date_"):
@@ -148,20 +203,46 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
         await client.time_selected_callback(update, context)
     elif query.data == "appointment_confirm":
         await client.appointment_confirm_callback(update, context)
+    elif query.data == "series_options":
+        await client.series_options_callback(update, context)
+    elif query.data == "series_confirm":
+        await client.series_confirm_callback(update, context)
+    elif query.data.startswith("series_"):
+        await client.series_selected_callback(update, context)
     elif query.data.startswith("month_"):
         await client.month_navigation_callback(update, context)
     elif query.data == "feedback":
         await common.feedback_callback(update, context)
+    elif query.data.startswith("language_set_"):
+        await common.language_selected_callback(update, context)
     elif query.data == "client_appointments":
         await client.client_appointments_callback(update, context)
     elif query.data.startswith("cancel_appointment_"):
         await client.cancel_appointment_callback(update, context)
+    elif query.data == "waitlist_join":
+        await client.waitlist_join_callback(update, context)
+    elif query.data.startswith("waitlist_accept_"):
+        await client.waitlist_accept_callback(update, context)
+    elif query.data.startswith("waitlist_decline_"):
+        await client.waitlist_decline_callback(update, context)
     elif query.data.startswith("master_link_from_appointment_"):
         await client.show_master_profile_from_appointment(update, context)
     elif query.data == "settings_notifications":
         await master.settings_notifications_callback(update, context)
     elif query.data.startswith("set_notif_"):
         await master.set_notification_hours(update, context)
+    elif query.data == "settings_timezone":
+        await master.settings_timezone_callback(update, context)
+    elif query.data.startswith("set_tz_"):
+        await master.set_timezone_callback(update, context)
+    elif query.data == "settings_slots":
+        await master.settings_slots_callback(update, context)
+    elif query.data.startswith("set_slot_"):
+        await master.set_slot_rule_callback(update, context)
+    elif query.data.startswith("service_slots_"):
+        await master.service_slots_callback(update, context)
+    elif query.data.startswith("service_rule_"):
+        await master.set_service_slot_rule_callback(update, context)
     elif query.data.startswith("edit_service_name_"):
         await master.service_edit_name_start(update, context)
     elif query.data.startswith("edit_service_description_"):
@@ -202,6 +283,16 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await master.handle_schedule_date_end_time(update, context)
         return
     
+    # Проверка на массовое заполнение расписания
+    if context.user_data.get('setting_schedule_bulk'):
+        schedule_data = context.user_data.get('schedule_data', {})
+        
+        if 'start_date' not in schedule_data:
+            await master.handle_schedule_bulk_range(update, context)
+        else:
+            await master.handle_schedule_bulk_hours(update, context)
+        return
+    
     # Проверка на создание услуги
     if context.user_data.get('creating_service'):
         service_data = context.user_data.get('service_data', {})
@@ -231,43 +322,96 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await master.handle_service_duration_edit(update, context, service_id)
         return
     
+    # Проверка на текст рассылки клиентам
+    if context.user_data.get('waiting_for_broadcast'):
+        await master.handle_broadcast_text(update, context)
+        return
+    
     # Проверка на ожидание ссылки
     if context.user_data.get('waiting_for_link'):
         await client.handle_link_input(update, context)
         return
     
+    # Проверка на поисковый запрос
+    if context.user_data.get('waiting_for_search'):
+        await client.handle_search_input(update, context)
+        return
+    
     # Проверка на обратную связь
     if context.user_data.get('waiting_for_feedback'):
         await common.handle_feedback(update, context)
         return
 
 
-def main():
-    """Главная функция запуска бота"""
-    logger.info("Запуск Telegram-бота...")
+async def pre_checkout_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """PreCheckoutQuery (модуль чеков импортируется при первом обращении)"""
+    from bot.handlers import invoice
+    await invoice.pre_checkout_query_handler(update, context)
+
+
+async def successful_payment_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """successful_payment (модуль чеков импортируется при первом обращении)"""
+    from bot.handlers import invoice
+    await invoice.successful_payment_handler(update, context)
+
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline-запрос (модуль импортируется при первом обращении)"""
+    from bot.handlers import inline
+    await inline.inline_query_handler(update, context)
+
+
+async def post_init(application: Application):
+    """Запуск фоновых задач после инициализации приложения"""
+    import asyncio
+    from bot.utils.outbox import run_outbox_dispatcher
     
-    # Инициализация БД
-    init_db()
-    logger.info("База данных инициализирована")
+    bulk_bot = application.bot_data['bulk_bot']
+    await bulk_bot.initialize()
     
-    # Выполнение миграций
-    try:
-        from bot.migrations import run_all_migrations
-        run_all_migrations()
-        logger.info("Миграции выполнены")
-    except Exception as e:
-        logger.warning(f"Ошибка при выполнении миграций (можно игнорировать если база новая): {e}")
+    # Диспетчер исходящих сообщений (outbox) отправляет через пул bulk
+    application.bot_data['outbox_task'] = asyncio.create_task(
+        run_outbox_dispatcher(bulk_bot, get_db_session)
+    )
     
-    # Инициализация платежной системы (Telegram Bot Payments / FreedomPay KG)
-    try:
-        from bot.utils.payments import init_payments
-        init_payments()
-        logger.info("Платежная система инициализирована")
-    except Exception as e:
-        logger.warning(f"Ошибка инициализации платежной системы: {e}")
+    if STARTUP_PROFILE:
+        logger.info(f"⏱ Запуск: до приема обновлений - {(time.perf_counter() - _process_started) * 1000:.1f} мс")
+
+
+async def post_shutdown(application: Application):
+    """Закрытие пула фоновых отправок"""
+    await application.bot_data['bulk_bot'].shutdown()
+
+
+def build_application() -> Application:
+    """
+    Создание приложения с зарегистрированными обработчиками
+    
+    Используется и в обычном режиме, и в процессах-воркерах шардирования.
+    """
+    from telegram.ext import ExtBot
+    from bot.utils.http_pools import build_request
+    from bot.utils.outbound import PRIORITY_INTERACTIVE, PRIORITY_REMINDER, OutboundRateLimiter
+    
+    # Создание приложения: ответы пользователям и getUpdates - в отдельных пулах соединений
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(build_request("interactive"))
+        .get_updates_request(build_request("updates"))
+        .rate_limiter(OutboundRateLimiter(PRIORITY_INTERACTIVE))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
-    # Создание приложения
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Фоновые отправки (outbox, напоминания) идут через свой пул и не занимают соединения ответов;
+    # оба бота делят одну приоритетную очередь исходящих запросов (bot.utils.outbound)
+    application.bot_data['bulk_bot'] = ExtBot(
+        BOT_TOKEN,
+        request=build_request("bulk"),
+        rate_limiter=OutboundRateLimiter(PRIORITY_REMINDER)
+    )
     
     # Добавление сессии БД в bot_data
     application.bot_data['db_session'] = get_db_session
@@ -275,10 +419,17 @@ def main():
     # Регистрация обработчиков команд
     application.add_handler(CommandHandler("start", common.start_command))
     application.add_handler(CommandHandler("help", common.help_command))
+    application.add_handler(CommandHandler("export", master.export_command))
+    application.add_handler(CommandHandler("stats", master.stats_command))
+    application.add_handler(CommandHandler("language", common.language_command))
     
     # Регистрация обработчика callback queries
     application.add_handler(CallbackQueryHandler(callback_query_handler))
     
+    # Регистрация обработчика inline-запросов (@bot <название>)
+    from telegram.ext import InlineQueryHandler
+    application.add_handler(InlineQueryHandler(inline_query_handler))
+    
     # Регистрация обработчика сообщений
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
     # Обработчик контактов (для запроса телефона)
@@ -287,9 +438,9 @@ def main():
     # Регистрация обработчиков Telegram Bot Payments
     # Обработчик PreCheckoutQuery (для подтверждения оплаты перед оплатой)
     from telegram.ext import PreCheckoutQueryHandler
-    application.add_handler(PreCheckoutQueryHandler(invoice.pre_checkout_query_handler))
+    application.add_handler(PreCheckoutQueryHandler(pre_checkout_query_handler))
     # Обработчик successful_payment (после успешной оплаты)
-    application.add_handler(MessageHandler(filters.SUCCESSFUL_PAYMENT, invoice.successful_payment_handler))
+    application.add_handler(MessageHandler(filters.SUCCESSFUL_PAYMENT, successful_payment_handler))
     
     # Логируем все входящие сообщения для отладки платежей
     async def log_all_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -305,10 +456,64 @@ def main():
     # Регистрация обработчика ошибок
     application.add_error_handler(error_handler)
     
+    return application
+
+
+def main():
+    """Главная функция запуска бота"""
+    logger.info("Запуск Telegram-бота...")
+    
+    if STARTUP_PROFILE:
+        logger.info(f"⏱ Запуск: импорт модулей - {_imports_seconds * 1000:.1f} мс")
+    
+    with startup_phase("проверка схемы БД"):
+        schema_current = is_schema_current()
+    
+    if schema_current:
+        logger.info("Схема БД актуальна, create_all и миграции пропущены")
+    else:
+        # Инициализация БД
+        with startup_phase("create_all"):
+            init_db()
+        logger.info("База данных инициализирована")
+        
+        # Выполнение миграций
+        try:
+            with startup_phase("миграции"):
+                from bot.migrations import run_all_migrations
+                migrated = run_all_migrations()
+            # Отпечаток сохраняется только после всех миграций, иначе при
+            # следующем запуске неудавшиеся миграции были бы пропущены
+            if migrated:
+                logger.info("Миграции выполнены")
+                store_schema_fingerprint()
+            else:
+                logger.warning("Не все миграции выполнены, отпечаток схемы не сохранен")
+        except Exception as e:
+            logger.warning(f"Ошибка при выполнении миграций (можно игнорировать если база новая): {e}")
+    
+    # Инициализация платежной системы (Telegram Bot Payments / FreedomPay KG)
+    try:
+        from bot.utils.payments import init_payments
+        init_payments()
+        logger.info("Платежная система инициализирована")
+    except Exception as e:
+        logger.warning(f"Ошибка инициализации платежной системы: {e}")
+    
+    # Режим шардирования: процесс приема обновлений и N процессов-воркеров
+    if SHARD_WORKERS > 1:
+        from bot.sharding import run_sharded
+        run_sharded(SHARD_WORKERS)
+        return
+    
+    with startup_phase("создание приложения"):
+        application = build_application()
+    
     # Запуск планировщика уведомлений
     try:
-        from bot.utils.notifications import start_scheduler
-        start_scheduler(application.bot, get_db_session)
+        with startup_phase("планировщик"):
+            from bot.utils.notifications import start_scheduler
+            start_scheduler(application.bot_data['bulk_bot'], get_db_session)
     except Exception as e:
         logger.warning(f"Не удалось запустить планировщик уведомлений: {e}")
     
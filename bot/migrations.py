@@ -1,5 +1,8 @@
 """
 Миграции базы данных
+
+Каждая миграция возвращает True, если она выполнена или не требуется, и
+False при ошибке (ошибка логируется, транзакция откатывается).
 """
 from sqlalchemy import text, inspect
 from bot.database import engine, SessionLocal
@@ -21,7 +24,7 @@ def migrate_schedule_slots():
         if 'schedule_slots' not in inspector.get_table_names():
             logger.info("Таблица schedule_slots не существует, пропускаем миграцию")
             db.commit()
-            return
+            return True
         
         columns = [col['name'] for col in inspector.get_columns('schedule_slots')]
         
@@ -36,12 +39,14 @@ def migrate_schedule_slots():
             db.commit()
         
         logger.info("Миграция schedule_slots выполнена успешно")
+        return True
         
     except Exception as e:
         logger.error(f"Ошибка при миграции: {e}")
         db.rollback()
         # Не поднимаем исключение, чтобы бот мог продолжить работу
         logger.warning("Миграция пропущена, возможно таблица уже обновлена")
+        return False
     finally:
         db.close()
 
@@ -64,19 +69,324 @@ def migrate_invoices():
             logger.info("Таблица invoices создана успешно")
         else:
             logger.info("Таблица invoices уже существует")
+        return True
         
     except Exception as e:
         logger.error(f"Ошибка при миграции invoices: {e}")
         db.rollback()
         logger.warning("Миграция invoices пропущена")
+        return False
+    finally:
+        db.close()
+
+
+def migrate_outbox():
+    """
+    Добавление столбцов next_attempt_at, reply_markup и broadcast_id в таблицу outbox
+    """
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        
+        if 'outbox' not in inspector.get_table_names():
+            logger.info("Таблица outbox не существует, пропускаем миграцию")
+            return True
+        
+        columns = [col['name'] for col in inspector.get_columns('outbox')]
+        
+        if 'next_attempt_at' not in columns:
+            logger.info("Добавление столбца next_attempt_at в outbox")
+            db.execute(text("ALTER TABLE outbox ADD COLUMN next_attempt_at TIMESTAMP"))
+            db.execute(text("CREATE INDEX IF NOT EXISTS ix_outbox_next_attempt_at ON outbox (next_attempt_at)"))
+        
+        if 'reply_markup' not in columns:
+            logger.info("Добавление столбца reply_markup в outbox")
+            db.execute(text("ALTER TABLE outbox ADD COLUMN reply_markup TEXT"))
+        
+        if 'broadcast_id' not in columns:
+            logger.info("Добавление столбца broadcast_id в outbox")
+            db.execute(text("ALTER TABLE outbox ADD COLUMN broadcast_id INTEGER REFERENCES broadcasts(id)"))
+            db.execute(text("CREATE INDEX IF NOT EXISTS ix_outbox_broadcast_id ON outbox (broadcast_id)"))
+        
+        db.commit()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при миграции outbox: {e}")
+        db.rollback()
+        logger.warning("Миграция outbox пропущена")
+        return False
+    finally:
+        db.close()
+
+
+def migrate_leases():
+    """
+    Добавление столбцов аренды (claimed_by, lease_until) в notifications и outbox
+    """
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        tables = inspector.get_table_names()
+        
+        for table in ('notifications', 'outbox'):
+            if table not in tables:
+                continue
+            
+            columns = [col['name'] for col in inspector.get_columns(table)]
+            
+            if 'claimed_by' not in columns:
+                logger.info(f"Добавление столбца claimed_by в {table}")
+                db.execute(text(f"ALTER TABLE {table} ADD COLUMN claimed_by VARCHAR(100)"))
+            
+            if 'lease_until' not in columns:
+                logger.info(f"Добавление столбца lease_until в {table}")
+                db.execute(text(f"ALTER TABLE {table} ADD COLUMN lease_until TIMESTAMP"))
+        
+        db.commit()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при миграции аренды: {e}")
+        db.rollback()
+        logger.warning("Миграция аренды пропущена")
+        return False
     finally:
         db.close()
 
 
-def run_all_migrations():
-    """Запуск всех миграций"""
-    migrate_schedule_slots()
-    migrate_invoices()
+def migrate_notification_indexes():
+    """
+    Создание частичного индекса по неотправленным уведомлениям
+    """
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        
+        if 'notifications' not in inspector.get_table_names():
+            logger.info("Таблица notifications не существует, пропускаем миграцию")
+            return True
+        
+        indexes = [index['name'] for index in inspector.get_indexes('notifications')]
+        
+        if 'ix_notifications_pending_scheduled_for' not in indexes:
+            logger.info("Создание индекса ix_notifications_pending_scheduled_for")
+            condition = "is_sent = false" if engine.dialect.name == "postgresql" else "is_sent = 0"
+            db.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_notifications_pending_scheduled_for "
+                f"ON notifications (scheduled_for) WHERE {condition}"
+            ))
+            db.commit()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при миграции индексов notifications: {e}")
+        db.rollback()
+        logger.warning("Миграция индексов notifications пропущена")
+        return False
+    finally:
+        db.close()
+
+
+def migrate_slot_rules():
+    """
+    Добавление шага записи и буферов в master_profiles и services
+    """
+    new_columns = {
+        'master_profiles': {
+            'slot_step_minutes': "INTEGER DEFAULT 30",
+            'buffer_before_minutes': "INTEGER DEFAULT 0",
+            'buffer_after_minutes': "INTEGER DEFAULT 0",
+        },
+        'services': {
+            'slot_step_minutes': "INTEGER",
+            'buffer_before_minutes': "INTEGER",
+            'buffer_after_minutes': "INTEGER",
+        },
+    }
+    
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        tables = inspector.get_table_names()
+        
+        for table, table_columns in new_columns.items():
+            if table not in tables:
+                continue
+            
+            columns = [col['name'] for col in inspector.get_columns(table)]
+            
+            for column, ddl in table_columns.items():
+                if column not in columns:
+                    logger.info(f"Добавление столбца {column} в {table}")
+                    db.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        
+        db.commit()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при миграции шага и буферов: {e}")
+        db.rollback()
+        logger.warning("Миграция шага и буферов пропущена")
+        return False
+    finally:
+        db.close()
+
+
+def migrate_timezones():
+    """
+    Добавление часового пояса мастера в master_profiles
+    """
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        if 'master_profiles' not in inspector.get_table_names():
+            return True
+        
+        columns = [col['name'] for col in inspector.get_columns('master_profiles')]
+        
+        if 'timezone' not in columns:
+            logger.info("Добавление столбца timezone в master_profiles")
+            db.execute(text("ALTER TABLE master_profiles ADD COLUMN timezone VARCHAR(64)"))
+        
+        db.commit()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при миграции часовых поясов: {e}")
+        db.rollback()
+        logger.warning("Миграция часовых поясов пропущена")
+        return False
+    finally:
+        db.close()
+
+
+def migrate_master_search():
+    """
+    Создание индекса поиска мастеров (FTS5 / tsvector) и его заполнение
+    """
+    from bot.utils.search import create_search_index, rebuild_search_index
+    
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        tables = inspector.get_table_names()
+        
+        if 'services' not in tables:
+            logger.info("Таблица services не существует, пропускаем миграцию")
+            return True
+        
+        # Индекс по мастеру нужен триггерам индекса поиска
+        indexes = [index['name'] for index in inspector.get_indexes('services')]
+        if 'ix_services_master_id' not in indexes:
+            logger.info("Создание индекса ix_services_master_id")
+            db.execute(text("CREATE INDEX IF NOT EXISTS ix_services_master_id ON services (master_id)"))
+        
+        created = 'master_search' not in tables
+        if create_search_index(db) and created:
+            logger.info("Заполнение индекса поиска мастеров")
+            rebuild_search_index(db)
+        
+        db.commit()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при миграции поиска мастеров: {e}")
+        db.rollback()
+        logger.warning("Миграция поиска мастеров пропущена")
+        return False
+    finally:
+        db.close()
+
+
+def migrate_appointment_series():
+    """
+    Добавление series_id (регулярные записи) в appointments и appointments_archive
+    """
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        tables = inspector.get_table_names()
+        
+        for table in ('appointments', 'appointments_archive'):
+            if table not in tables:
+                continue
+            
+            columns = [col['name'] for col in inspector.get_columns(table)]
+            if 'series_id' not in columns:
+                logger.info(f"Добавление столбца series_id в {table}")
+                db.execute(text(f"ALTER TABLE {table} ADD COLUMN series_id VARCHAR(32)"))
+        
+        if 'appointments' in tables:
+            db.execute(text("CREATE INDEX IF NOT EXISTS ix_appointments_series_id ON appointments (series_id)"))
+        
+        db.commit()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при миграции серий записей: {e}")
+        db.rollback()
+        logger.warning("Миграция серий записей пропущена")
+        return False
+    finally:
+        db.close()
+
+
+def migrate_user_language():
+    """
+    Добавление языка уведомлений в users
+    """
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        if 'users' not in inspector.get_table_names():
+            return True
+        
+        columns = [col['name'] for col in inspector.get_columns('users')]
+        
+        if 'language' not in columns:
+            logger.info("Добавление столбца language в users")
+            db.execute(text("ALTER TABLE users ADD COLUMN language VARCHAR(8)"))
+        
+        db.commit()
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при миграции языка пользователей: {e}")
+        db.rollback()
+        logger.warning("Миграция языка пользователей пропущена")
+        return False
+    finally:
+        db.close()
+
+
+def run_all_migrations() -> bool:
+    """
+    Запуск всех миграций
+    
+    Ошибка одной миграции не останавливает остальные, чтобы бот мог
+    продолжить работу.
+    
+    Returns:
+        True если все миграции выполнены (или не требовались)
+    """
+    migrations = [
+        migrate_schedule_slots,
+        migrate_invoices,
+        migrate_outbox,
+        migrate_leases,
+        migrate_notification_indexes,
+        migrate_slot_rules,
+        migrate_timezones,
+        migrate_master_search,
+        migrate_appointment_series,
+        migrate_user_language,
+    ]
+    failed = [migration.__name__ for migration in migrations if not migration()]
+    
+    if failed:
+        logger.warning(f"Миграции с ошибками: {', '.join(failed)}")
+    return not failed
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, Boolean, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, Boolean, ForeignKey, Text, LargeBinary, Index, UniqueConstraint, Enum as SQLEnum, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, date
@@ -33,6 +33,7 @@ class User(Base):
     username = Column(String(255), nullable=True)
     full_name = Column(String(255), nullable=True)
     role = Column(SQLEnum(UserRole), nullable=False, default=UserRole.CLIENT)
+    language = Column(String(8), nullable=True)  # Язык уведомлений (bot.utils.i18n), NULL - по умолчанию
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -50,6 +51,10 @@ class MasterProfile(Base):
     description = Column(Text, nullable=True)
     phone = Column(String(50), nullable=True)
     default_notification_hours = Column(Integer, default=24)  # За сколько часов напоминать
+    slot_step_minutes = Column(Integer, default=30)  # Шаг времени начала записи
+    buffer_before_minutes = Column(Integer, default=0)  # Подготовка перед записью
+    buffer_after_minutes = Column(Integer, default=0)  # Уборка после записи
+    timezone = Column(String(64), nullable=True)  # Часовой пояс (None - TIMEZONE из конфигурации)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -64,11 +69,15 @@ class Service(Base):
     __tablename__ = "services"
 
     id = Column(Integer, primary_key=True)
-    master_id = Column(Integer, ForeignKey("master_profiles.id"), nullable=False)
+    master_id = Column(Integer, ForeignKey("master_profiles.id"), nullable=False, index=True)
     name = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     price = Column(Float, nullable=False)
     duration_minutes = Column(Integer, nullable=False)
+    # Шаг и буферы услуги; None - как в профиле мастера
+    slot_step_minutes = Column(Integer, nullable=True)
+    buffer_before_minutes = Column(Integer, nullable=True)
+    buffer_after_minutes = Column(Integer, nullable=True)
     is_active = Column(Boolean, default=True)
     is_hidden = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -96,6 +105,22 @@ class ScheduleSlot(Base):
     master = relationship("MasterProfile", back_populates="schedule_slots")
 
 
+class AvailabilityDay(Base):
+    """Материализованная доступность мастера на день (битовые маски квантов времени)"""
+    __tablename__ = "availability_days"
+    __table_args__ = (
+        UniqueConstraint("master_id", "day", name="uq_availability_days_master_day"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    master_id = Column(Integer, ForeignKey("master_profiles.id"), nullable=False, index=True)
+    day = Column(Date, nullable=False)
+    quantum_minutes = Column(Integer, nullable=False, default=5)  # Размер кванта в минутах
+    work_mask = Column(LargeBinary, nullable=False)  # Рабочие кванты по расписанию
+    busy_mask = Column(LargeBinary, nullable=False)  # Кванты, занятые записями
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Appointment(Base):
     __tablename__ = "appointments"
 
@@ -109,6 +134,7 @@ class Appointment(Base):
     client_name = Column(String(255), nullable=True)
     client_phone = Column(String(50), nullable=True)
     notes = Column(Text, nullable=True)
+    series_id = Column(String(32), nullable=True, index=True)  # Общий для записей регулярной серии
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -122,6 +148,16 @@ class Appointment(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Частичный индекс только по неотправленным уведомлениям: стоимость выборки
+        # готовых к отправке зависит от очереди, а не от всей истории
+        Index(
+            "ix_notifications_pending_scheduled_for",
+            "scheduled_for",
+            sqlite_where=text("is_sent = 0"),
+            postgresql_where=text("is_sent = false")
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=False)
@@ -129,6 +165,8 @@ class Notification(Base):
     sent_at = Column(DateTime, nullable=True)
     scheduled_for = Column(DateTime, nullable=False)
     is_sent = Column(Boolean, default=False)
+    claimed_by = Column(String(100), nullable=True)  # Экземпляр бота, взявший уведомление в работу
+    lease_until = Column(DateTime, nullable=True)  # До этого времени уведомление не берут другие экземпляры
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -172,6 +210,77 @@ class Invoice(Base):
     client = relationship("User", foreign_keys=[client_id])
 
 
+class PaymentLedgerEntry(Base):
+    """Журнал успешных платежей (только добавление, одна строка на платеж Telegram)"""
+    __tablename__ = "payment_ledger"
+
+    id = Column(Integer, primary_key=True)
+    telegram_payment_charge_id = Column(String(255), nullable=False, unique=True)
+    provider_payment_charge_id = Column(String(255), nullable=True)
+    invoice_id = Column(Integer, nullable=False, index=True)  # Без внешнего ключа: журнал не зависит от чеков
+    amount_minor = Column(Integer, nullable=False)  # Сумма в минимальных единицах (тийины)
+    currency = Column(String(10), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class OutboxStatus(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class Broadcast(Base):
+    """Рассылка мастера клиентам с записями на период; сообщения - строки outbox с broadcast_id"""
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True)
+    master_id = Column(Integer, ForeignKey("master_profiles.id"), nullable=False, index=True)
+    text = Column(Text, nullable=False)
+    range_start = Column(DateTime, nullable=False)  # Период записей получателей (на часах мастера)
+    range_end = Column(DateTime, nullable=False)
+    recipients = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class OutboxMessage(Base):
+    """Исходящее сообщение Telegram, записанное в одной транзакции с изменением состояния"""
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    dedup_key = Column(String(255), nullable=True, unique=True)  # Ключ для однократной постановки
+    kind = Column(String(50), nullable=False, default="message")  # payment, appointment, ...
+    chat_id = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    reply_markup = Column(Text, nullable=True)  # JSON InlineKeyboardMarkup
+    broadcast_id = Column(Integer, ForeignKey("broadcasts.id"), nullable=True, index=True)  # Сообщение рассылки мастера
+    status = Column(SQLEnum(OutboxStatus), nullable=False, default=OutboxStatus.PENDING, index=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=True, index=True)  # Не раньше этого времени (повтор)
+    claimed_by = Column(String(100), nullable=True)  # Экземпляр бота, взявший сообщение в работу
+    lease_until = Column(DateTime, nullable=True)  # До этого времени сообщение не берут другие экземпляры
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class LeaderLock(Base):
+    """Блокировка лидера: только держатель выполняет фоновую задачу с этим именем"""
+    __tablename__ = "leader_locks"
+
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(100), nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+
+
+class SchemaVersion(Base):
+    """Отпечаток схемы БД, для которой уже выполнены create_all и миграции"""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Feedback(Base):
     __tablename__ = "feedback"
 
@@ -182,3 +291,105 @@ class Feedback(Base):
     rating = Column(Integer, nullable=True)  # 1-5
     created_at = Column(DateTime, default=datetime.utcnow)
 
+
+class WaitlistStatus(enum.Enum):
+    WAITING = "waiting"  # Ждет освобождения времени
+    OFFERED = "offered"  # Предложено время, ждем ответа до offer_expires_at
+    BOOKED = "booked"  # Клиент записался
+    EXPIRED = "expired"  # Предложение или дата истекли
+    DECLINED = "declined"  # Клиент отказался
+
+
+class WaitlistEntry(Base):
+    """Подписка клиента на освобождение времени у мастера на дату"""
+    __tablename__ = "waitlist"
+    __table_args__ = (
+        UniqueConstraint("client_id", "master_id", "service_id", "date", name="uq_waitlist_client_slot"),
+        # Подбор при отмене: поиск по (мастер, дата, статус) в порядке очереди
+        Index("ix_waitlist_master_date", "master_id", "date", "status", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    master_id = Column(Integer, ForeignKey("master_profiles.id"), nullable=False)
+    service_id = Column(Integer, ForeignKey("services.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    status = Column(SQLEnum(WaitlistStatus), nullable=False, default=WaitlistStatus.WAITING)
+    offer_start_time = Column(DateTime, nullable=True)  # Предложенное время начала (на часах мастера)
+    offer_expires_at = Column(DateTime, nullable=True)  # UTC
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    client = relationship("User")
+    service = relationship("Service")
+
+
+class SlotHold(Base):
+    """Временное удержание выбранного времени до подтверждения записи (SLOT_HOLDS_SHARED)"""
+    __tablename__ = "slot_holds"
+    __table_args__ = (
+        Index("ix_slot_holds_master_start", "master_id", "start_time"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)  # Одно удержание на клиента
+    master_id = Column(Integer, ForeignKey("master_profiles.id"), nullable=False)
+    start_time = Column(DateTime, nullable=False)  # Вместе с буферами, на часах мастера
+    end_time = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # UTC
+
+
+
+# Архивные таблицы: записи, чеки и уведомления, перенесенные задачей хранения данных
+# (bot/utils/retention.py). Внешних ключей нет, чтобы архив не мешал удалению связанных строк.
+
+class AppointmentArchive(Base):
+    __tablename__ = "appointments_archive"
+
+    id = Column(Integer, primary_key=True)
+    master_id = Column(Integer, nullable=False, index=True)
+    client_id = Column(Integer, nullable=False)
+    service_id = Column(Integer, nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    status = Column(SQLEnum(AppointmentStatus))
+    client_name = Column(String(255), nullable=True)
+    client_phone = Column(String(50), nullable=True)
+    notes = Column(Text, nullable=True)
+    series_id = Column(String(32), nullable=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class InvoiceArchive(Base):
+    __tablename__ = "invoices_archive"
+
+    id = Column(Integer, primary_key=True)
+    appointment_id = Column(Integer, nullable=False, index=True)
+    master_id = Column(Integer, nullable=False, index=True)
+    client_id = Column(Integer, nullable=False)
+    amount = Column(Float, nullable=False)
+    currency = Column(String(10))
+    description = Column(Text, nullable=True)
+    payment_id = Column(String(255), nullable=True)
+    payment_url = Column(Text, nullable=True)
+    payment_status = Column(SQLEnum(PaymentStatus))
+    payment_method = Column(String(50), nullable=True)
+    created_at = Column(DateTime)
+    paid_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class NotificationArchive(Base):
+    __tablename__ = "notifications_archive"
+
+    id = Column(Integer, primary_key=True)
+    appointment_id = Column(Integer, nullable=False, index=True)
+    notification_type = Column(SQLEnum(NotificationType), nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    scheduled_for = Column(DateTime, nullable=False)
+    is_sent = Column(Boolean, default=False)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,175 @@
+"""
+Многопроцессный режим: шардирование обработки обновлений по chat id
+
+Процесс приема (ingress) получает обновления от Telegram и раскладывает их
+по SHARD_WORKERS процессам-воркерам: воркер выбирается как chat_id % N.
+Все обновления одного чата попадают в один воркер, поэтому состояние
+диалогов в context.user_data / chat_data остается согласованным.
+
+Каждый воркер - отдельный процесс (spawn) со своим Application, стеком
+обработчиков, пулом соединений к БД и кэшами. Фоновые задачи безопасны при
+нескольких воркерах: outbox и напоминания арендуются (bot.utils.leases),
+планировщик напоминаний запускается только в воркере 0.
+
+Кэши в памяти процесса сбрасываются только в том воркере, который обработал
+изменение; в остальных они расходятся с БД на ограниченное время:
+
+* статистика мастера (bot.utils.stats) - до SHARDED_STATS_TTL_SECONDS;
+* inline-индекс мастеров и услуг (bot.utils.prefix_index) - до
+  INDEX_TTL_SECONDS;
+* горячий кэш открытых чеков (bot.utils.payments) заполняется в воркере
+  мастера, а pre_checkout_query и successful_payment приходят в воркер
+  клиента; там при промахе чек читается из БД, а после оплаты удаляется
+  из кэша. Запись в кэше воркера мастера остается, но платежей этого
+  клиента он не получает.
+
+Удержания выбранного времени при нескольких воркерах хранятся в БД
+(SLOT_HOLDS_SHARED).
+"""
+import asyncio
+import logging
+import multiprocessing
+from queue import Full
+from typing import List, Optional
+from telegram import Bot, Update
+from bot.config import BOT_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# Максимум обновлений в очереди одного воркера; при заполнении прием ждет
+SHARD_QUEUE_SIZE = 1000
+
+# Таймаут long polling в процессе приема
+INGRESS_POLL_TIMEOUT = 30
+
+
+def shard_for_update(update: Update, workers: int) -> int:
+    """
+    Номер воркера для обновления
+    
+    Обновления без чата (inline-запросы, pre_checkout_query) распределяются
+    по пользователю, а без пользователя - в воркер 0.
+    """
+    if update.effective_chat:
+        key = update.effective_chat.id
+    elif update.effective_user:
+        key = update.effective_user.id
+    else:
+        key = 0
+    return abs(key) % workers
+
+
+async def _run_worker(shard: int, queue):
+    """Обработка обновлений своего шарда в процессе-воркере"""
+    from bot.database import get_db_session
+    from bot.main import build_application, post_init, post_shutdown
+    
+    application = build_application()
+    
+    async with application:
+        await post_init(application)
+        
+        if shard == 0:
+            try:
+                from bot.utils.notifications import start_scheduler
+                start_scheduler(application.bot_data['bulk_bot'], get_db_session)
+            except Exception as e:
+                logger.warning(f"Не удалось запустить планировщик уведомлений: {e}")
+        
+        await application.start()
+        logger.info(f"Воркер {shard} запущен")
+        
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        
+        await application.stop()
+        await post_shutdown(application)
+    
+    logger.info(f"Воркер {shard} остановлен")
+
+
+def _worker_main(shard: int, queue):
+    """Точка входа процесса-воркера"""
+    try:
+        asyncio.run(_run_worker(shard, queue))
+    except KeyboardInterrupt:
+        pass
+
+
+def _start_worker(context, shard: int, queue):
+    """Запуск процесса-воркера"""
+    process = context.Process(
+        target=_worker_main,
+        args=(shard, queue),
+        name=f"bot-shard-{shard}",
+        daemon=True
+    )
+    process.start()
+    return process
+
+
+async def _run_ingress(context, queues: List, processes: List):
+    """Прием обновлений и раскладка по воркерам"""
+    workers = len(queues)
+    offset: Optional[int] = None
+    
+    from bot.utils.http_pools import build_request
+    
+    async with Bot(BOT_TOKEN, get_updates_request=build_request("updates")) as bot:
+        logger.info(f"Прием обновлений запущен, воркеров: {workers}")
+        
+        while True:
+            # Упавший воркер перезапускается со своей очередью
+            for shard, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.error(f"Воркер {shard} завершился (код {process.exitcode}), перезапуск")
+                    processes[shard] = _start_worker(context, shard, queues[shard])
+            
+            try:
+                updates = await bot.get_updates(
+                    offset=offset,
+                    timeout=INGRESS_POLL_TIMEOUT,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            except Exception as e:
+                logger.error(f"Ошибка получения обновлений: {e}")
+                await asyncio.sleep(1)
+                continue
+            
+            for update in updates:
+                shard = shard_for_update(update, workers)
+                # put блокируется при заполненной очереди - это и есть обратное давление
+                await asyncio.to_thread(queues[shard].put, update.to_dict())
+                offset = update.update_id + 1
+
+
+def run_sharded(workers: int):
+    """
+    Запуск бота в многопроцессном режиме
+    
+    Args:
+        workers: Количество процессов-воркеров
+    """
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(workers)]
+    processes = [_start_worker(context, shard, queue) for shard, queue in enumerate(queues)]
+    
+    try:
+        asyncio.run(_run_ingress(context, queues, processes))
+    except KeyboardInterrupt:
+        logger.info("Остановка бота")
+    finally:
+        # Заполненная очередь не должна блокировать остановку: такой воркер
+        # завершается принудительно после таймаута join
+        for queue in queues:
+            try:
+                queue.put_nowait(None)
+            except Full:
+                pass
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
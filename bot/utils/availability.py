@@ -0,0 +1,460 @@
+"""
+Доступность мастера на день в виде битовых масок
+
+День делится на кванты по QUANTUM_MINUTES минут, бит i маски соответствует
+интервалу [i * QUANTUM_MINUTES, (i + 1) * QUANTUM_MINUTES) минут от начала дня.
+Для каждого дня хранятся две маски: рабочие кванты по расписанию (work) и
+кванты, занятые записями вместе с их буферами до/после (busy).
+
+При включенной настройке AVAILABILITY_MATERIALIZED маски хранятся в таблице
+availability_days: запись/отмена обновляют строку инкрементально, изменение
+расписания сбрасывает строки, и они пересчитываются при следующем чтении.
+"""
+from datetime import datetime, date, time, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from bot.models import Appointment, AppointmentStatus, AvailabilityDay, MasterProfile, Service
+from bot.config import AVAILABILITY_MATERIALIZED
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUANTUM_MINUTES = 5
+QUANTA_PER_DAY = 24 * 60 // QUANTUM_MINUTES
+MASK_BYTES = (QUANTA_PER_DAY + 7) // 8
+FULL_DAY_MASK = (1 << QUANTA_PER_DAY) - 1
+
+# Максимальный буфер до/после записи; ограничивает окно поиска соседних записей
+MAX_BUFFER_MINUTES = 120
+
+# Шаг записи по умолчанию
+DEFAULT_STEP_MINUTES = 30
+
+
+class SlotRules(NamedTuple):
+    """Шаг времени начала записи и буферы вокруг нее (в минутах)"""
+    step_minutes: int
+    buffer_before_minutes: int
+    buffer_after_minutes: int
+
+
+def resolve_slot_rules(master_profile: Optional[MasterProfile], service: Optional[Service] = None) -> SlotRules:
+    """Правила записи: значения услуги, а если не заданы - профиля мастера"""
+    def pick(field: str, default: int) -> int:
+        value = getattr(service, field, None) if service is not None else None
+        if value is None:
+            value = getattr(master_profile, field, None) if master_profile is not None else None
+        return default if value is None else value
+    
+    return SlotRules(
+        step_minutes=pick("slot_step_minutes", DEFAULT_STEP_MINUTES),
+        buffer_before_minutes=pick("buffer_before_minutes", 0),
+        buffer_after_minutes=pick("buffer_after_minutes", 0),
+    )
+
+
+def get_slot_rules(db: Session, master_id: int, service_id: Optional[int] = None) -> SlotRules:
+    """Правила записи для мастера и услуги"""
+    master_profile = db.get(MasterProfile, master_id)
+    service = db.get(Service, service_id) if service_id else None
+    return resolve_slot_rules(master_profile, service)
+
+
+def minutes_to_mask(start_minute: int, end_minute: int, inner: bool = False) -> int:
+    """
+    Маска квантов, покрывающих интервал минут [start_minute, end_minute)
+    
+    Args:
+        start_minute: Начало интервала в минутах от начала дня
+        end_minute: Конец интервала в минутах от начала дня
+        inner: True - только кванты, целиком лежащие в интервале (рабочее время),
+            False - все кванты, которые интервал задевает (занятое время)
+    """
+    start_minute = max(start_minute, 0)
+    end_minute = min(end_minute, 24 * 60)
+    
+    if inner:
+        first = -(-start_minute // QUANTUM_MINUTES)
+        last = end_minute // QUANTUM_MINUTES
+    else:
+        first = start_minute // QUANTUM_MINUTES
+        last = -(-end_minute // QUANTUM_MINUTES)
+    
+    if last <= first:
+        return 0
+    
+    return ((1 << (last - first)) - 1) << first
+
+
+def interval_to_mask(day: date, start: datetime, end: datetime, inner: bool = False) -> int:
+    """Маска квантов дня day, которые покрывает интервал [start, end)"""
+    day_start = datetime.combine(day, time(0, 0))
+    start_minute = int((start - day_start).total_seconds() // 60)
+    end_minute = -int(-(end - day_start).total_seconds() // 60)
+    return minutes_to_mask(start_minute, end_minute, inner=inner)
+
+
+def fit_mask(free_mask: int, length_quanta: int) -> int:
+    """
+    Маска квантов, с которых начинается свободный отрезок длиной length_quanta
+    
+    Бит i результата установлен, если установлены все биты i..i+length_quanta-1
+    маски free_mask. Считается за O(log length_quanta) операций сдвига и AND
+    над всей маской дня вместо перебора стартов.
+    """
+    if length_quanta <= 0:
+        return free_mask
+    
+    result = free_mask
+    covered = 1
+    while covered < length_quanta:
+        shift = min(covered, length_quanta - covered)
+        result &= result >> shift
+        covered += shift
+    return result
+
+
+def step_mask(start_quantum: int, end_quantum: int, step_quanta: int) -> int:
+    """Маска квантов start_quantum, start_quantum + step_quanta, ... (< end_quantum)"""
+    step_quanta = max(step_quanta, 1)
+    mask = 0
+    for quantum in range(start_quantum, min(end_quantum, QUANTA_PER_DAY), step_quanta):
+        mask |= 1 << quantum
+    return mask
+
+
+def after_moment_mask(day: date, moment: datetime) -> int:
+    """Маска квантов дня day, начинающихся строго позже moment"""
+    day_start = datetime.combine(day, time(0, 0))
+    if moment < day_start:
+        return FULL_DAY_MASK
+    
+    elapsed_quanta = int((moment - day_start).total_seconds() // (QUANTUM_MINUTES * 60))
+    if elapsed_quanta >= QUANTA_PER_DAY:
+        return 0
+    return FULL_DAY_MASK & ~((1 << (elapsed_quanta + 1)) - 1)
+
+
+def iter_quanta(mask: int) -> Iterable[int]:
+    """Номера установленных битов маски по возрастанию"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+if hasattr(int, "bit_count"):
+    def count_quanta(mask: int) -> int:
+        """Количество установленных битов маски"""
+        return mask.bit_count()
+else:
+    # Python < 3.10: int.bit_count недоступен
+    def count_quanta(mask: int) -> int:
+        """Количество установленных битов маски"""
+        return bin(mask).count("1")
+
+
+def grid_mask(work_mask: int, step_quanta: int) -> int:
+    """
+    Сетка шагов, отсчитываемая от начала каждого рабочего интервала маски
+    
+    Интервалы берутся из самой маски: начало - установленный бит без
+    установленного бита перед ним, конец - бит без установленного после.
+    """
+    run_starts = work_mask & ~(work_mask << 1)
+    run_ends = work_mask & ~(work_mask >> 1)
+    mask = 0
+    for first_quantum, last_quantum in zip(iter_quanta(run_starts), iter_quanta(run_ends)):
+        mask |= step_mask(first_quantum, last_quantum + 1, step_quanta)
+    return mask
+
+
+def quantum_to_time(quantum: int) -> time:
+    """Время начала кванта"""
+    minutes = quantum * QUANTUM_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+def mask_to_bytes(mask: int) -> bytes:
+    """Упаковка маски в байты для хранения в БД"""
+    return mask.to_bytes(MASK_BYTES, "little")
+
+
+def mask_from_bytes(data: Optional[bytes]) -> int:
+    """Распаковка маски из байтов"""
+    if not data:
+        return 0
+    return int.from_bytes(data, "little")
+
+
+def compute_work_mask(db: Session, master_id: int, day: date) -> int:
+    """Маска рабочих квантов дня по расписанию мастера"""
+    from bot.utils.schedule import get_work_windows
+    
+    mask = 0
+    for work_start, work_end in get_work_windows(db, master_id, day):
+        mask |= minutes_to_mask(
+            work_start.hour * 60 + work_start.minute,
+            work_end.hour * 60 + work_end.minute,
+            inner=True
+        )
+    return mask
+
+
+def busy_intervals(
+    db: Session,
+    master_id: int,
+    window_start: datetime,
+    window_end: datetime,
+    exclude_appointment_id: int = None
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Интервалы активных записей мастера с учетом буферов, задевающие окно
+    
+    Один запрос: записи выбираются с запасом MAX_BUFFER_MINUTES, буферы
+    берутся из услуги записи, а если не заданы - из профиля мастера.
+    """
+    master_profile = db.get(MasterProfile, master_id)
+    default_before = getattr(master_profile, "buffer_before_minutes", None) or 0
+    default_after = getattr(master_profile, "buffer_after_minutes", None) or 0
+    margin = timedelta(minutes=MAX_BUFFER_MINUTES)
+    
+    query = db.query(
+        Appointment.start_time,
+        Appointment.end_time,
+        Service.buffer_before_minutes,
+        Service.buffer_after_minutes
+    ).outerjoin(
+        Service, Service.id == Appointment.service_id
+    ).filter(
+        Appointment.master_id == master_id,
+        Appointment.status != AppointmentStatus.CANCELLED,
+        Appointment.start_time < window_end + margin,
+        Appointment.end_time > window_start - margin
+    )
+    
+    if exclude_appointment_id:
+        query = query.filter(Appointment.id != exclude_appointment_id)
+    
+    intervals = []
+    for start_time, end_time, before, after in query:
+        start_time -= timedelta(minutes=default_before if before is None else before)
+        end_time += timedelta(minutes=default_after if after is None else after)
+        if start_time < window_end and end_time > window_start:
+            intervals.append((start_time, end_time))
+    return intervals
+
+
+def appointment_interval(db: Session, appointment: Appointment) -> Tuple[datetime, datetime]:
+    """Интервал записи с учетом буферов"""
+    rules = resolve_slot_rules(
+        db.get(MasterProfile, appointment.master_id),
+        db.get(Service, appointment.service_id)
+    )
+    return (
+        appointment.start_time - timedelta(minutes=rules.buffer_before_minutes),
+        appointment.end_time + timedelta(minutes=rules.buffer_after_minutes)
+    )
+
+
+def compute_busy_mask(
+    db: Session,
+    master_id: int,
+    day: date,
+    exclude_appointment_id: int = None
+) -> int:
+    """Маска квантов дня, занятых активными записями мастера (вместе с буферами)"""
+    start_of_day = datetime.combine(day, time(0, 0))
+    end_of_day = start_of_day + timedelta(days=1)
+    
+    mask = 0
+    for start_time, end_time in busy_intervals(db, master_id, start_of_day, end_of_day, exclude_appointment_id):
+        mask |= interval_to_mask(day, start_time, end_time)
+    return mask
+
+
+def get_day_masks(db: Session, master_id: int, day: date) -> Tuple[int, int]:
+    """
+    Получение масок (рабочие кванты, занятые кванты) на день
+    
+    При включенной материализации читается одна строка availability_days,
+    отсутствующая строка пересчитывается и сохраняется.
+    
+    Returns:
+        (work_mask, busy_mask)
+    """
+    if not AVAILABILITY_MATERIALIZED:
+        return compute_work_mask(db, master_id, day), compute_busy_mask(db, master_id, day)
+    
+    row = db.query(AvailabilityDay).filter(
+        AvailabilityDay.master_id == master_id,
+        AvailabilityDay.day == day
+    ).first()
+    
+    if row and row.quantum_minutes == QUANTUM_MINUTES:
+        return mask_from_bytes(row.work_mask), mask_from_bytes(row.busy_mask)
+    
+    return rebuild_availability_day(db, master_id, day, row)
+
+
+def rebuild_availability_day(
+    db: Session,
+    master_id: int,
+    day: date,
+    row: AvailabilityDay = None
+) -> Tuple[int, int]:
+    """
+    Пересчет и сохранение строки availability_days для одного дня (без commit)
+    
+    Вызывается из чтения доступности внутри обработчика, поэтому строка
+    записывается в точке сохранения (SAVEPOINT): конфликт откатывает только
+    ее, а не изменения обработчика в той же сессии. Commit выполняет
+    вызывающий код.
+    """
+    work_mask = compute_work_mask(db, master_id, day)
+    busy_mask = compute_busy_mask(db, master_id, day)
+    
+    try:
+        with db.begin_nested():
+            if row is None:
+                row = AvailabilityDay(master_id=master_id, day=day)
+                db.add(row)
+            
+            row.quantum_minutes = QUANTUM_MINUTES
+            row.work_mask = mask_to_bytes(work_mask)
+            row.busy_mask = mask_to_bytes(busy_mask)
+    except IntegrityError:
+        # Строку параллельно создал другой обработчик - используем пересчитанные маски
+        logger.debug(f"Строка доступности мастера {master_id} на {day} уже создана")
+    
+    return work_mask, busy_mask
+
+
+def _interval_days(start_time: datetime, end_time: datetime) -> Iterable[date]:
+    """Дни, которые задевает интервал"""
+    current_day = start_time.date()
+    last_day = (end_time - timedelta(microseconds=1)).date()
+    while current_day <= last_day:
+        yield current_day
+        current_day += timedelta(days=1)
+
+
+def mark_appointment_busy(db: Session, appointment: Appointment):
+    """
+    Инкрементальное обновление доступности при создании записи
+    
+    Изменения попадают в текущую транзакцию, commit выполняет вызывающий код.
+    """
+    mark_appointments_busy(db, [appointment])
+
+
+def mark_appointments_busy(db: Session, appointments: List[Appointment]):
+    """
+    Инкрементальное обновление доступности при создании нескольких записей
+    
+    Строки availability_days всех затронутых дней читаются одним запросом.
+    Изменения попадают в текущую транзакцию, commit выполняет вызывающий код.
+    """
+    if not AVAILABILITY_MATERIALIZED or not appointments:
+        return
+    
+    intervals = [
+        (appointment.master_id,) + appointment_interval(db, appointment)
+        for appointment in appointments
+    ]
+    master_ids = {master_id for master_id, _, _ in intervals}
+    days = {day for _, start_time, end_time in intervals for day in _interval_days(start_time, end_time)}
+    
+    rows = {
+        (row.master_id, row.day): row
+        for row in db.query(AvailabilityDay).filter(
+            AvailabilityDay.master_id.in_(master_ids),
+            AvailabilityDay.day.in_(days)
+        )
+    }
+    
+    for master_id, start_time, end_time in intervals:
+        for day in _interval_days(start_time, end_time):
+            row = rows.get((master_id, day))
+            if not row:
+                continue
+            
+            busy_mask = mask_from_bytes(row.busy_mask)
+            busy_mask |= interval_to_mask(day, start_time, end_time)
+            row.busy_mask = mask_to_bytes(busy_mask)
+
+
+def release_appointment(db: Session, appointment: Appointment):
+    """
+    Инкрементальное обновление доступности при отмене записи
+    
+    Кванты записи освобождаются, после чего в маску возвращаются кванты
+    других активных записей, пересекающихся с освобожденным интервалом.
+    Изменения попадают в текущую транзакцию, commit выполняет вызывающий код.
+    """
+    if not AVAILABILITY_MATERIALIZED:
+        return
+    
+    start_time, end_time = appointment_interval(db, appointment)
+    
+    for day in _interval_days(start_time, end_time):
+        row = db.query(AvailabilityDay).filter(
+            AvailabilityDay.master_id == appointment.master_id,
+            AvailabilityDay.day == day
+        ).first()
+        if not row:
+            continue
+        
+        released = interval_to_mask(day, start_time, end_time)
+        busy_mask = mask_from_bytes(row.busy_mask) & ~released
+        
+        neighbours = busy_intervals(
+            db,
+            appointment.master_id,
+            start_time - timedelta(minutes=QUANTUM_MINUTES),
+            end_time + timedelta(minutes=QUANTUM_MINUTES),
+            exclude_appointment_id=appointment.id
+        )
+        for neighbour_start, neighbour_end in neighbours:
+            busy_mask |= interval_to_mask(day, neighbour_start, neighbour_end)
+        
+        row.busy_mask = mask_to_bytes(busy_mask)
+
+
+def invalidate_availability(
+    db: Session,
+    master_id: int,
+    days: Optional[Iterable[date]] = None,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None
+):
+    """
+    Сброс материализованной доступности после изменения расписания
+    
+    Строки удаляются и пересчитываются при следующем чтении. Без указания
+    дат сбрасываются все строки мастера (изменение общего расписания).
+    Изменения попадают в текущую транзакцию, commit выполняет вызывающий код.
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        days: Конкретные даты
+        start_day: Начало диапазона дат (включительно)
+        end_day: Конец диапазона дат (включительно)
+    """
+    if not AVAILABILITY_MATERIALIZED:
+        return
+    
+    query = db.query(AvailabilityDay).filter(AvailabilityDay.master_id == master_id)
+    
+    if days is not None:
+        query = query.filter(AvailabilityDay.day.in_(list(days)))
+    if start_day is not None:
+        query = query.filter(AvailabilityDay.day >= start_day)
+    if end_day is not None:
+        query = query.filter(AvailabilityDay.day <= end_day)
+    
+    deleted = query.delete(synchronize_session=False)
+    if deleted:
+        logger.debug(f"Сброшено {deleted} строк доступности мастера {master_id}")
@@ -0,0 +1,133 @@
+"""
+Рассылка мастера клиентам с записями на ближайший период
+
+Получатели выбираются одним запросом по записям мастера за период
+(DISTINCT по клиенту, поэтому клиент с несколькими записями получает одно
+сообщение). Сообщения ставятся в outbox одной транзакцией вместе со
+строкой broadcasts: дальше их отправляет диспетчер outbox с низшим
+приоритетом (см. bot.utils.outbound), поэтому рассылка не задерживает
+ответы на действия пользователей. Если бот упадет посреди рассылки, неотправленные
+сообщения останутся в outbox и уйдут после перезапуска, а dedup_key не
+даст отправить сообщение клиенту дважды.
+
+Прогресс считается по статусам строк outbox рассылки.
+"""
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from bot.models import Appointment, AppointmentStatus, Broadcast, MasterProfile, OutboxMessage, OutboxStatus, User
+from bot.utils.i18n import normalize_language, t
+from typing import Dict, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Периоды рассылки: ключ -> (название, первый день от сегодня, количество дней)
+BROADCAST_RANGES = {
+    "today": ("Сегодня", 0, 1),
+    "tomorrow": ("Завтра", 1, 1),
+    "week": ("Ближайшие 7 дней", 0, 7),
+}
+
+# Максимальная длина текста рассылки (лимит Telegram - 4096 с учетом заголовка)
+BROADCAST_MAX_LENGTH = 3500
+
+
+def broadcast_period(range_key: str, now: datetime) -> Tuple[datetime, datetime]:
+    """
+    Период записей для рассылки (на часах мастера)
+    
+    Для периода, начинающегося сегодня, берутся только записи, которые еще
+    не начались.
+    """
+    _, first_day, days = BROADCAST_RANGES[range_key]
+    start_day: date = now.date() + timedelta(days=first_day)
+    range_start = datetime.combine(start_day, time(0, 0))
+    range_end = range_start + timedelta(days=days)
+    return max(range_start, now), range_end
+
+
+def get_broadcast_recipients(
+    db: Session,
+    master_id: int,
+    range_start: datetime,
+    range_end: datetime
+) -> List[Tuple[int, str]]:
+    """Telegram ID и язык клиентов с активными записями к мастеру в периоде (без повторов)"""
+    rows = db.query(User.telegram_id, User.language).join(
+        Appointment, Appointment.client_id == User.id
+    ).filter(
+        Appointment.master_id == master_id,
+        Appointment.status.in_([AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED]),
+        Appointment.start_time >= range_start,
+        Appointment.start_time < range_end
+    ).distinct().all()
+    return [(telegram_id, normalize_language(language)) for telegram_id, language in rows]
+
+
+def create_broadcast(
+    db: Session,
+    master_id: int,
+    text: str,
+    range_start: datetime,
+    range_end: datetime
+) -> Broadcast:
+    """
+    Создание рассылки и постановка сообщений в outbox (без commit)
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        text: Текст мастера
+        range_start: Начало периода записей
+        range_end: Конец периода записей
+    
+    Returns:
+        Рассылка (recipients - количество поставленных сообщений)
+    """
+    from bot.utils.outbox import enqueue_message
+    
+    master_profile = db.get(MasterProfile, master_id)
+    master_name = master_profile.business_name if master_profile else None
+    recipients = get_broadcast_recipients(db, master_id, range_start, range_end)
+    
+    broadcast = Broadcast(
+        master_id=master_id,
+        text=text,
+        range_start=range_start,
+        range_end=range_end,
+        recipients=len(recipients)
+    )
+    db.add(broadcast)
+    db.flush()
+    
+    # Текст рендерится один раз на язык, а не на получателя
+    messages: Dict[str, str] = {}
+    for telegram_id, language in recipients:
+        if language not in messages:
+            messages[language] = (
+                t("broadcast_message", language, master=master_name, text=text)
+                if master_name else t("broadcast_message_unnamed", language, text=text)
+            )
+        enqueue_message(
+            db,
+            telegram_id,
+            messages[language],
+            kind="broadcast",
+            dedup_key=f"broadcast:{broadcast.id}:{telegram_id}",
+            broadcast_id=broadcast.id
+        )
+    
+    logger.info(f"Рассылка {broadcast.id} мастера {master_id}: {len(recipients)} получателей")
+    return broadcast
+
+
+def get_broadcast_progress(db: Session, broadcast_id: int) -> Dict[OutboxStatus, int]:
+    """Количество сообщений рассылки по статусам outbox"""
+    rows = db.query(
+        OutboxMessage.status,
+        func.count(OutboxMessage.id)
+    ).filter(
+        OutboxMessage.broadcast_id == broadcast_id
+    ).group_by(OutboxMessage.status).all()
+    return {status: count for status, count in rows}
@@ -1,10 +1,9 @@
 """
 Утилиты для работы с календарем
 """
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from calendar import monthrange
-import pytz
 
 # Месяцы на русском
 MONTHS_RU = [
@@ -18,7 +17,8 @@ DAYS_RU = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
 def get_time_keyboard(
     selected_date: datetime,
     available_slots: list = None,
-    step_minutes: int = 30
+    step_minutes: int = 30,
+    start_mask: int = None
 ) -> InlineKeyboardMarkup:
     """
     Создание клавиатуры для выбора времени
@@ -27,11 +27,19 @@ def get_time_keyboard(
         selected_date: Выбранная дата
         available_slots: Список доступных временных слотов (если None - все время)
         step_minutes: Шаг времени в минутах (15, 30, 60)
+        start_mask: Маска доступных начал (см. bot.utils.availability), имеет приоритет над available_slots
     """
     buttons = []
     row = []
     
-    if available_slots:
+    if start_mask:
+        # Кнопки строятся прямо из номеров квантов, без создания datetime
+        from bot.utils.availability import iter_quanta, quantum_to_time
+        time_slots = []
+        for quantum in iter_quanta(start_mask):
+            slot_time = quantum_to_time(quantum)
+            time_slots.append((slot_time, slot_time.strftime("%H:%M")))
+    elif available_slots:
         # Используем только доступные слоты
         time_slots = []
         for slot in available_slots:
@@ -64,9 +72,14 @@ def get_time_keyboard(
     return InlineKeyboardMarkup(buttons)
 
 
-def get_month_keyboard(year: int, month: int) -> InlineKeyboardMarkup:
+def get_month_keyboard(year: int, month: int, today: date = None) -> InlineKeyboardMarkup:
     """
     Создание клавиатуры календаря для выбора месяца
+    
+    Args:
+        year: Год
+        month: Месяц (1-12)
+        today: Сегодняшняя дата на часах мастера (по умолчанию - локальная дата сервера)
     """
     buttons = []
     
@@ -95,7 +108,7 @@ def get_month_keyboard(year: int, month: int) -> InlineKeyboardMarkup:
         current_row.append(InlineKeyboardButton(" ", callback_data="ignore"))
     
     # Дни месяца
-    today = datetime.now().date()
+    today = today or datetime.now().date()
     min_date = today
     max_date = today + timedelta(days=365)  # Можно записаться на год вперед
     
@@ -0,0 +1,181 @@
+"""
+Потоковая выгрузка истории записей и чеков мастера (CSV / JSONL)
+"""
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+from bot.models import Appointment, AppointmentArchive, Service, Invoice, InvoiceArchive
+from typing import Dict, Iterator, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки строк, читаемых курсором из БД за раз
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+EXPORT_FIELDS = [
+    "appointment_id",
+    "start_time",
+    "end_time",
+    "status",
+    "client_name",
+    "client_phone",
+    "service_name",
+    "service_price",
+    "duration_minutes",
+    "invoice_id",
+    "invoice_amount",
+    "invoice_currency",
+    "payment_status",
+    "paid_at",
+]
+
+
+def _format_value(value):
+    """Приведение значения к виду для выгрузки"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="minutes")
+    if hasattr(value, "value"):
+        return value.value
+    return value
+
+
+def _history_select(appointments, invoices, master_id: int):
+    """Выборка истории мастера из пары таблиц записей и чеков (рабочих или архивных)"""
+    services = Service.__table__
+    columns = [
+        appointments.c.id,
+        appointments.c.start_time,
+        appointments.c.end_time,
+        appointments.c.status,
+        appointments.c.client_name,
+        appointments.c.client_phone,
+        services.c.name,
+        services.c.price,
+        services.c.duration_minutes,
+        invoices.c.id,
+        invoices.c.amount,
+        invoices.c.currency,
+        invoices.c.payment_status,
+        invoices.c.paid_at,
+    ]
+    return select(
+        *[column.label(field) for field, column in zip(EXPORT_FIELDS, columns)]
+    ).select_from(
+        appointments.join(
+            services, services.c.id == appointments.c.service_id
+        ).outerjoin(
+            invoices, invoices.c.appointment_id == appointments.c.id
+        )
+    ).where(
+        appointments.c.master_id == master_id
+    )
+
+
+def iter_master_history(db: Session, master_id: int) -> Iterator[Dict]:
+    """
+    Построчный обход истории записей мастера
+    
+    Рабочие и архивные записи (bot.utils.retention) с услугами и чеками
+    выбираются одним запросом UNION ALL и читаются серверным курсором пачками
+    по EXPORT_BATCH_SIZE строк, поэтому память не зависит от размера истории.
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+    
+    Yields:
+        Словарь с полями EXPORT_FIELDS
+    """
+    history = union_all(
+        _history_select(Appointment.__table__, Invoice.__table__, master_id),
+        _history_select(AppointmentArchive.__table__, InvoiceArchive.__table__, master_id)
+    ).subquery()
+    
+    query = select(history).order_by(history.c.start_time).execution_options(
+        yield_per=EXPORT_BATCH_SIZE
+    )
+    
+    for row in db.execute(query):
+        yield {field: _format_value(value) for field, value in zip(EXPORT_FIELDS, row)}
+
+
+def write_master_history(db: Session, master_id: int, export_format: str, file_obj) -> int:
+    """
+    Запись истории мастера в открытый текстовый файл
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        export_format: "csv" или "jsonl"
+        file_obj: Файл, открытый на запись в текстовом режиме
+    
+    Returns:
+        Количество выгруженных строк
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+    
+    rows = 0
+    
+    if export_format == "csv":
+        writer = csv.DictWriter(file_obj, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for record in iter_master_history(db, master_id):
+            writer.writerow(record)
+            rows += 1
+    else:
+        for record in iter_master_history(db, master_id):
+            file_obj.write(json.dumps(record, ensure_ascii=False))
+            file_obj.write("\n")
+            rows += 1
+    
+    return rows
+
+
+def export_master_history_to_file(master_id: int, export_format: str, db: Optional[Session] = None) -> tuple[str, int]:
+    """
+    Выгрузка истории мастера во временный файл
+    
+    Функция блокирующая. Без db она открывает собственную сессию рабочего
+    потока (bot.database.get_worker_session) и предназначена для запуска в
+    отдельном потоке (asyncio.to_thread).
+    
+    Args:
+        master_id: ID мастера
+        export_format: "csv" или "jsonl"
+        db: Сессия БД вызывающего кода; только при вызове из цикла событий
+    
+    Returns:
+        (путь к файлу, количество строк); файл удаляет вызывающий код
+    """
+    from bot.database import get_worker_session
+    
+    own_session = db is None
+    if own_session:
+        db = get_worker_session()
+    fd, path = tempfile.mkstemp(prefix=f"history_{master_id}_", suffix=f".{export_format}")
+    
+    try:
+        # utf-8-sig, чтобы Excel корректно открывал кириллицу в CSV
+        encoding = "utf-8-sig" if export_format == "csv" else "utf-8"
+        with os.fdopen(fd, "w", encoding=encoding, newline="") as file_obj:
+            rows = write_master_history(db, master_id, export_format, file_obj)
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        if own_session:
+            db.close()
+    
+    logger.info(f"Выгрузка истории мастера {master_id} ({export_format}): {rows} строк")
+    
+    return path, rows
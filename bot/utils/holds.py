@@ -0,0 +1,211 @@
+"""
+Удержание выбранного времени до подтверждения записи
+
+Между выбором времени и подтверждением клиент может отправлять телефон,
+и без удержания это время успел бы занять другой клиент. Поэтому
+выбранный интервал (вместе с буферами) удерживается за клиентом
+HOLD_TTL_SECONDS: остальным клиентам он показывается занятым, а сам клиент
+его видит свободным. У клиента одно удержание - новый выбор времени
+заменяет предыдущий.
+
+Удержания хранятся в памяти процесса: словарь мастер -> клиент -> интервал
+и таймерное колесо из WHEEL_SIZE корзин по WHEEL_TICK_SECONDS. Истекшие
+удержания удаляются при обращении к модулю: просматриваются только
+корзины прошедших тиков, а не все удержания.
+
+При нескольких экземплярах бота (SLOT_HOLDS_SHARED или SHARD_WORKERS > 1)
+удержания хранятся в таблице slot_holds и видны всем экземплярам; истекшие
+строки не учитываются по expires_at и удаляются при следующем удержании
+у того же мастера.
+
+held_intervals() объединяет эти удержания с предложениями листа ожидания
+(bot.utils.waitlist) - это все время, временно закрытое для других клиентов.
+"""
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from bot.config import SHARD_WORKERS, SLOT_HOLDS_SHARED
+from bot.models import SlotHold
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд выбранное время держится за клиентом
+HOLD_TTL_SECONDS = 300
+
+# Таймерное колесо: оборот (WHEEL_SIZE * WHEEL_TICK_SECONDS) длиннее HOLD_TTL_SECONDS
+WHEEL_TICK_SECONDS = 10
+WHEEL_SIZE = 64
+
+# Удержания в БД, видимые всем экземплярам
+SHARED_HOLDS = SLOT_HOLDS_SHARED or SHARD_WORKERS > 1
+
+
+class Hold(NamedTuple):
+    """Удержание в памяти процесса"""
+    client_id: int
+    master_id: int
+    start_time: datetime
+    end_time: datetime
+    expires_at: float  # time.monotonic
+
+
+# Мастер -> клиент -> удержание и клиент -> удержание
+_holds_by_master: Dict[int, Dict[int, Hold]] = {}
+_holds_by_client: Dict[int, Hold] = {}
+
+# Корзины колеса: ID клиентов, чьи удержания истекают в этом тике
+_wheel: List[List[int]] = [[] for _ in range(WHEEL_SIZE)]
+_wheel_tick: Optional[int] = None
+
+
+def _drop(hold: Hold):
+    """Удаление удержания из памяти"""
+    _holds_by_client.pop(hold.client_id, None)
+    master_holds = _holds_by_master.get(hold.master_id)
+    if master_holds is not None:
+        master_holds.pop(hold.client_id, None)
+        if not master_holds:
+            del _holds_by_master[hold.master_id]
+
+
+def _advance(now: float):
+    """
+    Поворот колеса до текущего тика
+    
+    Корзины тиков, целиком оставшихся в прошлом, освобождаются. Удержание,
+    замененное более поздним, остается в старой корзине и не удаляется:
+    его срок сверяется при разборе корзины.
+    """
+    global _wheel_tick
+    
+    tick = int(now // WHEEL_TICK_SECONDS)
+    if _wheel_tick is None:
+        _wheel_tick = tick
+        return
+    
+    # За один оборот просматриваются все корзины, дальше крутить незачем
+    for past_tick in range(_wheel_tick, min(tick, _wheel_tick + WHEEL_SIZE)):
+        bucket = _wheel[past_tick % WHEEL_SIZE]
+        if not bucket:
+            continue
+        _wheel[past_tick % WHEEL_SIZE] = []
+        for client_id in bucket:
+            hold = _holds_by_client.get(client_id)
+            if hold is not None and hold.expires_at <= now:
+                _drop(hold)
+    
+    _wheel_tick = max(_wheel_tick, tick)
+
+
+def place_hold(
+    db: Session,
+    master_id: int,
+    client_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    ttl_seconds: int = HOLD_TTL_SECONDS
+):
+    """
+    Удержание интервала за клиентом (без commit)
+    
+    Args:
+        db: Сессия БД (используется при SHARED_HOLDS)
+        master_id: ID мастера
+        client_id: ID клиента
+        start_time: Начало интервала вместе с буфером (на часах мастера)
+        end_time: Конец интервала вместе с буфером
+        ttl_seconds: Срок удержания
+    """
+    if SHARED_HOLDS:
+        now = datetime.utcnow()
+        db.query(SlotHold).filter(SlotHold.client_id == client_id).delete(synchronize_session=False)
+        db.query(SlotHold).filter(
+            SlotHold.master_id == master_id,
+            SlotHold.expires_at <= now
+        ).delete(synchronize_session=False)
+        db.add(SlotHold(
+            client_id=client_id,
+            master_id=master_id,
+            start_time=start_time,
+            end_time=end_time,
+            expires_at=now + timedelta(seconds=ttl_seconds)
+        ))
+        return
+    
+    now = time.monotonic()
+    _advance(now)
+    
+    previous = _holds_by_client.get(client_id)
+    if previous is not None:
+        _drop(previous)
+    
+    hold = Hold(client_id, master_id, start_time, end_time, now + ttl_seconds)
+    _holds_by_client[client_id] = hold
+    _holds_by_master.setdefault(master_id, {})[client_id] = hold
+    _wheel[int(hold.expires_at // WHEEL_TICK_SECONDS) % WHEEL_SIZE].append(client_id)
+
+
+def release_hold(db: Session, client_id: int):
+    """Снятие удержания клиента (без commit)"""
+    if SHARED_HOLDS:
+        db.query(SlotHold).filter(SlotHold.client_id == client_id).delete(synchronize_session=False)
+        return
+    
+    hold = _holds_by_client.get(client_id)
+    if hold is not None:
+        _drop(hold)
+
+
+def slot_hold_intervals(
+    db: Session,
+    master_id: int,
+    window_start: datetime,
+    window_end: datetime,
+    exclude_client_id: Optional[int] = None
+) -> List[Tuple[datetime, datetime]]:
+    """Действующие удержания выбранного времени у мастера, задевающие окно"""
+    if SHARED_HOLDS:
+        query = db.query(SlotHold.start_time, SlotHold.end_time).filter(
+            SlotHold.master_id == master_id,
+            SlotHold.start_time < window_end,
+            SlotHold.end_time > window_start,
+            SlotHold.expires_at > datetime.utcnow()
+        )
+        if exclude_client_id:
+            query = query.filter(SlotHold.client_id != exclude_client_id)
+        return [(start_time, end_time) for start_time, end_time in query]
+    
+    now = time.monotonic()
+    _advance(now)
+    
+    return [
+        (hold.start_time, hold.end_time)
+        for hold in _holds_by_master.get(master_id, {}).values()
+        if hold.client_id != exclude_client_id
+        and hold.expires_at > now
+        and hold.start_time < window_end
+        and hold.end_time > window_start
+    ]
+
+
+def held_intervals(
+    db: Session,
+    master_id: int,
+    window_start: datetime,
+    window_end: datetime,
+    exclude_client_id: Optional[int] = None
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Все временно закрытые для клиента интервалы мастера
+    
+    Удержания выбранного времени и предложения листа ожидания других
+    клиентов; свои удержания клиента exclude_client_id не учитываются.
+    """
+    from bot.utils.waitlist import held_intervals as offer_intervals
+    
+    return (
+        slot_hold_intervals(db, master_id, window_start, window_end, exclude_client_id)
+        + offer_intervals(db, master_id, window_start, window_end, exclude_client_id)
+    )
@@ -0,0 +1,137 @@
+"""
+Пулы HTTP-соединений к Bot API
+
+Бот ходит в Bot API тремя независимыми пулами:
+
+* updates - long polling getUpdates (держит одно соединение почти постоянно);
+* interactive - ответы на действия пользователей (application.bot);
+* bulk - фоновые отправки: диспетчер outbox, напоминания, рассылки.
+
+Раньше все запросы шли через один пул по умолчанию, и пачка напоминаний
+занимала соединения, нужные для ответов на нажатия кнопок. Размеры пулов,
+таймауты и HTTP/2 задаются в конфигурации (HTTP_*).
+
+Каждый пул собирает метрики: количество запросов, ошибки и задержки
+последних METRICS_WINDOW запросов (p50/p99), которые периодически
+пишутся в лог. Задержка пула updates включает ожидание long polling.
+"""
+import importlib.util
+import time
+from collections import deque
+from typing import Deque, Dict
+from telegram.request import HTTPXRequest
+from bot.config import (
+    HTTP2, HTTP_BULK_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_INTERACTIVE_POOL_SIZE,
+    HTTP_POOL_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_UPDATES_POOL_SIZE
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних задержек хранится для перцентилей
+METRICS_WINDOW = 1000
+
+# Интервал записи метрик в лог
+METRICS_LOG_MINUTES = 5
+
+# Размер пула по назначению
+POOL_SIZES = {
+    "updates": HTTP_UPDATES_POOL_SIZE,
+    "interactive": HTTP_INTERACTIVE_POOL_SIZE,
+    "bulk": HTTP_BULK_POOL_SIZE,
+}
+
+
+class PoolMetrics:
+    """Метрики запросов одного пула"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latencies: Deque[float] = deque(maxlen=METRICS_WINDOW)
+    
+    def observe(self, seconds: float, failed: bool = False):
+        self.requests += 1
+        if failed:
+            self.errors += 1
+        self.latencies.append(seconds)
+    
+    def snapshot(self) -> Dict[str, float]:
+        """Количество запросов, ошибок и перцентили задержки в мс"""
+        latencies = sorted(self.latencies)
+        
+        def percentile(share: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(int(len(latencies) * share), len(latencies) - 1)] * 1000
+        
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+        }
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+
+
+class MeteredRequest(HTTPXRequest):
+    """HTTPXRequest, записывающий задержку каждого запроса в метрики пула"""
+    
+    def __init__(self, pool_name: str, **kwargs):
+        super().__init__(**kwargs)
+        self.pool_name = pool_name
+        self.metrics = _metrics.setdefault(pool_name, PoolMetrics())
+    
+    async def do_request(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await super().do_request(*args, **kwargs)
+        except Exception:
+            self.metrics.observe(time.perf_counter() - started, failed=True)
+            raise
+        self.metrics.observe(time.perf_counter() - started)
+        return result
+
+
+def _http_version() -> str:
+    """HTTP/2 используется, только если установлен пакет h2 (httpx[http2])"""
+    if not HTTP2:
+        return "1.1"
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2=true, но пакет h2 не установлен (pip install httpx[http2]), используется HTTP/1.1")
+        return "1.1"
+    return "2"
+
+
+def build_request(pool_name: str) -> MeteredRequest:
+    """
+    Пул соединений к Bot API по назначению
+    
+    Args:
+        pool_name: updates, interactive или bulk
+    """
+    return MeteredRequest(
+        pool_name,
+        connection_pool_size=POOL_SIZES[pool_name],
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        write_timeout=HTTP_READ_TIMEOUT,
+        pool_timeout=HTTP_POOL_TIMEOUT,
+        http_version=_http_version(),
+    )
+
+
+def get_pool_metrics() -> Dict[str, Dict[str, float]]:
+    """Метрики всех пулов процесса"""
+    return {pool_name: metrics.snapshot() for pool_name, metrics in _metrics.items()}
+
+
+async def log_pool_metrics():
+    """Запись метрик пулов в лог (задача планировщика)"""
+    for pool_name, snapshot in get_pool_metrics().items():
+        logger.info(
+            f"HTTP-пул {pool_name}: запросов {snapshot['requests']}, ошибок {snapshot['errors']}, "
+            f"p50 {snapshot['p50_ms']:.0f} мс, p99 {snapshot['p99_ms']:.0f} мс"
+        )
@@ -0,0 +1,369 @@
+"""
+Каталог текстов уведомлений (RU / KY / EN)
+
+Шаблоны хранятся в CATALOG: ключ -> язык -> шаблон str.format. При импорте
+модуля каталог компилируется один раз: проверяется, что у всех языков
+ключа одинаковый набор полей, и для каждой пары (ключ, язык) сохраняется
+готовый format_map. Рендер - один поиск в словаре и вызов format_map,
+ошибка в шаблоне обнаруживается при запуске, а не при отправке.
+
+Даты форматируются по формату языка (DATE_FORMATS). Готовая строка даты
+и времени кэшируется по (момент, язык): записи пачки напоминаний
+приходятся на одни и те же получасовые слоты, и повторный рендер - это
+один поиск в кэше без strftime.
+
+Язык пользователя хранится в users.language и выбирается командой
+/language; новому пользователю язык берется из language_code Telegram.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+from string import Formatter
+from typing import Callable, Dict, Optional, Tuple
+
+# Поддерживаемые языки и их названия для выбора
+LANGUAGES = {
+    "ru": "🇷🇺 Русский",
+    "ky": "🇰🇬 Кыргызча",
+    "en": "🇬🇧 English",
+}
+
+DEFAULT_LANGUAGE = "ru"
+
+# Формат даты по языку; время везде ЧЧ:ММ
+DATE_FORMATS = {
+    "ru": "%d.%m.%Y",
+    "ky": "%d.%m.%Y",
+    "en": "%Y-%m-%d",
+}
+
+# Сколько строк даты и времени держится в кэше
+DATE_CACHE_SIZE = 4096
+
+CATALOG: Dict[str, Dict[str, str]] = {
+    "appointment_confirmed": {
+        "ru": (
+            "✅ Ваша запись подтверждена!\n\n"
+            "📅 Дата и время: {when}\n"
+            "🛠 Услуга: {service}\n"
+            "💰 Стоимость: {price} ₽\n"
+            "⏱ Длительность: {duration} мин.\n"
+            "👤 Мастер: {master}\n\n"
+            "Мы напомним вам о записи заранее."
+        ),
+        "ky": (
+            "✅ Сиздин жазылууңуз ырасталды!\n\n"
+            "📅 Күнү жана убактысы: {when}\n"
+            "🛠 Кызмат: {service}\n"
+            "💰 Баасы: {price} ₽\n"
+            "⏱ Узактыгы: {duration} мүн.\n"
+            "👤 Устат: {master}\n\n"
+            "Жазылуу тууралуу алдын ала эскертебиз."
+        ),
+        "en": (
+            "✅ Your appointment is confirmed!\n\n"
+            "📅 Date and time: {when}\n"
+            "🛠 Service: {service}\n"
+            "💰 Price: {price} ₽\n"
+            "⏱ Duration: {duration} min\n"
+            "👤 Master: {master}\n\n"
+            "We will remind you in advance."
+        ),
+    },
+    "appointment_reminder": {
+        "ru": (
+            "🔔 Напоминание о записи\n\n"
+            "📅 Дата и время: {when}\n"
+            "🛠 Услуга: {service}\n"
+            "⏱ Длительность: {duration} мин.\n\n"
+            "Не забудьте о встрече!"
+        ),
+        "ky": (
+            "🔔 Жазылуу тууралуу эскертме\n\n"
+            "📅 Күнү жана убактысы: {when}\n"
+            "🛠 Кызмат: {service}\n"
+            "⏱ Узактыгы: {duration} мүн.\n\n"
+            "Жолугушууну унутпаңыз!"
+        ),
+        "en": (
+            "🔔 Appointment reminder\n\n"
+            "📅 Date and time: {when}\n"
+            "🛠 Service: {service}\n"
+            "⏱ Duration: {duration} min\n\n"
+            "See you soon!"
+        ),
+    },
+    "appointment_cancelled_by_master": {
+        "ru": (
+            "❌ Ваша запись отменена мастером\n\n"
+            "📅 Дата: {when}\n"
+            "🛠 Услуга: {service}\n\n"
+            "Вы можете записаться на другое время."
+        ),
+        "ky": (
+            "❌ Устат сиздин жазылууңузду жокко чыгарды\n\n"
+            "📅 Күнү: {when}\n"
+            "🛠 Кызмат: {service}\n\n"
+            "Башка убакытка жазылсаңыз болот."
+        ),
+        "en": (
+            "❌ Your appointment was cancelled by the master\n\n"
+            "📅 Date: {when}\n"
+            "🛠 Service: {service}\n\n"
+            "You can book another time."
+        ),
+    },
+    "appointment_cancelled_by_client": {
+        "ru": (
+            "⚠️ Запись отменена клиентом\n\n"
+            "Услуга: {service}\n"
+            "Дата: {when}\n"
+            "Клиент: {client}\n"
+            "Телефон: {phone}\n\n"
+            "Слот освобожден и доступен для записи."
+        ),
+        "ky": (
+            "⚠️ Жазылууну кардар жокко чыгарды\n\n"
+            "Кызмат: {service}\n"
+            "Күнү: {when}\n"
+            "Кардар: {client}\n"
+            "Телефон: {phone}\n\n"
+            "Убакыт бошотулду, ага жазылууга болот."
+        ),
+        "en": (
+            "⚠️ Appointment cancelled by the client\n\n"
+            "Service: {service}\n"
+            "Date: {when}\n"
+            "Client: {client}\n"
+            "Phone: {phone}\n\n"
+            "The slot is free and open for booking."
+        ),
+    },
+    "appointment_new": {
+        "ru": (
+            "📅 Новая запись!\n\n"
+            "Дата и время: {when}\n"
+            "Услуга: {service}\n"
+            "Клиент: {client}{phone_line}"
+        ),
+        "ky": (
+            "📅 Жаңы жазылуу!\n\n"
+            "Күнү жана убактысы: {when}\n"
+            "Кызмат: {service}\n"
+            "Кардар: {client}{phone_line}"
+        ),
+        "en": (
+            "📅 New appointment!\n\n"
+            "Date and time: {when}\n"
+            "Service: {service}\n"
+            "Client: {client}{phone_line}"
+        ),
+    },
+    "appointment_completed": {
+        "ru": (
+            "✅ Услуга оказана!\n\n"
+            "Услуга: {service}\n"
+            "Дата: {when}\n\n"
+            "Мастер выставит чек для оплаты."
+        ),
+        "ky": (
+            "✅ Кызмат көрсөтүлдү!\n\n"
+            "Кызмат: {service}\n"
+            "Күнү: {when}\n\n"
+            "Устат төлөө үчүн эсеп жөнөтөт."
+        ),
+        "en": (
+            "✅ Service completed!\n\n"
+            "Service: {service}\n"
+            "Date: {when}\n\n"
+            "The master will send you an invoice."
+        ),
+    },
+    "series_created": {
+        "ru": "✅ Регулярная запись создана\n\n🛠 Услуга: {service}\n📅 Даты:\n{dates}",
+        "ky": "✅ Туруктуу жазылуу түзүлдү\n\n🛠 Кызмат: {service}\n📅 Күндөрү:\n{dates}",
+        "en": "✅ Recurring appointment created\n\n🛠 Service: {service}\n📅 Dates:\n{dates}",
+    },
+    "series_new": {
+        "ru": "📅 Новая регулярная запись ({count})!\n\nУслуга: {service}\nКлиент: {client}{phone_line}\nДаты:\n{dates}",
+        "ky": "📅 Жаңы туруктуу жазылуу ({count})!\n\nКызмат: {service}\nКардар: {client}{phone_line}\nКүндөрү:\n{dates}",
+        "en": "📅 New recurring appointment ({count})!\n\nService: {service}\nClient: {client}{phone_line}\nDates:\n{dates}",
+    },
+    "payment_succeeded": {
+        "ru": (
+            "✅ Платеж успешно завершен!\n\n"
+            "Услуга: {service}\n"
+            "Сумма: {amount:.2f} {currency}\n"
+            "Спасибо за оплату!"
+        ),
+        "ky": (
+            "✅ Төлөм ийгиликтүү аяктады!\n\n"
+            "Кызмат: {service}\n"
+            "Сумма: {amount:.2f} {currency}\n"
+            "Төлөгөнүңүз үчүн рахмат!"
+        ),
+        "en": (
+            "✅ Payment completed!\n\n"
+            "Service: {service}\n"
+            "Amount: {amount:.2f} {currency}\n"
+            "Thank you for your payment!"
+        ),
+    },
+    "invoice_paid": {
+        "ru": (
+            "✅ Чек оплачен!\n\n"
+            "Услуга: {service}\n"
+            "Клиент: {client}\n"
+            "Сумма: {amount:.2f} {currency}\n"
+            "Дата оплаты: {when}"
+        ),
+        "ky": (
+            "✅ Эсеп төлөндү!\n\n"
+            "Кызмат: {service}\n"
+            "Кардар: {client}\n"
+            "Сумма: {amount:.2f} {currency}\n"
+            "Төлөм күнү: {when}"
+        ),
+        "en": (
+            "✅ Invoice paid!\n\n"
+            "Service: {service}\n"
+            "Client: {client}\n"
+            "Amount: {amount:.2f} {currency}\n"
+            "Paid at: {when}"
+        ),
+    },
+    "waitlist_offer": {
+        "ru": (
+            "🔔 Освободилось время!\n\n"
+            "👤 {master}\n"
+            "🛠 {service}\n"
+            "📅 {when}\n\n"
+            "Время закреплено за вами на {minutes} мин."
+        ),
+        "ky": (
+            "🔔 Убакыт бошоду!\n\n"
+            "👤 {master}\n"
+            "🛠 {service}\n"
+            "📅 {when}\n\n"
+            "Убакыт сизге {minutes} мүн. бекитилди."
+        ),
+        "en": (
+            "🔔 A time slot is available!\n\n"
+            "👤 {master}\n"
+            "🛠 {service}\n"
+            "📅 {when}\n\n"
+            "The slot is held for you for {minutes} min."
+        ),
+    },
+    "waitlist_accept_button": {
+        "ru": "✅ Записаться",
+        "ky": "✅ Жазылуу",
+        "en": "✅ Book",
+    },
+    "waitlist_decline_button": {
+        "ru": "❌ Не нужно",
+        "ky": "❌ Керек эмес",
+        "en": "❌ No, thanks",
+    },
+    "broadcast_message": {
+        "ru": "📣 Сообщение от {master}:\n\n{text}",
+        "ky": "📣 {master} жиберген билдирүү:\n\n{text}",
+        "en": "📣 Message from {master}:\n\n{text}",
+    },
+    "broadcast_message_unnamed": {
+        "ru": "📣 Сообщение от мастера:\n\n{text}",
+        "ky": "📣 Устаттан билдирүү:\n\n{text}",
+        "en": "📣 Message from your master:\n\n{text}",
+    },
+    "master_unnamed": {
+        "ru": "Мастер",
+        "ky": "Устат",
+        "en": "Master",
+    },
+    "phone_line": {
+        "ru": "\n📱 Телефон: {phone}",
+        "ky": "\n📱 Телефон: {phone}",
+        "en": "\n📱 Phone: {phone}",
+    },
+    "phone_not_set": {
+        "ru": "Не указан",
+        "ky": "Көрсөтүлгөн эмес",
+        "en": "Not provided",
+    },
+    "language_choose": {
+        "ru": "🌐 Выберите язык уведомлений:",
+        "ky": "🌐 Билдирүүлөрдүн тилин тандаңыз:",
+        "en": "🌐 Choose the language of notifications:",
+    },
+    "language_changed": {
+        "ru": "✅ Язык изменен: {language}",
+        "ky": "✅ Тил өзгөртүлдү: {language}",
+        "en": "✅ Language changed: {language}",
+    },
+}
+
+
+def _fields(template: str) -> frozenset:
+    """Имена полей шаблона"""
+    return frozenset(name for _, name, _, _ in Formatter().parse(template) if name)
+
+
+def _compile(catalog: Dict[str, Dict[str, str]]) -> Dict[Tuple[str, str], Callable[[dict], str]]:
+    """
+    Компиляция каталога: проверка полей и подготовка format_map
+    
+    Raises:
+        ValueError: Нет перевода на один из языков или поля переводов различаются
+    """
+    compiled = {}
+    for key, translations in catalog.items():
+        missing = set(LANGUAGES) - set(translations)
+        if missing:
+            raise ValueError(f"Шаблон {key}: нет перевода на {', '.join(sorted(missing))}")
+        
+        fields = _fields(translations[DEFAULT_LANGUAGE])
+        for language, template in translations.items():
+            if _fields(template) != fields:
+                raise ValueError(f"Шаблон {key} ({language}): поля отличаются от {DEFAULT_LANGUAGE}")
+            compiled[(key, language)] = template.format_map
+    return compiled
+
+
+_compiled = _compile(CATALOG)
+
+
+def normalize_language(code: Optional[str]) -> str:
+    """Поддерживаемый язык по коду (ru, en-US, ...), иначе язык по умолчанию"""
+    if code:
+        code = code[:2].lower()
+        if code in LANGUAGES:
+            return code
+    return DEFAULT_LANGUAGE
+
+
+def user_language(user) -> str:
+    """Язык уведомлений пользователя"""
+    return normalize_language(getattr(user, "language", None))
+
+
+def t(key: str, language: str = DEFAULT_LANGUAGE, **values) -> str:
+    """
+    Текст из каталога
+    
+    Args:
+        key: Ключ шаблона в CATALOG
+        language: Язык (неподдерживаемый заменяется языком по умолчанию)
+        values: Значения полей шаблона
+    """
+    render = _compiled.get((key, language)) or _compiled[(key, DEFAULT_LANGUAGE)]
+    return render(values)
+
+
+def format_date(day: date, language: str = DEFAULT_LANGUAGE) -> str:
+    """Дата в формате языка"""
+    return day.strftime(DATE_FORMATS.get(language, DATE_FORMATS[DEFAULT_LANGUAGE]))
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_datetime(value: datetime, language: str = DEFAULT_LANGUAGE) -> str:
+    """Дата и время (ЧЧ:ММ) в формате языка (кэшируется по моменту и языку)"""
+    return value.strftime(f"{DATE_FORMATS.get(language, DATE_FORMATS[DEFAULT_LANGUAGE])} %H:%M")
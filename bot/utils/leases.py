@@ -0,0 +1,163 @@
+"""
+Распределение фоновой работы между несколькими экземплярами бота
+
+Строки очередей (notifications, outbox) берутся в работу арендой: экземпляр
+записывает в строку свой claimed_by и срок lease_until, и до истечения срока
+другие экземпляры ее не выбирают. Если экземпляр упал, аренда истекает и
+строку забирает другой. На PostgreSQL кандидаты выбираются через
+SELECT ... FOR UPDATE SKIP LOCKED, на SQLite - условным UPDATE
+(запись в SQLite сериализуется, поэтому одну строку получает один экземпляр).
+
+Дополнительно поддерживается выбор лидера через таблицу leader_locks.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from bot.models import LeaderLock
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Идентификатор экземпляра бота
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Срок аренды строки очереди
+DEFAULT_LEASE_SECONDS = 120
+
+# Сколько раз кандидаты выбираются заново, если все их успел арендовать
+# другой экземпляр, опросивший очередь в тот же момент
+CLAIM_RETRIES = 5
+
+# Срок блокировки лидера (продлевается лидером при каждом запуске задачи)
+LEADER_LOCK_SECONDS = 60
+
+
+def claim_rows(
+    db: Session,
+    model,
+    filters: list,
+    order_by,
+    limit: int,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+    worker_id: str = None
+) -> List:
+    """
+    Аренда строк очереди текущим экземпляром
+    
+    Модель должна иметь столбцы id, claimed_by и lease_until. Аренда
+    фиксируется отдельным commit, поэтому сессия не должна содержать
+    незафиксированных изменений.
+    
+    Args:
+        db: Сессия БД
+        model: Модель очереди (Notification, OutboxMessage)
+        filters: Условия отбора готовых к обработке строк
+        order_by: Порядок обработки (выражение или список выражений)
+        limit: Максимум строк
+        lease_seconds: Срок аренды
+        worker_id: Идентификатор экземпляра (по умолчанию WORKER_ID)
+    
+    Returns:
+        Арендованные строки в порядке order_by; пустой список - свободных
+        готовых строк нет (или после CLAIM_RETRIES повторов все кандидаты
+        забирали другие экземпляры)
+    """
+    worker_id = worker_id or WORKER_ID
+    now = datetime.utcnow()
+    order_by = order_by if isinstance(order_by, (list, tuple)) else [order_by]
+    free = or_(model.lease_until.is_(None), model.lease_until < now)
+    taken = []
+    
+    for _ in range(CLAIM_RETRIES + 1):
+        conditions = [*filters, free]
+        if taken:
+            conditions.append(model.id.notin_(taken))
+        
+        candidates = db.query(model.id).filter(*conditions).order_by(*order_by).limit(limit)
+        if db.get_bind().dialect.name == "postgresql":
+            candidates = candidates.with_for_update(skip_locked=True)
+        
+        ids = [row_id for (row_id,) in candidates]
+        if not ids:
+            db.rollback()
+            return []
+        
+        # Повторная проверка условий и свободы аренды внутри UPDATE защищает от
+        # гонки на SQLite: строку могли обработать и освободить (release_row)
+        # между выбором кандидатов и UPDATE
+        result = db.execute(
+            update(model)
+            .where(model.id.in_(ids), *filters, free)
+            .values(claimed_by=worker_id, lease_until=now + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        
+        if result.rowcount:
+            break
+        
+        # Те же первые строки одновременно выбрали другие экземпляры, и они
+        # их уже взяли. Пустой ответ вызывающий код принял бы за пустую
+        # очередь, поэтому выбираются следующие строки
+        taken.extend(ids)
+    else:
+        return []
+    
+    return db.query(model).filter(
+        model.id.in_(ids),
+        model.claimed_by == worker_id
+    ).order_by(*order_by).all()
+
+
+def release_row(row):
+    """Снятие аренды со строки (без commit)"""
+    row.claimed_by = None
+    row.lease_until = None
+
+
+def try_acquire_leadership(
+    db: Session,
+    name: str,
+    ttl_seconds: int = LEADER_LOCK_SECONDS,
+    worker_id: str = None
+) -> bool:
+    """
+    Захват или продление блокировки лидера
+    
+    Блокировка достается экземпляру, если она свободна, истекла или уже
+    принадлежит ему; срок продлевается на ttl_seconds.
+    
+    Returns:
+        True если текущий экземпляр - лидер
+    """
+    from bot.database import insert_or_ignore
+    
+    worker_id = worker_id or WORKER_ID
+    now = datetime.utcnow()
+    
+    try:
+        insert_or_ignore(db, LeaderLock, {"name": name, "holder": None, "expires_at": None})
+        result = db.execute(
+            update(LeaderLock)
+            .where(
+                LeaderLock.name == name,
+                or_(
+                    LeaderLock.holder == worker_id,
+                    LeaderLock.holder.is_(None),
+                    LeaderLock.expires_at < now
+                )
+            )
+            .values(holder=worker_id, expires_at=now + timedelta(seconds=ttl_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except Exception as e:
+        logger.error(f"Ошибка захвата блокировки лидера {name}: {e}")
+        db.rollback()
+        return False
+    
+    return result.rowcount == 1
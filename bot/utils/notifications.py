@@ -1,85 +1,115 @@
 """
 Модуль управления уведомлениями
+
+Тексты уведомлений берутся из каталога bot.utils.i18n на языке получателя.
 """
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from bot.models import Appointment, Notification, NotificationType
+from typing import List
+from bot.models import Appointment, AppointmentStatus, Notification, NotificationType
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from telegram import Bot
+from bot.config import LEADER_ELECTION
+from bot.utils.i18n import format_datetime, t, user_language
+from bot.utils.leases import claim_rows, release_row, try_acquire_leadership
+from bot.utils.outbound import PRIORITY_REMINDER, priority_kwargs
 import logging
 
 logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
 
+# Интервал обработки запланированных уведомлений
+NOTIFICATIONS_INTERVAL_MINUTES = 5
+
+# Сколько уведомлений арендуется за один проход
+NOTIFICATIONS_BATCH_SIZE = 100
+
+# Блокировка лидера живет два интервала: пропуск одного запуска не отдает лидерство
+NOTIFICATIONS_LOCK_SECONDS = NOTIFICATIONS_INTERVAL_MINUTES * 60 * 2
+
 
 async def send_notification(bot: Bot, chat_id: int, message: str):
     """Отправка уведомления пользователю"""
     try:
-        await bot.send_message(chat_id=chat_id, text=message)
+        await bot.send_message(chat_id=chat_id, text=message, **priority_kwargs(bot, PRIORITY_REMINDER))
         logger.info(f"Уведомление отправлено пользователю {chat_id}")
     except Exception as e:
         logger.error(f"Ошибка отправки уведомления пользователю {chat_id}: {e}")
 
 
-async def send_confirmation_notification(bot: Bot, appointment: Appointment):
-    """Отправка уведомления о подтверждении записи"""
-    client = appointment.client
+def build_confirmation_message(appointment: Appointment) -> str:
+    """Текст уведомления клиенту о подтверждении записи"""
     service = appointment.service
     master = appointment.master_profile
+    language = user_language(appointment.client)
     
-    message = (
-        f"✅ Ваша запись подтверждена!\n\n"
-        f"📅 Дата и время: {appointment.start_time.strftime('%d.%m.%Y %H:%M')}\n"
-        f"🛠 Услуга: {service.name}\n"
-        f"💰 Стоимость: {service.price} ₽\n"
-        f"⏱ Длительность: {service.duration_minutes} мин.\n"
-        f"👤 Мастер: {master.business_name or master.user.full_name}\n\n"
-        f"Мы напомним вам о записи заранее."
+    return t(
+        "appointment_confirmed",
+        language,
+        when=format_datetime(appointment.start_time, language),
+        service=service.name,
+        price=service.price,
+        duration=service.duration_minutes,
+        master=master.business_name or master.user.full_name
     )
-    
-    await send_notification(bot, client.telegram_id, message)
 
 
-async def send_reminder_notification(bot: Bot, appointment: Appointment):
-    """Отправка напоминания о записи"""
-    client = appointment.client
+def build_reminder_message(appointment: Appointment) -> str:
+    """Текст напоминания клиенту о записи"""
     service = appointment.service
+    language = user_language(appointment.client)
     
-    message = (
-        f"🔔 Напоминание о записи\n\n"
-        f"📅 Дата и время: {appointment.start_time.strftime('%d.%m.%Y %H:%M')}\n"
-        f"🛠 Услуга: {service.name}\n"
-        f"⏱ Длительность: {service.duration_minutes} мин.\n\n"
-        f"Не забудьте о встрече!"
+    return t(
+        "appointment_reminder",
+        language,
+        when=format_datetime(appointment.start_time, language),
+        service=service.name,
+        duration=service.duration_minutes
     )
+
+
+def build_client_cancellation_message(appointment: Appointment) -> str:
+    """Текст уведомления мастеру об отмене записи клиентом"""
+    language = user_language(appointment.master_profile.user)
     
-    await send_notification(bot, client.telegram_id, message)
+    return t(
+        "appointment_cancelled_by_client",
+        language,
+        when=format_datetime(appointment.start_time, language),
+        service=appointment.service.name,
+        client=appointment.client_name or appointment.client.full_name,
+        phone=appointment.client_phone or t("phone_not_set", language)
+    )
+
+
+async def send_confirmation_notification(bot: Bot, appointment: Appointment):
+    """Отправка уведомления о подтверждении записи"""
+    await send_notification(bot, appointment.client.telegram_id, build_confirmation_message(appointment))
+
+
+async def send_reminder_notification(bot: Bot, appointment: Appointment):
+    """Отправка напоминания о записи"""
+    await send_notification(bot, appointment.client.telegram_id, build_reminder_message(appointment))
 
 
 async def send_cancellation_notification(bot: Bot, appointment: Appointment, cancelled_by: str = "master"):
     """Отправка уведомления об отмене записи"""
     client = appointment.client
-    service = appointment.service
     
     if cancelled_by == "master":
-        message = (
-            f"❌ Ваша запись отменена мастером\n\n"
-            f"📅 Дата: {appointment.start_time.strftime('%d.%m.%Y %H:%M')}\n"
-            f"🛠 Услуга: {service.name}\n\n"
-            f"Вы можете записаться на другое время."
+        language = user_language(client)
+        message = t(
+            "appointment_cancelled_by_master",
+            language,
+            when=format_datetime(appointment.start_time, language),
+            service=appointment.service.name
         )
         await send_notification(bot, client.telegram_id, message)
     else:
         # Уведомление мастеру об отмене клиентом
         master_user = appointment.master_profile.user
-        message = (
-            f"❌ Клиент отменил запись\n\n"
-            f"📅 Дата: {appointment.start_time.strftime('%d.%m.%Y %H:%M')}\n"
-            f"🛠 Услуга: {service.name}\n"
-            f"👤 Клиент: {appointment.client_name or client.full_name}\n"
-        )
-        await send_notification(bot, master_user.telegram_id, message)
+        await send_notification(bot, master_user.telegram_id, build_client_cancellation_message(appointment))
 
 
 def schedule_notifications(
@@ -96,19 +126,100 @@ def schedule_notifications(
         reminder_hours: За сколько часов напоминать
     """
     # Планирование напоминания (уведомление о подтверждении отправляется сразу)
-    reminder_time = appointment.start_time - timedelta(hours=reminder_hours)
-    if reminder_time > datetime.utcnow():
-        reminder_notif = Notification(
-            appointment_id=appointment.id,
-            notification_type=NotificationType.REMINDER,
-            scheduled_for=reminder_time,
-            is_sent=False
-        )
-        db.add(reminder_notif)
+    if add_reminders(db, [appointment], reminder_hours):
         db.commit()
         logger.info(f"Напоминание запланировано для записи {appointment.id}")
 
 
+def add_reminders(db: Session, appointments: List[Appointment], reminder_hours: int = 24) -> int:
+    """
+    Добавление напоминаний для записей (без commit)
+    
+    Записи должны иметь id (после flush). Напоминания, время которых уже
+    прошло, не создаются.
+    
+    Returns:
+        Количество добавленных напоминаний
+    """
+    now = datetime.utcnow()
+    reminders = []
+    for appointment in appointments:
+        reminder_time = reminder_time_utc(db, appointment, reminder_hours)
+        if reminder_time > now:
+            reminders.append(Notification(
+                appointment_id=appointment.id,
+                notification_type=NotificationType.REMINDER,
+                scheduled_for=reminder_time,
+                is_sent=False
+            ))
+    
+    db.add_all(reminders)
+    return len(reminders)
+
+
+def reminder_time_utc(db: Session, appointment: Appointment, reminder_hours: int) -> datetime:
+    """
+    Момент напоминания в UTC
+    
+    Время записи хранится на часах мастера, а очередь уведомлений
+    сравнивается с utcnow.
+    """
+    from bot.utils.timezones import get_master_timezone, local_to_utc
+    
+    return local_to_utc(
+        appointment.start_time - timedelta(hours=reminder_hours),
+        get_master_timezone(db, appointment.master_id)
+    )
+
+
+def void_reminders(db: Session, appointment: Appointment) -> int:
+    """
+    Аннулирование неотправленных напоминаний и подтверждений записи (при отмене)
+    
+    Изменения попадают в текущую транзакцию, commit выполняет вызывающий код.
+    
+    Returns:
+        Количество аннулированных уведомлений
+    """
+    voided = db.query(Notification).filter(
+        Notification.appointment_id == appointment.id,
+        Notification.is_sent == False,
+        Notification.notification_type.in_([NotificationType.REMINDER, NotificationType.CONFIRMATION])
+    ).delete(synchronize_session=False)
+    
+    if voided:
+        logger.info(f"Аннулировано {voided} уведомлений записи {appointment.id}")
+    
+    return voided
+
+
+def reschedule_reminders(db: Session, appointment: Appointment, reminder_hours: int = 24) -> int:
+    """
+    Перенос неотправленных напоминаний под новое время записи
+    
+    Напоминание, время которого уже прошло, аннулируется.
+    Изменения попадают в текущую транзакцию, commit выполняет вызывающий код.
+    
+    Returns:
+        Количество перенесенных напоминаний
+    """
+    reminder_time = reminder_time_utc(db, appointment, reminder_hours)
+    query = db.query(Notification).filter(
+        Notification.appointment_id == appointment.id,
+        Notification.is_sent == False,
+        Notification.notification_type == NotificationType.REMINDER
+    )
+    
+    if reminder_time <= datetime.utcnow():
+        query.delete(synchronize_session=False)
+        return 0
+    
+    return query.update(
+        {Notification.scheduled_for: reminder_time, Notification.claimed_by: None, Notification.lease_until: None},
+        synchronize_session=False
+    )
+
+
 async def process_pending_notifications(bot: Bot, db_func):
     """Обработка запланированных уведомлений"""
     from bot.database import get_db_session
@@ -119,27 +230,58 @@ async def process_pending_notifications(bot: Bot, db_func):
         db = db_func
     
     try:
-        now = datetime.utcnow()
-        
-        pending_notifications = db.query(Notification).filter(
-            Notification.is_sent == False,
-            Notification.scheduled_for <= now
-        ).all()
-        
-        for notif in pending_notifications:
-            appointment = notif.appointment
+        # Пачки выбираются, пока очередь не разобрана: накопившиеся после
+        # простоя или утреннего пика напоминания не ждут следующих запусков
+        while True:
+            # При нескольких экземплярах бота напоминания обрабатывает только
+            # лидер; блокировка продлевается перед каждой пачкой
+            if LEADER_ELECTION and not try_acquire_leadership(db, "process_notifications", ttl_seconds=NOTIFICATIONS_LOCK_SECONDS):
+                return
             
-            if notif.notification_type == NotificationType.CONFIRMATION:
-                await send_confirmation_notification(bot, appointment)
-            elif notif.notification_type == NotificationType.REMINDER:
-                await send_reminder_notification(bot, appointment)
-            elif notif.notification_type == NotificationType.CANCELLATION:
-                await send_cancellation_notification(bot, appointment)
+            now = datetime.utcnow()
             
-            notif.is_sent = True
-            notif.sent_at = now
-        
-        db.commit()
+            # Уведомления арендуются, чтобы другой экземпляр не отправил их повторно
+            pending_notifications = claim_rows(
+                db,
+                Notification,
+                [Notification.is_sent == False, Notification.scheduled_for <= now],
+                Notification.scheduled_for,
+                NOTIFICATIONS_BATCH_SIZE
+            )
+            
+            # Записи пачки загружаются одним запросом и проверяются заново:
+            # напоминание отмененной записи аннулируется без отправки
+            appointment_ids = {notif.appointment_id for notif in pending_notifications}
+            appointments = {
+                appointment.id: appointment
+                for appointment in db.query(Appointment).filter(Appointment.id.in_(appointment_ids))
+            } if appointment_ids else {}
+            
+            for notif in pending_notifications:
+                appointment = appointments.get(notif.appointment_id)
+                
+                if appointment is None or (
+                    notif.notification_type != NotificationType.CANCELLATION
+                    and appointment.status == AppointmentStatus.CANCELLED
+                ):
+                    db.delete(notif)
+                    db.commit()
+                    continue
+                
+                if notif.notification_type == NotificationType.CONFIRMATION:
+                    await send_confirmation_notification(bot, appointment)
+                elif notif.notification_type == NotificationType.REMINDER:
+                    await send_reminder_notification(bot, appointment)
+                elif notif.notification_type == NotificationType.CANCELLATION:
+                    await send_cancellation_notification(bot, appointment)
+                
+                notif.is_sent = True
+                notif.sent_at = now
+                release_row(notif)
+                db.commit()
+            
+            if len(pending_notifications) < NOTIFICATIONS_BATCH_SIZE:
+                break
     except Exception as e:
         logger.error(f"Ошибка обработки уведомлений: {e}")
         db.rollback()
@@ -152,11 +294,45 @@ def start_scheduler(bot: Bot, db_func):
     scheduler.add_job(
         process_pending_notifications,
         'interval',
-        minutes=5,
+        minutes=NOTIFICATIONS_INTERVAL_MINUTES,
         args=[bot, db_func],
         id='process_notifications',
         replace_existing=True
     )
+    
+    # Ежедневный перенос старых записей и уведомлений в архив
+    from bot.utils.retention import process_retention
+    scheduler.add_job(
+        process_retention,
+        'cron',
+        hour=3,
+        minute=30,
+        args=[db_func],
+        id='process_retention',
+        replace_existing=True
+    )
+    
+    # Снятие истекших предложений листа ожидания
+    from bot.utils.waitlist import WAITLIST_INTERVAL_MINUTES, process_waitlist
+    scheduler.add_job(
+        process_waitlist,
+        'interval',
+        minutes=WAITLIST_INTERVAL_MINUTES,
+        args=[bot, db_func],
+        id='process_waitlist',
+        replace_existing=True
+    )
+    
+    # Метрики пулов соединений к Bot API
+    from bot.utils.http_pools import METRICS_LOG_MINUTES, log_pool_metrics
+    scheduler.add_job(
+        log_pool_metrics,
+        'interval',
+        minutes=METRICS_LOG_MINUTES,
+        id='log_pool_metrics',
+        replace_existing=True
+    )
+    
     scheduler.start()
     logger.info("Планировщик уведомлений запущен")
 
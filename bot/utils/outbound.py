@@ -0,0 +1,296 @@
+"""
+Приоритетный планировщик исходящих запросов к Bot API
+
+Ответы на действия пользователей, оплаты, напоминания и рассылки делят
+общие лимиты Telegram (около 30 сообщений в секунду на бота и 1 в секунду
+в один чат). Без приоритетов пачка рассылки отодвигала ответы на нажатия
+кнопок дальше таймаута callback-запроса.
+
+Планировщик подключен к application.bot и bulk_bot как rate limiter PTB
+(OutboundRateLimiter), поэтому через него проходят все вызовы context.bot,
+шорткаты query.edit_message_text / message.reply_text, отправки outbox и
+напоминаний. Классы запросов по убыванию приоритета: interactive, payment,
+reminder, broadcast. Класс передается через rate_limit_args
+(см. priority_kwargs), по умолчанию это класс бота.
+
+Общий лимит - ведро токенов на OUTBOUND_RATE_PER_SECOND. Пока токены есть
+и очередь пуста, запрос уходит сразу; иначе он ждет в очереди со
+взвешенным справедливым обслуживанием (WFQ): запрос получает виртуальное
+время окончания с шагом 1 / вес класса, первым выходит запрос с
+наименьшим. Интерактивные запросы обгоняют фоновые, но рассылка не
+останавливается полностью.
+
+Сообщения фоновых классов в один чат разводятся на
+OUTBOUND_CHAT_INTERVAL_SECONDS: время чата резервируется до постановки в
+очередь, поэтому ожидающий чат не задерживает остальные. Интерактивные
+ответы не ждут, но занимают время чата. Ответы на callback-, inline- и
+pre-checkout-запросы и служебные методы не ограничиваются.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
+from telegram import Bot
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from bot.config import SHARD_WORKERS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Классы исходящих запросов
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_PAYMENT = "payment"
+PRIORITY_REMINDER = "reminder"
+PRIORITY_BROADCAST = "broadcast"
+
+# Вес класса в WFQ: доля пропускной способности при конкуренции классов
+PRIORITY_WEIGHTS = {
+    PRIORITY_INTERACTIVE: 16,
+    PRIORITY_PAYMENT: 8,
+    PRIORITY_REMINDER: 2,
+    PRIORITY_BROADCAST: 1,
+}
+
+# Класс сообщения outbox по его типу; остальные типы - уведомления о записях.
+# Предложение из листа ожидания держит время за клиентом только
+# WAITLIST_OFFER_MINUTES, и каждая минута в очереди отнимается у клиента
+# на ответ, поэтому оно идет классом оплат, а не напоминаний
+OUTBOX_KIND_PRIORITY = {
+    "payment": PRIORITY_PAYMENT,
+    "waitlist": PRIORITY_PAYMENT,
+    "broadcast": PRIORITY_BROADCAST,
+}
+
+# Общий лимит на бота (делится между процессами-воркерами) и запас на всплеск
+OUTBOUND_RATE_PER_SECOND = 25
+OUTBOUND_BURST = 5
+
+# Интервал между сообщениями фоновых классов в один чат
+OUTBOUND_CHAT_INTERVAL_SECONDS = 1.0
+
+# При таком количестве отслеживаемых чатов устаревшие отметки удаляются
+OUTBOUND_CHAT_TRACK_LIMIT = 10000
+
+# Методы без ограничений: ответы с жестким таймаутом и служебные вызовы
+UNLIMITED_ENDPOINTS = frozenset({
+    "answerCallbackQuery",
+    "answerInlineQuery",
+    "answerPreCheckoutQuery",
+    "answerShippingQuery",
+    "getUpdates",
+    "getMe",
+    "getFile",
+    "deleteWebhook",
+    "setWebhook",
+    "setMyCommands",
+    "sendChatAction",
+})
+
+
+def _is_message_endpoint(endpoint: str) -> bool:
+    """Метод создает сообщение в чате (на него действует лимит чата)"""
+    return (
+        endpoint.startswith("send") and endpoint != "sendChatAction"
+    ) or endpoint in ("copyMessage", "copyMessages", "forwardMessage", "forwardMessages")
+
+
+def _chat_id(data: Optional[Dict[str, Any]]) -> Optional[int]:
+    """ID чата получателя (чаты, заданные через @username, не учитываются)"""
+    if not data:
+        return None
+    try:
+        return int(data.get("chat_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+class OutboundScheduler:
+    """
+    Общая очередь исходящих запросов процесса
+    
+    Ведро токенов с общим лимитом, WFQ между классами и резервирование
+    времени чатов.
+    """
+    
+    def __init__(
+        self,
+        rate_per_second: float = OUTBOUND_RATE_PER_SECOND,
+        burst: float = OUTBOUND_BURST,
+        chat_interval: float = OUTBOUND_CHAT_INTERVAL_SECONDS
+    ):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.chat_interval = chat_interval
+        
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        
+        # (виртуальное время окончания, порядковый номер, класс, future)
+        self._heap: List[Tuple[float, int, str, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        
+        # Чат -> время (time.monotonic), раньше которого новое сообщение не уходит
+        self._chat_next: Dict[int, float] = {}
+    
+    def _token_delay(self) -> float:
+        """Через сколько секунд будет доступен токен"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate_per_second
+    
+    def _take_token(self) -> bool:
+        if self._token_delay() > 0:
+            return False
+        self._tokens -= 1
+        return True
+    
+    async def _wait_for_chat(self, priority: str, chat_id: int):
+        """Резервирование времени чата; фоновые классы ждут своей очереди"""
+        now = time.monotonic()
+        
+        if len(self._chat_next) > OUTBOUND_CHAT_TRACK_LIMIT:
+            self._chat_next = {chat: ready for chat, ready in self._chat_next.items() if ready > now}
+        
+        if priority == PRIORITY_INTERACTIVE:
+            self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), now + self.chat_interval)
+            return
+        
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + self.chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    
+    def chat_delay(self, chat_id: int) -> float:
+        """Через сколько секунд в чат можно отправить сообщение фонового класса"""
+        return max(self._chat_next.get(chat_id, 0.0) - time.monotonic(), 0.0)
+    
+    async def _dispatch(self):
+        """Выдача токенов ожидающим запросам в порядке WFQ"""
+        while self._heap:
+            delay = self._token_delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            
+            finish, _, _, future = heapq.heappop(self._heap)
+            # Запрос отменили, пока он ждал
+            if future.done():
+                continue
+            
+            self._tokens -= 1
+            self._virtual_time = finish
+            future.set_result(None)
+    
+    async def acquire(self, priority: str, chat_id: Optional[int] = None):
+        """
+        Ожидание разрешения на запрос
+        
+        Args:
+            priority: Класс запроса (PRIORITY_*)
+            chat_id: Чат получателя, если запрос создает сообщение
+        """
+        if chat_id is not None:
+            await self._wait_for_chat(priority, chat_id)
+        
+        if not self._heap and self._take_token():
+            return
+        
+        weight = PRIORITY_WEIGHTS.get(priority, 1)
+        finish = max(self._virtual_time, self._last_finish.get(priority, 0.0)) + 1.0 / weight
+        self._last_finish[priority] = finish
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._sequence), priority, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+    
+    def pause(self, seconds: float):
+        """Остановка выдачи токенов после RetryAfter от Telegram"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+    
+    def queued(self) -> Dict[str, int]:
+        """Количество ожидающих запросов по классам"""
+        counts: Dict[str, int] = {}
+        for _, _, priority, future in self._heap:
+            if not future.done():
+                counts[priority] = counts.get(priority, 0) + 1
+        return counts
+
+
+_scheduler: Optional[OutboundScheduler] = None
+
+
+def get_scheduler() -> OutboundScheduler:
+    """Очередь исходящих запросов процесса (общая для всех ботов)"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = OutboundScheduler(rate_per_second=OUTBOUND_RATE_PER_SECOND / max(SHARD_WORKERS, 1))
+    return _scheduler
+
+
+class OutboundRateLimiter(BaseRateLimiter[str]):
+    """
+    Rate limiter PTB, пропускающий запросы бота через общую очередь
+    
+    Args:
+        default_priority: Класс запросов бота без rate_limit_args
+    """
+    
+    def __init__(self, default_priority: str = PRIORITY_INTERACTIVE):
+        self.default_priority = default_priority
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        pass
+    
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[str],
+    ) -> Any:
+        if endpoint not in UNLIMITED_ENDPOINTS:
+            priority = rate_limit_args or self.default_priority
+            chat_id = _chat_id(data) if _is_message_endpoint(endpoint) else None
+            await get_scheduler().acquire(priority, chat_id)
+        
+        try:
+            return await callback(*args, **kwargs)
+        except RetryAfter as e:
+            # Лимит Telegram превышен - притормаживаем все классы
+            retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+            get_scheduler().pause(retry_after)
+            logger.warning(f"Лимит Telegram на {endpoint}: исходящие запросы приостановлены на {retry_after} с")
+            raise
+
+
+def priority_kwargs(bot: Bot, priority: str) -> Dict[str, str]:
+    """
+    Аргументы вызова Bot API с классом запроса
+    
+    rate_limit_args принимает только бот с rate limiter, поэтому для
+    остальных ботов возвращается пустой словарь.
+    """
+    if getattr(bot, "rate_limiter", None) is None:
+        return {}
+    return {"rate_limit_args": priority}
@@ -0,0 +1,255 @@
+"""
+Outbox исходящих сообщений
+
+Уведомления записываются в таблицу outbox в той же транзакции, что и
+изменение состояния (оплата, запись, отмена), и отправляются фоновым
+диспетчером. Поэтому сообщение не теряется при падении бота между commit
+и отправкой, обработчик отвечает пользователю сразу после commit, а
+уникальный dedup_key не дает поставить одно и то же уведомление дважды.
+
+Диспетчер выбирает сообщения пачками и повторяет неудачные отправки с
+экспоненциальной задержкой. Класс сообщения определяется по его типу
+(OUTBOX_KIND_PRIORITY): пачка набирается сначала из классов с большим
+весом, а ее сообщения отправляются одновременно, чтобы очередность между
+ними определял планировщик исходящих запросов (bot.utils.outbound) с его
+общим лимитом скорости. Сообщение в чат, который еще не готов принять
+следующее, не ждет в пачке, а откладывается до следующего прохода.
+После commit обработчик вызывает kick_outbox(), чтобы диспетчер не ждал
+очередного интервала опроса.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import case, or_
+from sqlalchemy.orm import Session
+from bot.models import OutboxMessage, OutboxStatus
+from bot.utils.leases import claim_rows, release_row
+from bot.utils.outbound import (
+    OUTBOX_KIND_PRIORITY, PRIORITY_REMINDER, PRIORITY_WEIGHTS, get_scheduler, priority_kwargs
+)
+from telegram import Bot, InlineKeyboardMarkup
+from telegram.error import Forbidden, RetryAfter
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Интервал опроса outbox, если диспетчер не разбудили раньше
+OUTBOX_POLL_SECONDS = 5
+
+# Сколько сообщений выбирается из БД за один проход
+OUTBOX_BATCH_SIZE = 50
+
+# Сколько сообщений пачки отправляется одновременно
+OUTBOX_SEND_CONCURRENCY = 20
+
+# После стольких неудачных попыток сообщение помечается как FAILED
+OUTBOX_MAX_ATTEMPTS = 5
+
+# Задержка перед повтором: OUTBOX_RETRY_BASE_SECONDS * 2^(попытка - 1), не более OUTBOX_RETRY_MAX_SECONDS
+OUTBOX_RETRY_BASE_SECONDS = 10
+OUTBOX_RETRY_MAX_SECONDS = 600
+
+# Событие для немедленного запуска диспетчера
+_wakeup: Optional[asyncio.Event] = None
+
+
+def enqueue_message(
+    db: Session,
+    chat_id: int,
+    text: str,
+    kind: str = "message",
+    dedup_key: Optional[str] = None,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    broadcast_id: Optional[int] = None
+) -> bool:
+    """
+    Постановка сообщения в outbox
+    
+    Изменения попадают в текущую транзакцию, commit выполняет вызывающий код.
+    
+    Args:
+        db: Сессия БД
+        chat_id: Telegram ID получателя
+        text: Текст сообщения
+        kind: Тип сообщения (payment, appointment, ...)
+        dedup_key: Ключ дедупликации; повторная постановка с тем же ключом игнорируется
+        reply_markup: Inline-клавиатура сообщения
+        broadcast_id: ID рассылки мастера, частью которой является сообщение
+    
+    Returns:
+        True если сообщение поставлено, False если оно уже есть в outbox
+    """
+    from bot.database import insert_or_ignore
+    
+    return insert_or_ignore(db, OutboxMessage, {
+        "chat_id": chat_id,
+        "text": text,
+        "reply_markup": json.dumps(reply_markup.to_dict()) if reply_markup else None,
+        "kind": kind,
+        "broadcast_id": broadcast_id,
+        "dedup_key": dedup_key,
+        "status": OutboxStatus.PENDING,
+        "attempts": 0,
+        "created_at": datetime.utcnow(),
+    })
+
+
+def kick_outbox():
+    """Разбудить диспетчер после commit с новыми сообщениями"""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """Задержка перед следующей попыткой"""
+    seconds = OUTBOX_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, OUTBOX_RETRY_MAX_SECONDS))
+
+
+def _claim_order() -> list:
+    """Порядок выборки: сначала типы классов с большим весом, внутри класса - по очереди постановки"""
+    weight = case(
+        {kind: PRIORITY_WEIGHTS[priority] for kind, priority in OUTBOX_KIND_PRIORITY.items()},
+        value=OutboxMessage.kind,
+        else_=PRIORITY_WEIGHTS[PRIORITY_REMINDER]
+    )
+    return [weight.desc(), OutboxMessage.id]
+
+
+async def _send_outbox_message(bot: Bot, message: OutboxMessage):
+    """Отправка одного сообщения с обновлением его статуса (без commit)"""
+    try:
+        reply_markup = None
+        if message.reply_markup:
+            reply_markup = InlineKeyboardMarkup.de_json(json.loads(message.reply_markup), bot)
+        await bot.send_message(
+            chat_id=message.chat_id,
+            text=message.text,
+            reply_markup=reply_markup,
+            **priority_kwargs(bot, OUTBOX_KIND_PRIORITY.get(message.kind, PRIORITY_REMINDER))
+        )
+        message.status = OutboxStatus.SENT
+        message.sent_at = datetime.utcnow()
+        message.last_error = None
+    except RetryAfter as e:
+        # Превышен лимит Telegram - повторяем после указанной паузы, попытку не считаем
+        retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+        message.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_after)
+        message.last_error = str(e)
+        logger.warning(f"Outbox: лимит Telegram, повтор сообщения {message.id} через {retry_after} с")
+    except Forbidden as e:
+        # Пользователь заблокировал бота - повторять бессмысленно
+        message.attempts = (message.attempts or 0) + 1
+        message.status = OutboxStatus.FAILED
+        message.last_error = str(e)
+        logger.warning(f"Outbox: пользователь {message.chat_id} недоступен, сообщение {message.id} отброшено")
+    except Exception as e:
+        message.attempts = (message.attempts or 0) + 1
+        message.last_error = str(e)
+        if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+            message.status = OutboxStatus.FAILED
+        else:
+            message.next_attempt_at = datetime.utcnow() + _retry_delay(message.attempts)
+        logger.error(f"Ошибка отправки сообщения {message.id} из outbox пользователю {message.chat_id}: {e}")
+
+
+async def process_outbox(bot: Bot, db_func) -> int:
+    """
+    Отправка готовых к отправке сообщений из outbox
+    
+    Сообщения выбираются пачками по OUTBOX_BATCH_SIZE, пока они есть, и
+    отправляются по OUTBOX_SEND_CONCURRENCY одновременно. Статус каждого
+    сообщения фиксируется сразу после отправки, чтобы при перезапуске не
+    отправить его повторно.
+    
+    Returns:
+        Количество отправленных сообщений (включая неудачные попытки)
+    """
+    if callable(db_func):
+        db = db_func()
+    else:
+        db = db_func
+    
+    scheduler = get_scheduler()
+    semaphore = asyncio.Semaphore(OUTBOX_SEND_CONCURRENCY)
+    processed = 0
+    
+    async def send(message: OutboxMessage):
+        async with semaphore:
+            await _send_outbox_message(bot, message)
+        # Между отправкой и commit нет await: commit не застает другое сообщение пачки измененным наполовину
+        release_row(message)
+        db.commit()
+    
+    try:
+        while True:
+            now = datetime.utcnow()
+            # Сообщения арендуются, чтобы другой экземпляр бота не отправил их повторно
+            batch = claim_rows(
+                db,
+                OutboxMessage,
+                [
+                    OutboxMessage.status == OutboxStatus.PENDING,
+                    or_(OutboxMessage.next_attempt_at.is_(None), OutboxMessage.next_attempt_at <= now)
+                ],
+                _claim_order(),
+                OUTBOX_BATCH_SIZE
+            )
+            
+            if not batch:
+                break
+            
+            # Ожидание интервала чата заняло бы место в отправке, поэтому такие
+            # сообщения откладываются, а остальные уходят без задержки
+            sending = []
+            batch_chats = set()
+            for message in batch:
+                delay = scheduler.chat_delay(message.chat_id)
+                if message.chat_id in batch_chats:
+                    delay = max(delay, scheduler.chat_interval)
+                if delay > 0:
+                    message.next_attempt_at = now + timedelta(seconds=delay)
+                    release_row(message)
+                    continue
+                batch_chats.add(message.chat_id)
+                sending.append(message)
+            db.commit()
+            
+            results = await asyncio.gather(*(send(message) for message in sending), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+            processed += len(sending)
+            
+            if len(batch) < OUTBOX_BATCH_SIZE:
+                break
+    except Exception as e:
+        logger.error(f"Ошибка обработки outbox: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    
+    return processed
+
+
+async def run_outbox_dispatcher(bot: Bot, db_func):
+    """
+    Фоновый диспетчер outbox
+    
+    Обрабатывает outbox сразу после kick_outbox() или раз в OUTBOX_POLL_SECONDS
+    (отложенные повторы и сообщения, поставленные другими процессами).
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+    
+    logger.info("Диспетчер outbox запущен")
+    
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        
+        await process_outbox(bot, db_func)
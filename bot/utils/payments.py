@@ -2,13 +2,109 @@
 Утилиты для работы с платежами через Telegram Bot Payments (FreedomPay KG)
 """
 import logging
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, NamedTuple
 from telegram import LabeledPrice
 
 logger = logging.getLogger(__name__)
 
 from bot.config import TELEGRAM_PAYMENT_PROVIDER_TOKEN
 
+# Telegram ждет ответ на PreCheckoutQuery не более 10 секунд, наша цель - до 1 секунды
+PRE_CHECKOUT_SLO_SECONDS = 1.0
+
+
+class OpenInvoice(NamedTuple):
+    """Открытый чек в горячем кэше"""
+    amount_minor: int  # Сумма в минимальных единицах (тийины)
+    currency: str
+    status: str
+
+
+# Горячий кэш открытых чеков: invoice_id -> OpenInvoice
+_open_invoices: Dict[int, OpenInvoice] = {}
+
+# Метрики времени ответа на PreCheckoutQuery
+pre_checkout_metrics = {
+    "answered": 0,
+    "slo_breaches": 0,
+    "cache_hits": 0,
+    "cache_misses": 0,
+    "max_seconds": 0.0,
+}
+
+
+def record_payment(
+    db,
+    telegram_payment_charge_id: str,
+    provider_payment_charge_id: Optional[str],
+    invoice_id: int,
+    amount_minor: int,
+    currency: str
+) -> bool:
+    """
+    Запись платежа в журнал payment_ledger
+    
+    Один INSERT ... ON CONFLICT DO NOTHING по уникальному telegram_payment_charge_id
+    в текущей транзакции; commit выполняет вызывающий код.
+    
+    Returns:
+        True если платеж новый, False если он уже был обработан
+    """
+    from datetime import datetime
+    from bot.database import insert_or_ignore
+    from bot.models import PaymentLedgerEntry
+    
+    return insert_or_ignore(db, PaymentLedgerEntry, {
+        "telegram_payment_charge_id": telegram_payment_charge_id,
+        "provider_payment_charge_id": provider_payment_charge_id,
+        "invoice_id": invoice_id,
+        "amount_minor": amount_minor,
+        "currency": currency,
+        "created_at": datetime.utcnow(),
+    })
+
+
+def to_minor_units(amount: float) -> int:
+    """Перевод суммы в минимальные единицы валюты (1 KGS = 100 тийинов)"""
+    return int(amount * 100)
+
+
+def remember_open_invoice(invoice_id: int, amount: float, currency: str, status: str = "pending"):
+    """Добавление чека в горячий кэш при отправке счета клиенту"""
+    _open_invoices[invoice_id] = OpenInvoice(to_minor_units(amount), currency, status)
+
+
+def get_open_invoice(invoice_id: int) -> Optional[OpenInvoice]:
+    """Получение открытого чека из горячего кэша"""
+    invoice = _open_invoices.get(invoice_id)
+    if invoice is None:
+        pre_checkout_metrics["cache_misses"] += 1
+    else:
+        pre_checkout_metrics["cache_hits"] += 1
+    return invoice
+
+
+def forget_open_invoice(invoice_id: int):
+    """Удаление чека из горячего кэша (после оплаты)"""
+    _open_invoices.pop(invoice_id, None)
+
+
+def record_pre_checkout_latency(invoice_id, seconds: float):
+    """
+    Учет времени ответа на PreCheckoutQuery
+    
+    При превышении PRE_CHECKOUT_SLO_SECONDS пишется предупреждение в лог.
+    """
+    pre_checkout_metrics["answered"] += 1
+    pre_checkout_metrics["max_seconds"] = max(pre_checkout_metrics["max_seconds"], seconds)
+    
+    if seconds > PRE_CHECKOUT_SLO_SECONDS:
+        pre_checkout_metrics["slo_breaches"] += 1
+        logger.warning(
+            f"⚠️ SLO PreCheckoutQuery нарушен: ответ по чеку {invoice_id} занял {seconds:.3f} с "
+            f"(порог {PRE_CHECKOUT_SLO_SECONDS:.1f} с, всего нарушений: {pre_checkout_metrics['slo_breaches']})"
+        )
+
 
 def init_payments():
     """Инициализация платежной системы"""
@@ -0,0 +1,226 @@
+"""
+Префиксный индекс мастеров и услуг для inline-режима
+
+Inline-запросы приходят на каждое нажатие клавиши, поэтому они
+обслуживаются из памяти: индекс - отсортированный список пар
+(слово, номер записи) по словам названий мастеров и услуг, поиск по
+префиксу - два bisect. Индекс строится одним запросом к БД и
+перестраивается в фоне не чаще раза в INDEX_TTL_SECONDS, а после изменения
+услуг (invalidate_prefix_index) - при следующем запросе; до окончания
+перестроения запросы обслуживает старый индекс. Перестроение идет в
+отдельном потоке со своим соединением к БД (bot.database.get_worker_session).
+
+Результаты по нормализованному запросу дополнительно кэшируются на
+RESULT_CACHE_SECONDS (повторы при наборе и стирании символов).
+"""
+import asyncio
+import re
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from bot.models import MasterProfile, Service, User
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Срок жизни индекса
+INDEX_TTL_SECONDS = 60
+
+# Срок жизни и размер кэша результатов
+RESULT_CACHE_SECONDS = 30
+RESULT_CACHE_SIZE = 1000
+
+# Максимум результатов на запрос (всех страниц)
+MAX_RESULTS = 200
+
+
+class IndexEntry(NamedTuple):
+    """Мастер или услуга в индексе"""
+    kind: str  # "master" или "service"
+    item_id: int
+    title: str
+    description: str
+    unique_link: str
+    words: Tuple[str, ...]
+
+
+class PrefixIndex(NamedTuple):
+    """Отсортированные пары (слово, номер записи) и записи"""
+    keys: List[Tuple[str, int]]
+    entries: List[IndexEntry]
+    built_at: float
+
+
+_index: Optional[PrefixIndex] = None
+_rebuild_task: Optional[asyncio.Task] = None
+_result_cache: "OrderedDict[str, Tuple[float, List[IndexEntry]]]" = OrderedDict()
+
+
+def normalize_words(text: str) -> List[str]:
+    """Слова текста в нижнем регистре, ё заменяется на е"""
+    return re.findall(r"\w+", (text or "").lower().replace("ё", "е"))
+
+
+def build_prefix_index(db: Session) -> PrefixIndex:
+    """
+    Построение индекса одним запросом
+    
+    В индекс попадают активные видимые услуги и мастера, у которых такие
+    услуги есть.
+    """
+    rows = db.query(
+        Service.id,
+        Service.name,
+        Service.price,
+        Service.duration_minutes,
+        MasterProfile.id,
+        MasterProfile.business_name,
+        MasterProfile.unique_link,
+        User.full_name
+    ).join(
+        MasterProfile, MasterProfile.id == Service.master_id
+    ).join(
+        User, User.id == MasterProfile.user_id
+    ).filter(
+        Service.is_active == True,
+        Service.is_hidden == False
+    ).all()
+    
+    entries: List[IndexEntry] = []
+    masters: Dict[int, List[str]] = {}
+    master_rows: Dict[int, Tuple[str, str]] = {}
+    
+    for service_id, name, price, duration, master_id, business_name, unique_link, full_name in rows:
+        master_name = business_name or full_name or "Мастер"
+        entries.append(IndexEntry(
+            kind="service",
+            item_id=service_id,
+            title=name,
+            description=f"{master_name} · {price} ₽ · {duration} мин.",
+            unique_link=unique_link,
+            words=tuple(normalize_words(name)),
+        ))
+        masters.setdefault(master_id, []).append(name)
+        master_rows[master_id] = (master_name, unique_link)
+    
+    for master_id, service_names in masters.items():
+        master_name, unique_link = master_rows[master_id]
+        entries.append(IndexEntry(
+            kind="master",
+            item_id=master_id,
+            title=master_name,
+            description=", ".join(service_names[:5]),
+            unique_link=unique_link,
+            words=tuple(normalize_words(master_name)),
+        ))
+    
+    keys = sorted(
+        (word, position)
+        for position, entry in enumerate(entries)
+        for word in set(entry.words)
+    )
+    
+    return PrefixIndex(keys=keys, entries=entries, built_at=time.monotonic())
+
+
+def _rebuild_sync(db_func) -> PrefixIndex:
+    """Перестроение индекса в отдельной сессии"""
+    db = db_func() if callable(db_func) else db_func
+    try:
+        return build_prefix_index(db)
+    finally:
+        db.close()
+
+
+async def _rebuild(db_func):
+    """Фоновое перестроение индекса"""
+    global _index
+    
+    from bot.database import get_worker_session, worker_sessions_available
+    
+    started = time.perf_counter()
+    try:
+        if worker_sessions_available():
+            index = await asyncio.to_thread(_rebuild_sync, get_worker_session)
+        else:
+            # SQLite в памяти доступна только через общее соединение цикла событий
+            index = _rebuild_sync(db_func)
+    except Exception as e:
+        logger.error(f"Ошибка построения inline-индекса: {e}")
+        return
+    
+    _index = index
+    _result_cache.clear()
+    logger.info(
+        f"Inline-индекс построен: {len(index.entries)} записей, {len(index.keys)} слов "
+        f"за {(time.perf_counter() - started) * 1000:.1f} мс"
+    )
+
+
+async def get_prefix_index(db_func) -> PrefixIndex:
+    """
+    Текущий индекс
+    
+    Первый вызов ждет построения; устаревший индекс возвращается сразу,
+    а перестроение запускается в фоне (одно на процесс).
+    """
+    global _rebuild_task
+    
+    stale = _index is None or time.monotonic() - _index.built_at > INDEX_TTL_SECONDS
+    if stale and (_rebuild_task is None or _rebuild_task.done()):
+        _rebuild_task = asyncio.create_task(_rebuild(db_func))
+    
+    if _index is None:
+        await _rebuild_task
+        if _index is None:
+            return PrefixIndex(keys=[], entries=[], built_at=0.0)
+    
+    return _index
+
+
+def invalidate_prefix_index():
+    """Пометить индекс устаревшим (перестроится при следующем запросе)"""
+    global _index
+    
+    if _index is not None:
+        _index = _index._replace(built_at=0.0)
+
+
+def lookup(index: PrefixIndex, query: str, limit: int = MAX_RESULTS) -> List[IndexEntry]:
+    """
+    Поиск записей, в названии которых каждое слово запроса - начало слова
+    
+    Мастера выводятся перед услугами, внутри - по алфавиту.
+    """
+    words = normalize_words(query)
+    if not words:
+        return []
+    
+    key = " ".join(words)
+    cached = _result_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < RESULT_CACHE_SECONDS:
+        _result_cache.move_to_end(key)
+        return cached[1]
+    
+    # Кандидаты по самому длинному слову запроса - самый узкий диапазон
+    first, *rest = sorted(words, key=len, reverse=True)
+    start = bisect_left(index.keys, (first, -1))
+    end = bisect_right(index.keys, (first + "\uffff", len(index.entries)))
+    positions = {position for _, position in index.keys[start:end]}
+    
+    results = []
+    for position in positions:
+        entry = index.entries[position]
+        if all(any(word.startswith(term) for word in entry.words) for term in rest):
+            results.append(entry)
+    
+    results.sort(key=lambda entry: (entry.kind != "master", entry.title.lower()))
+    results = results[:limit]
+    
+    _result_cache[key] = (time.monotonic(), results)
+    if len(_result_cache) > RESULT_CACHE_SIZE:
+        _result_cache.popitem(last=False)
+    
+    return results
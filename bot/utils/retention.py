@@ -0,0 +1,252 @@
+"""
+Хранение данных: перенос старых записей, чеков и уведомлений в архивные таблицы
+
+Рабочие таблицы appointments и notifications растут бесконечно, и вместе с
+ними замедляются выборка запланированных уведомлений и запросы по мастеру.
+Ежедневная задача переносит в архив (appointments_archive, invoices_archive,
+notifications_archive):
+
+* завершенные и отмененные записи старше RETENTION_APPOINTMENTS_MONTHS месяцев
+  вместе с их чеками и уведомлениями;
+* отправленные уведомления старше RETENTION_NOTIFICATIONS_DAYS дней.
+
+Перенос идет пачками по RETENTION_BATCH_SIZE строк, каждая пачка - отдельная
+транзакция (INSERT ... SELECT в архив и DELETE из рабочей таблицы). Записи с
+неоплаченным чеком или отзывом не переносятся. Архив остается доступным для
+выгрузки истории (bot.utils.export).
+
+Задача планировщика выполняет проход в отдельном потоке с собственным
+соединением к БД (bot.database.get_worker_session), а не через общее
+соединение обработчиков. На SQLite она не выполняет VACUUM: он держит
+монопольную блокировку всей БД, пока перезаписывает файл, а освобожденные
+страницы SQLite использует повторно и без него.
+"""
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import exists, select, text
+from sqlalchemy.orm import Session
+from bot.models import (
+    Appointment, AppointmentStatus, AppointmentArchive,
+    Invoice, InvoiceArchive, PaymentStatus,
+    Notification, NotificationArchive, Feedback
+)
+from bot.config import RETENTION_APPOINTMENTS_MONTHS, RETENTION_NOTIFICATIONS_DAYS
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки переносимых строк
+RETENTION_BATCH_SIZE = 500
+
+# Блокировка, чтобы задачу выполнял один экземпляр бота
+RETENTION_LOCK_SECONDS = 60 * 60
+
+
+def _move_rows(db: Session, model, archive_model, ids: List[int]) -> int:
+    """Перенос строк с указанными id в архивную таблицу (без commit)"""
+    if not ids:
+        return 0
+    
+    source = model.__table__
+    archive = archive_model.__table__
+    columns = [column.name for column in archive.columns if column.name != "archived_at"]
+    
+    db.execute(
+        archive.insert().from_select(
+            columns,
+            select(*[source.c[name] for name in columns]).where(source.c.id.in_(ids))
+        )
+    )
+    result = db.execute(source.delete().where(source.c.id.in_(ids)))
+    return result.rowcount
+
+
+def archive_appointments(db: Session, cutoff: datetime) -> Dict[str, int]:
+    """
+    Перенос завершенных и отмененных записей, закончившихся до cutoff
+    
+    Returns:
+        Количество перенесенных записей, чеков и уведомлений
+    """
+    moved = {"appointments": 0, "invoices": 0, "notifications": 0}
+    
+    while True:
+        ids = [row_id for (row_id,) in db.query(Appointment.id).filter(
+            Appointment.status.in_([AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED]),
+            Appointment.end_time < cutoff,
+            # Неоплаченный чек еще может быть оплачен - такие записи остаются
+            ~exists().where(
+                Invoice.appointment_id == Appointment.id,
+                Invoice.payment_status.in_([PaymentStatus.PENDING, PaymentStatus.WAITING])
+            ),
+            ~exists().where(Feedback.appointment_id == Appointment.id)
+        ).order_by(Appointment.id).limit(RETENTION_BATCH_SIZE)]
+        
+        if not ids:
+            break
+        
+        try:
+            notification_ids = [row_id for (row_id,) in db.query(Notification.id).filter(
+                Notification.appointment_id.in_(ids)
+            )]
+            invoice_ids = [row_id for (row_id,) in db.query(Invoice.id).filter(
+                Invoice.appointment_id.in_(ids)
+            )]
+            
+            moved["notifications"] += _move_rows(db, Notification, NotificationArchive, notification_ids)
+            moved["invoices"] += _move_rows(db, Invoice, InvoiceArchive, invoice_ids)
+            moved["appointments"] += _move_rows(db, Appointment, AppointmentArchive, ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        if len(ids) < RETENTION_BATCH_SIZE:
+            break
+    
+    return moved
+
+
+def archive_sent_notifications(db: Session, cutoff: datetime) -> int:
+    """Перенос отправленных уведомлений, запланированных до cutoff"""
+    moved = 0
+    
+    while True:
+        ids = [row_id for (row_id,) in db.query(Notification.id).filter(
+            Notification.is_sent == True,
+            Notification.scheduled_for < cutoff
+        ).order_by(Notification.id).limit(RETENTION_BATCH_SIZE)]
+        
+        if not ids:
+            break
+        
+        try:
+            moved += _move_rows(db, Notification, NotificationArchive, ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        if len(ids) < RETENTION_BATCH_SIZE:
+            break
+    
+    return moved
+
+
+def compact_database(db: Session, vacuum: bool = True):
+    """
+    VACUUM и ANALYZE после переноса
+    
+    Выполняются вне транзакции: на SQLite для всей БД, на PostgreSQL - для
+    рабочих и архивных таблиц.
+    
+    Args:
+        db: Сессия БД
+        vacuum: Выполнять VACUUM (иначе только ANALYZE)
+    """
+    bind = db.get_bind()
+    tables = [
+        model.__tablename__
+        for model in (Appointment, Invoice, Notification, AppointmentArchive, InvoiceArchive, NotificationArchive)
+    ]
+    
+    with bind.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        if bind.dialect.name == "postgresql":
+            command = "VACUUM ANALYZE" if vacuum else "ANALYZE"
+            for table in tables:
+                connection.execute(text(f"{command} {table}"))
+        else:
+            if vacuum:
+                connection.execute(text("VACUUM"))
+            connection.execute(text("ANALYZE"))
+
+
+def run_retention(
+    db: Session,
+    appointments_months: int = RETENTION_APPOINTMENTS_MONTHS,
+    notifications_days: int = RETENTION_NOTIFICATIONS_DAYS,
+    now: datetime = None,
+    vacuum: bool = True
+) -> Dict[str, float]:
+    """
+    Один проход хранения данных
+    
+    Args:
+        db: Сессия БД
+        appointments_months: Возраст записей для архива в месяцах (0 - не переносить)
+        notifications_days: Возраст отправленных уведомлений для архива в днях (0 - не переносить)
+        now: Текущее время (по умолчанию - utcnow)
+        vacuum: Выполнять VACUUM после переноса (см. compact_database)
+    
+    Returns:
+        Количество перенесенных строк по таблицам и время выполнения в секундах
+    """
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    
+    report = {"appointments": 0, "invoices": 0, "notifications": 0}
+    
+    if appointments_months > 0:
+        # Месяц считается за 30 дней
+        moved = archive_appointments(db, now - timedelta(days=30 * appointments_months))
+        for key, value in moved.items():
+            report[key] += value
+    
+    if notifications_days > 0:
+        report["notifications"] += archive_sent_notifications(db, now - timedelta(days=notifications_days))
+    
+    if any(report.values()):
+        compact_database(db, vacuum=vacuum)
+    
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    
+    logger.info(
+        f"Хранение данных: в архив перенесено записей {report['appointments']}, "
+        f"чеков {report['invoices']}, уведомлений {report['notifications']} "
+        f"за {report['seconds']} с"
+    )
+    
+    return report
+
+
+def _run_retention_in_worker() -> Dict[str, float]:
+    """Проход хранения данных в сессии рабочего потока"""
+    from bot.database import get_worker_session
+    
+    db = get_worker_session()
+    try:
+        return run_retention(db, vacuum=db.get_bind().dialect.name != "sqlite")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def process_retention(db_func):
+    """Задача планировщика: хранение данных (выполняет один экземпляр бота)"""
+    import asyncio
+    from bot.database import worker_sessions_available
+    from bot.utils.leases import try_acquire_leadership
+    
+    if callable(db_func):
+        db = db_func()
+    else:
+        db = db_func
+    
+    try:
+        if not try_acquire_leadership(db, "retention", ttl_seconds=RETENTION_LOCK_SECONDS):
+            return
+        if worker_sessions_available():
+            # Перенос блокирующий - выполняется вне цикла событий, со своим соединением к БД
+            await asyncio.to_thread(_run_retention_in_worker)
+        else:
+            # SQLite в памяти доступна только через общее соединение
+            run_retention(db, vacuum=False)
+    except Exception as e:
+        logger.error(f"Ошибка хранения данных: {e}", exc_info=True)
+        db.rollback()
+    finally:
+        db.close()
@@ -1,16 +1,22 @@
 """
 Утилиты для работы с расписанием мастера
 """
-from datetime import datetime, time, timedelta
+from datetime import datetime, date, time, timedelta
 from sqlalchemy.orm import Session
-from bot.models import ScheduleSlot, Appointment, AppointmentStatus
-from typing import List
+from bot.models import ScheduleSlot
+from typing import Dict, Iterable, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
 DAYS_OF_WEEK = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
 
+# Максимальная длина диапазона для массового редактирования расписания
+MAX_BULK_SCHEDULE_DAYS = 366
+
+# Размер пачки для IN (...) при удалении (ограничение числа параметров SQLite)
+BULK_DELETE_CHUNK_SIZE = 500
+
 
 def is_time_in_schedule(
     db: Session,
@@ -80,12 +86,203 @@ def is_time_in_schedule(
     return False
 
 
+def get_work_windows(
+    db: Session,
+    master_id: int,
+    check_date: date
+) -> List[Tuple[time, time]]:
+    """
+    Получение рабочих интервалов мастера на дату
+    
+    Индивидуальное расписание даты имеет приоритет над общим расписанием
+    по дням недели. Если расписание не настроено, используется 8:00-22:00.
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        check_date: Дата
+    
+    Returns:
+        Список пар (начало, окончание); пустой список для выходного дня
+    """
+    # Получаем индивидуальное расписание для конкретной даты
+    specific_slots = db.query(ScheduleSlot).filter(
+        ScheduleSlot.master_id == master_id,
+        ScheduleSlot.specific_date == check_date
+    ).all()
+    
+    recurring_slots = []
+    if not specific_slots:
+        # Если нет индивидуального расписания, используем общее расписание по дням недели
+        recurring_slots = db.query(ScheduleSlot).filter(
+            ScheduleSlot.master_id == master_id,
+            ScheduleSlot.is_recurring == True,
+            ScheduleSlot.day_of_week == check_date.weekday()
+        ).all()
+    
+    return _resolve_work_windows(specific_slots, recurring_slots)
+
+
+def _resolve_work_windows(
+    specific_slots: List[ScheduleSlot],
+    recurring_slots: List[ScheduleSlot]
+) -> List[Tuple[time, time]]:
+    """Рабочие интервалы дня по его индивидуальным и еженедельным слотам"""
+    # Если есть выходной день для этой даты - рабочих интервалов нет
+    for slot in specific_slots:
+        if slot.is_day_off:
+            return []
+    
+    # Индивидуальное расписание имеет приоритет над общим
+    schedule_slots = specific_slots or recurring_slots
+    
+    # Если нет расписания, используем значения по умолчанию
+    if not schedule_slots:
+        return [(time(8, 0), time(22, 0))]
+    
+    return sorted(
+        (slot.start_time.time(), slot.end_time.time())
+        for slot in schedule_slots
+    )
+
+
+def get_work_windows_for_range(
+    db: Session,
+    master_id: int,
+    start_date: date,
+    end_date: date
+) -> Dict[date, List[Tuple[time, time]]]:
+    """
+    Рабочие интервалы мастера на каждую дату диапазона
+    
+    Расписание загружается двумя запросами (индивидуальные слоты диапазона и
+    общее расписание) вместо запросов на каждую дату.
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        start_date: Первая дата (включительно)
+        end_date: Последняя дата (включительно)
+    
+    Returns:
+        Словарь дата -> список пар (начало, окончание)
+    """
+    specific_by_date = {}
+    for slot in db.query(ScheduleSlot).filter(
+        ScheduleSlot.master_id == master_id,
+        ScheduleSlot.specific_date >= start_date,
+        ScheduleSlot.specific_date <= end_date
+    ):
+        specific_by_date.setdefault(slot.specific_date, []).append(slot)
+    
+    recurring_by_weekday = {}
+    for slot in db.query(ScheduleSlot).filter(
+        ScheduleSlot.master_id == master_id,
+        ScheduleSlot.is_recurring == True
+    ):
+        recurring_by_weekday.setdefault(slot.day_of_week, []).append(slot)
+    
+    windows = {}
+    current_date = start_date
+    while current_date <= end_date:
+        windows[current_date] = _resolve_work_windows(
+            specific_by_date.get(current_date, []),
+            recurring_by_weekday.get(current_date.weekday(), [])
+        )
+        current_date += timedelta(days=1)
+    
+    return windows
+
+
+def get_available_start_mask(
+    db: Session,
+    master_id: int,
+    selected_date: datetime,
+    service_duration_minutes: int,
+    step_minutes: int = 30,
+    buffer_before_minutes: int = 0,
+    buffer_after_minutes: int = 0,
+    exclude_client_id: int = None
+) -> int:
+    """
+    Получение маски доступных начал записи на дату
+    
+    Бит i маски означает, что услугу можно начать в i-й квант дня
+    (см. bot.utils.availability). Вместо перебора datetime-слотов
+    проверка "помещается ли услуга" выполняется сдвигами над маской дня.
+    
+    Сама услуга должна помещаться в свободное рабочее время, а буферы до и
+    после нее - только не пересекаться с занятым временем (подготовка
+    может начинаться до открытия).
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        selected_date: Выбранная дата
+        service_duration_minutes: Длительность услуги в минутах
+        step_minutes: Шаг времени в минутах
+        buffer_before_minutes: Буфер перед записью в минутах
+        buffer_after_minutes: Буфер после записи в минутах
+        exclude_client_id: ID клиента, чьи удержания времени не считаются
+            занятыми (удержания остальных клиентов - см. bot.utils.holds)
+    
+    Returns:
+        Маска квантов, с которых можно начать запись
+    """
+    from bot.utils.availability import (
+        QUANTUM_MINUTES, QUANTA_PER_DAY, FULL_DAY_MASK,
+        get_day_masks, fit_mask, grid_mask, after_moment_mask, interval_to_mask
+    )
+    
+    check_date = selected_date.date() if isinstance(selected_date, datetime) else selected_date
+    
+    # Рабочие и занятые кванты дня (одна строка при материализации)
+    work_mask, busy_mask = get_day_masks(db, master_id, check_date)
+    
+    if not work_mask:
+        return 0
+    
+    # Время, удерживаемое другими клиентами (выбор времени, лист ожидания)
+    from bot.utils.holds import held_intervals
+    day_start = datetime.combine(check_date, time(0, 0))
+    for held_start, held_end in held_intervals(
+        db, master_id, day_start, day_start + timedelta(days=1), exclude_client_id
+    ):
+        busy_mask |= interval_to_mask(check_date, held_start, held_end)
+    
+    # Старты, с которых услуга целиком помещается в свободное рабочее время
+    duration_quanta = -(-service_duration_minutes // QUANTUM_MINUTES)
+    start_mask = fit_mask(work_mask & ~busy_mask, duration_quanta)
+    
+    before_quanta = -(-buffer_before_minutes // QUANTUM_MINUTES)
+    after_quanta = -(-buffer_after_minutes // QUANTUM_MINUTES)
+    if before_quanta or after_quanta:
+        # Свободные кванты сдвигаются на before_quanta, края дня считаются
+        # свободными; тогда бит i показывает, что свободен весь отрезок
+        # [i - before_quanta, i + duration_quanta + after_quanta)
+        padded_mask = ((FULL_DAY_MASK & ~busy_mask) << before_quanta) | ((1 << before_quanta) - 1)
+        padded_mask |= ((1 << after_quanta) - 1) << (QUANTA_PER_DAY + before_quanta)
+        start_mask &= fit_mask(padded_mask, before_quanta + duration_quanta + after_quanta)
+    
+    # Сетка шагов отсчитывается от начала каждого рабочего интервала; интервалы
+    # берутся из маски дня, без повторного чтения расписания
+    step_quanta = max(step_minutes // QUANTUM_MINUTES, 1)
+    start_mask &= grid_mask(work_mask, step_quanta)
+    
+    # Только время в будущем (по часам мастера)
+    from bot.utils.timezones import master_now
+    return start_mask & after_moment_mask(check_date, master_now(db, master_id))
+
+
 def get_available_time_slots(
     db: Session,
     master_id: int,
     selected_date: datetime,
     service_duration_minutes: int,
-    step_minutes: int = 30
+    step_minutes: int = 30,
+    buffer_before_minutes: int = 0,
+    buffer_after_minutes: int = 0,
+    exclude_client_id: int = None
 ) -> List[datetime]:
     """
     Получение списка доступных временных слотов для записи
@@ -96,81 +293,150 @@ def get_available_time_slots(
         selected_date: Выбранная дата
         service_duration_minutes: Длительность услуги в минутах
         step_minutes: Шаг времени в минутах
+        buffer_before_minutes: Буфер перед записью в минутах
+        buffer_after_minutes: Буфер после записи в минутах
+        exclude_client_id: ID клиента, чьи удержания времени не учитываются
     
     Returns:
         Список доступных временных слотов
     """
-    check_date = selected_date.date()
-    day_of_week = selected_date.weekday()
+    from bot.utils.availability import QUANTUM_MINUTES, iter_quanta
     
-    # Получаем индивидуальное расписание для конкретной даты
-    specific_slots = db.query(ScheduleSlot).filter(
-        ScheduleSlot.master_id == master_id,
-        ScheduleSlot.specific_date == check_date
-    ).all()
+    start_mask = get_available_start_mask(
+        db, master_id, selected_date, service_duration_minutes, step_minutes,
+        buffer_before_minutes, buffer_after_minutes, exclude_client_id
+    )
     
-    # Если есть выходной день для этой даты - нет доступных слотов
-    for slot in specific_slots:
-        if slot.is_day_off:
-            return []
+    day_start = datetime.combine(
+        selected_date.date() if isinstance(selected_date, datetime) else selected_date,
+        time(0, 0)
+    )
     
-    # Если есть индивидуальное расписание для этой даты
-    if specific_slots:
-        schedule_slots = [s for s in specific_slots if not s.is_day_off]
-    else:
-        # Если нет индивидуального расписания, используем общее расписание по дням недели
-        schedule_slots = db.query(ScheduleSlot).filter(
-            ScheduleSlot.master_id == master_id,
-            ScheduleSlot.is_recurring == True,
-            ScheduleSlot.day_of_week == day_of_week
-        ).all()
+    return [
+        day_start + timedelta(minutes=quantum * QUANTUM_MINUTES)
+        for quantum in iter_quanta(start_mask)
+    ]
+
+
+def apply_schedule_template(
+    db: Session,
+    master_id: int,
+    start_date: date,
+    end_date: date,
+    weekdays: Optional[Iterable[int]] = None,
+    work_start: Optional[time] = None,
+    work_end: Optional[time] = None,
+    is_day_off: bool = False
+) -> Tuple[int, int]:
+    """
+    Массовое применение шаблона расписания к диапазону дат
+    
+    Для каждой даты диапазона (с учетом фильтра по дням недели) индивидуальное
+    расписание заменяется на рабочие часы шаблона или на выходной. Существующие
+    слоты загружаются одним запросом, даты, которые уже совпадают с шаблоном,
+    не трогаются, а удаления и вставки выполняются пачкой в одной транзакции.
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        start_date: Первая дата диапазона (включительно)
+        end_date: Последняя дата диапазона (включительно)
+        weekdays: Дни недели (0=Понедельник), к которым применяется шаблон (None - все дни)
+        work_start: Время начала работы (не нужно для выходного)
+        work_end: Время окончания работы (не нужно для выходного)
+        is_day_off: Отметить даты как выходные
+    
+    Returns:
+        (количество добавленных слотов, количество удаленных слотов)
+    """
+    if end_date < start_date:
+        raise ValueError("Дата окончания раньше даты начала")
+    if (end_date - start_date).days >= MAX_BULK_SCHEDULE_DAYS:
+        raise ValueError(f"Диапазон не может превышать {MAX_BULK_SCHEDULE_DAYS} дней")
+    if not is_day_off:
+        if work_start is None or work_end is None or work_end <= work_start:
+            raise ValueError("Время окончания должно быть позже времени начала")
+    
+    if is_day_off:
+        work_start = time(0, 0)
+        work_end = time(23, 59)
+    
+    selected_weekdays = set(range(7)) if weekdays is None else set(weekdays)
     
-    # Получаем занятые записи на эту дату
-    start_of_day = datetime.combine(check_date, time(0, 0))
-    end_of_day = datetime.combine(check_date, time(23, 59, 59))
+    target_dates = []
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date.weekday() in selected_weekdays:
+            target_dates.append(current_date)
+        current_date += timedelta(days=1)
     
-    booked_appointments = db.query(Appointment).filter(
-        Appointment.master_id == master_id,
-        Appointment.status != AppointmentStatus.CANCELLED,
-        Appointment.start_time >= start_of_day,
-        Appointment.start_time < end_of_day
+    if not target_dates:
+        return 0, 0
+    
+    # Все индивидуальные слоты диапазона - одним запросом
+    existing_slots = db.query(ScheduleSlot).filter(
+        ScheduleSlot.master_id == master_id,
+        ScheduleSlot.specific_date >= target_dates[0],
+        ScheduleSlot.specific_date <= target_dates[-1]
     ).all()
     
-    # Если нет расписания, используем значения по умолчанию
-    if not schedule_slots:
-        work_start = time(8, 0)
-        work_end = time(22, 0)
-    else:
-        # Берем первый слот (можно расширить для нескольких слотов в день)
-        slot = schedule_slots[0]
-        work_start = slot.start_time.time()
-        work_end = slot.end_time.time()
-    
-    # Генерируем доступные слоты
-    available_slots = []
-    current_time = datetime.combine(check_date, work_start)
-    end_time = datetime.combine(check_date, work_end)
-    
-    while current_time < end_time:
-        slot_end = current_time + timedelta(minutes=service_duration_minutes)
+    slots_by_date = {}
+    for slot in existing_slots:
+        slots_by_date.setdefault(slot.specific_date, []).append(slot)
+    
+    delete_ids = []
+    new_slots = []
+    
+    for target_date in target_dates:
+        start_dt = datetime.combine(target_date, work_start)
+        end_dt = datetime.combine(target_date, work_end)
+        current_slots = slots_by_date.get(target_date, [])
         
-        # Проверяем, что слот не выходит за рабочие часы
-        if slot_end > end_time:
-            break
+        # Дата уже соответствует шаблону - ничего не меняем
+        if len(current_slots) == 1:
+            slot = current_slots[0]
+            if (
+                bool(slot.is_day_off) == is_day_off
+                and slot.start_time == start_dt
+                and slot.end_time == end_dt
+            ):
+                continue
+        
+        delete_ids.extend(slot.id for slot in current_slots)
+        new_slots.append(ScheduleSlot(
+            master_id=master_id,
+            start_time=start_dt,
+            end_time=end_dt,
+            is_recurring=False,
+            specific_date=target_date,
+            is_day_off=is_day_off
+        ))
+    
+    try:
+        for i in range(0, len(delete_ids), BULK_DELETE_CHUNK_SIZE):
+            chunk = delete_ids[i:i + BULK_DELETE_CHUNK_SIZE]
+            db.query(ScheduleSlot).filter(
+                ScheduleSlot.id.in_(chunk)
+            ).delete(synchronize_session=False)
         
-        # Проверяем, что слот не пересекается с существующими записями
-        is_available = True
-        for appointment in booked_appointments:
-            if (current_time < appointment.end_time and slot_end > appointment.start_time):
-                is_available = False
-                break
+        if new_slots:
+            db.add_all(new_slots)
         
-        if is_available:
-            # Проверяем, что время в будущем
-            if current_time > datetime.utcnow():
-                available_slots.append(current_time)
+        # Один сброс материализованной доступности на весь диапазон
+        from bot.utils.availability import invalidate_availability
+        invalidate_availability(db, master_id, start_day=target_dates[0], end_day=target_dates[-1])
         
-        current_time += timedelta(minutes=step_minutes)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     
-    return available_slots
-
+    # Удаленные через bulk delete объекты могли остаться в identity map
+    db.expire_all()
+    
+    logger.info(
+        f"Массовое редактирование расписания мастера {master_id}: "
+        f"{start_date}..{end_date}, добавлено {len(new_slots)}, удалено {len(delete_ids)}"
+    )
+    
+    return len(new_slots), len(delete_ids)
@@ -1,7 +1,7 @@
 """
 Утилиты для календаря расписания мастера
 """
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 from calendar import monthrange
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from sqlalchemy.orm import Session
@@ -75,7 +75,8 @@ def get_schedule_month_keyboard(
     first_weekday = (first_day + 1) % 7
     
     current_row = []
-    today = datetime.now().date()
+    from bot.utils.timezones import master_now
+    today = master_now(db, master_id).date()
     
     for day in range(1, last_day_num + 1):
         day_date = date(year, month, day)
@@ -0,0 +1,237 @@
+"""
+Поиск мастеров по названию, описанию и услугам
+
+Индекс master_search - одна строка на мастера с доступными услугами:
+название, описание и названия активных неспрятанных услуг. Индекс живет
+вне моделей и поддерживается триггерами на master_profiles и services,
+поэтому обработчикам не нужно помнить о его обновлении.
+
+* SQLite: виртуальная таблица FTS5 (rowid = id мастера), ранжирование bm25;
+* PostgreSQL: таблица с tsvector и GIN-индексом, ранжирование ts_rank.
+
+На других СУБД используется медленный поиск через LIKE.
+"""
+import re
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+from bot.models import MasterProfile, Service
+from typing import List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Мастеров на странице результатов
+SEARCH_PAGE_SIZE = 8
+
+# Максимум слов в запросе и минимальная длина слова
+SEARCH_MAX_TERMS = 8
+SEARCH_MIN_TERM_LENGTH = 2
+
+# Веса полей: название, описание, услуги
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Строка мастера: название, описание и услуги (только если услуги есть)
+_SQLITE_DOCUMENT = """
+    SELECT mp.id,
+           coalesce(mp.business_name, ''),
+           coalesce(mp.description, ''),
+           group_concat(s.name, ' ')
+    FROM master_profiles mp
+    JOIN services s ON s.master_id = mp.id AND s.is_active = 1 AND s.is_hidden = 0
+    WHERE {condition}
+    GROUP BY mp.id
+"""
+
+_SQLITE_REFRESH = """
+    DELETE FROM master_search WHERE rowid = {master_id};
+    INSERT INTO master_search (rowid, business_name, description, services)
+    """ + _SQLITE_DOCUMENT.format(condition="mp.id = {master_id}") + ";"
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS master_search USING fts5("
+    "business_name, description, services, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"""CREATE TRIGGER IF NOT EXISTS master_search_master_insert AFTER INSERT ON master_profiles BEGIN
+        {_SQLITE_REFRESH.format(master_id="NEW.id")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS master_search_master_update AFTER UPDATE ON master_profiles BEGIN
+        {_SQLITE_REFRESH.format(master_id="NEW.id")}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS master_search_master_delete AFTER DELETE ON master_profiles BEGIN
+        DELETE FROM master_search WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS master_search_service_insert AFTER INSERT ON services BEGIN
+        {_SQLITE_REFRESH.format(master_id="NEW.master_id")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS master_search_service_update AFTER UPDATE ON services BEGIN
+        {_SQLITE_REFRESH.format(master_id="OLD.master_id")}
+        {_SQLITE_REFRESH.format(master_id="NEW.master_id")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS master_search_service_delete AFTER DELETE ON services BEGIN
+        {_SQLITE_REFRESH.format(master_id="OLD.master_id")}
+    END""",
+]
+
+_POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS master_search (
+        master_id INTEGER PRIMARY KEY,
+        document TSVECTOR NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_master_search_document ON master_search USING GIN (document)",
+    """CREATE OR REPLACE FUNCTION master_search_refresh(target_id INTEGER) RETURNS VOID AS $$
+    BEGIN
+        DELETE FROM master_search WHERE master_id = target_id;
+        INSERT INTO master_search (master_id, document)
+        SELECT mp.id,
+               setweight(to_tsvector('simple', coalesce(mp.business_name, '')), 'A')
+               || setweight(to_tsvector('simple', string_agg(s.name, ' ')), 'B')
+               || setweight(to_tsvector('simple', coalesce(mp.description, '')), 'C')
+        FROM master_profiles mp
+        JOIN services s ON s.master_id = mp.id AND s.is_active AND NOT s.is_hidden
+        WHERE mp.id = target_id
+        GROUP BY mp.id;
+    END;
+    $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION master_search_master_trigger() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM master_search WHERE master_id = OLD.id;
+            RETURN OLD;
+        END IF;
+        PERFORM master_search_refresh(NEW.id);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION master_search_service_trigger() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM master_search_refresh(OLD.master_id);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM master_search_refresh(NEW.master_id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS master_search_master ON master_profiles",
+    """CREATE TRIGGER master_search_master AFTER INSERT OR UPDATE OR DELETE ON master_profiles
+        FOR EACH ROW EXECUTE FUNCTION master_search_master_trigger()""",
+    "DROP TRIGGER IF EXISTS master_search_service ON services",
+    """CREATE TRIGGER master_search_service AFTER INSERT OR UPDATE OR DELETE ON services
+        FOR EACH ROW EXECUTE FUNCTION master_search_service_trigger()""",
+]
+
+
+def create_search_index(db: Session) -> bool:
+    """
+    Создание индекса поиска и триггеров (без commit)
+    
+    Returns:
+        True если индекс поддерживается СУБД
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        statements = _SQLITE_DDL
+    elif dialect == "postgresql":
+        statements = _POSTGRES_DDL
+    else:
+        logger.warning(f"Индекс поиска мастеров не поддерживается для {dialect}, будет использован LIKE")
+        return False
+    
+    for statement in statements:
+        db.execute(text(statement))
+    return True
+
+
+def rebuild_search_index(db: Session):
+    """Полное перестроение индекса поиска (без commit)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        db.execute(text("DELETE FROM master_search"))
+        db.execute(text(
+            "INSERT INTO master_search (rowid, business_name, description, services) "
+            + _SQLITE_DOCUMENT.format(condition="1 = 1")
+        ))
+        # Слияние сегментов FTS5 в один ускоряет запросы
+        db.execute(text("INSERT INTO master_search (master_search) VALUES ('optimize')"))
+    elif dialect == "postgresql":
+        db.execute(text("SELECT master_search_refresh(id) FROM master_profiles"))
+
+
+def search_terms(query: str) -> List[str]:
+    """Слова запроса в нижнем регистре (без служебных символов FTS)"""
+    terms = [term for term in re.findall(r"\w+", query.lower()) if len(term) >= SEARCH_MIN_TERM_LENGTH]
+    return terms[:SEARCH_MAX_TERMS]
+
+
+def search_masters(
+    db: Session,
+    query: str,
+    page: int = 0,
+    page_size: int = SEARCH_PAGE_SIZE
+) -> Tuple[List[MasterProfile], bool]:
+    """
+    Поиск мастеров по словам запроса
+    
+    Все слова должны встретиться (как начало слова) в названии, описании
+    или услугах мастера. Результаты упорядочены по релевантности.
+    
+    Args:
+        db: Сессия БД
+        query: Текст запроса
+        page: Номер страницы (с 0)
+        page_size: Мастеров на странице
+    
+    Returns:
+        (мастера страницы, есть ли следующая страница)
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    
+    dialect = db.get_bind().dialect.name
+    # Берем на одну строку больше, чтобы узнать о следующей странице
+    params = {"limit": page_size + 1, "offset": page * page_size}
+    
+    if dialect == "sqlite":
+        params["match"] = " ".join(f'"{term}"*' for term in terms)
+        rows = db.execute(text(
+            "SELECT rowid FROM master_search WHERE master_search MATCH :match "
+            "ORDER BY bm25(master_search, {}, {}, {}) LIMIT :limit OFFSET :offset".format(*SEARCH_WEIGHTS)
+        ), params)
+        ids = [row_id for (row_id,) in rows]
+    elif dialect == "postgresql":
+        params["match"] = " & ".join(f"{term}:*" for term in terms)
+        rows = db.execute(text(
+            "SELECT master_id FROM master_search, to_tsquery('simple', :match) AS q "
+            "WHERE document @@ q ORDER BY ts_rank(document, q) DESC, master_id "
+            "LIMIT :limit OFFSET :offset"
+        ), params)
+        ids = [row_id for (row_id,) in rows]
+    else:
+        ids = _search_like(db, terms, params["limit"], params["offset"])
+    
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+    
+    masters = {master.id: master for master in db.query(MasterProfile).filter(MasterProfile.id.in_(ids))}
+    return [masters[master_id] for master_id in ids if master_id in masters], has_next
+
+
+def _search_like(db: Session, terms: List[str], limit: int, offset: int) -> List[int]:
+    """Поиск через LIKE для СУБД без полнотекстового индекса"""
+    query = db.query(MasterProfile.id).join(
+        Service, Service.master_id == MasterProfile.id
+    ).filter(
+        Service.is_active == True,
+        Service.is_hidden == False
+    )
+    
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(or_(
+            MasterProfile.business_name.ilike(pattern),
+            MasterProfile.description.ilike(pattern),
+            Service.name.ilike(pattern)
+        ))
+    
+    return [row_id for (row_id,) in query.distinct().order_by(MasterProfile.id).limit(limit).offset(offset)]
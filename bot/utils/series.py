@@ -0,0 +1,164 @@
+"""
+Регулярные записи: серия с одинаковым временем раз в N недель
+
+Серия создается одним подтверждением. Конфликты всех повторов проверяются
+разом: занятые интервалы мастера (с буферами и удержаниями) выбираются
+одним запросом на весь диапазон серии, рабочие интервалы - через
+get_work_windows_for_range, после чего каждый повтор проверяется бинарным
+поиском по отсортированным интервалам. Записи, напоминания и уведомления
+серии создаются в одной транзакции.
+"""
+import uuid
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from bot.models import Appointment, AppointmentStatus, Service
+from typing import List, NamedTuple, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Варианты повтора: (раз в сколько недель, сколько записей всего)
+SERIES_OPTIONS = [(1, 4), (1, 8), (2, 4), (2, 6), (4, 3), (4, 6)]
+
+# Максимум записей в серии
+SERIES_MAX_OCCURRENCES = 12
+
+
+class Occurrence(NamedTuple):
+    """Повтор серии и результат проверки"""
+    start_time: datetime
+    end_time: datetime
+    is_free: bool
+
+
+def series_times(
+    start_time: datetime,
+    end_time: datetime,
+    interval_weeks: int,
+    count: int
+) -> List[Tuple[datetime, datetime]]:
+    """Интервалы всех записей серии, начиная с первой"""
+    count = max(1, min(count, SERIES_MAX_OCCURRENCES))
+    step = timedelta(weeks=max(interval_weeks, 1))
+    return [(start_time + step * index, end_time + step * index) for index in range(count)]
+
+
+def check_series(
+    db: Session,
+    master_id: int,
+    service_id: int,
+    times: List[Tuple[datetime, datetime]],
+    exclude_client_id: Optional[int] = None
+) -> List[Occurrence]:
+    """
+    Проверка всех повторов серии
+    
+    Повтор свободен, если он целиком лежит в рабочем интервале своего дня,
+    начинается в будущем и не пересекается (с учетом буферов) с записями
+    и удержаниями других клиентов.
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        service_id: ID услуги (шаг и буферы)
+        times: Интервалы повторов по возрастанию (см. series_times)
+        exclude_client_id: ID клиента, чьи удержания времени не учитываются
+    
+    Returns:
+        Повторы с признаком is_free в том же порядке
+    """
+    from bot.utils.availability import busy_intervals, get_slot_rules
+    from bot.utils.holds import held_intervals
+    from bot.utils.schedule import get_work_windows_for_range
+    from bot.utils.timezones import master_now
+    
+    if not times:
+        return []
+    
+    rules = get_slot_rules(db, master_id, service_id)
+    before = timedelta(minutes=rules.buffer_before_minutes)
+    after = timedelta(minutes=rules.buffer_after_minutes)
+    range_start = times[0][0] - before
+    range_end = times[-1][1] + after
+    
+    # Один запрос записей на весь диапазон серии вместо проверки каждого повтора
+    busy = sorted(
+        busy_intervals(db, master_id, range_start, range_end)
+        + held_intervals(db, master_id, range_start, range_end, exclude_client_id)
+    )
+    starts = [start for start, _ in busy]
+    # max_ends[i] - самый поздний конец среди первых i + 1 интервалов
+    max_ends = []
+    for _, end in busy:
+        max_ends.append(max(end, max_ends[-1]) if max_ends else end)
+    
+    windows = get_work_windows_for_range(db, master_id, times[0][0].date(), times[-1][0].date())
+    now = master_now(db, master_id)
+    
+    occurrences = []
+    for start_time, end_time in times:
+        is_free = start_time > now and end_time.date() == start_time.date() and any(
+            window_start <= start_time.time() and end_time.time() <= window_end
+            for window_start, window_end in windows.get(start_time.date(), [])
+        )
+        if is_free:
+            # Интервалы, начавшиеся до конца повтора, пересекают его, если хоть один кончается позже начала
+            count = bisect_left(starts, end_time + after)
+            is_free = not count or max_ends[count - 1] <= start_time - before
+        occurrences.append(Occurrence(start_time, end_time, is_free))
+    
+    return occurrences
+
+
+def create_series(
+    db: Session,
+    master_id: int,
+    client_id: int,
+    service: Service,
+    occurrences: List[Occurrence],
+    client_name: Optional[str] = None,
+    client_phone: Optional[str] = None,
+    reminder_hours: int = 24
+) -> List[Appointment]:
+    """
+    Создание записей серии на свободные повторы (без commit)
+    
+    Записи вставляются одной пачкой, доступность и напоминания обновляются
+    для всех записей сразу. Уведомления ставит вызывающий код.
+    
+    Returns:
+        Созданные записи по возрастанию времени
+    """
+    from bot.utils.availability import mark_appointments_busy
+    from bot.utils.notifications import add_reminders
+    
+    series_id = uuid.uuid4().hex
+    appointments = [
+        Appointment(
+            master_id=master_id,
+            client_id=client_id,
+            service_id=service.id,
+            start_time=occurrence.start_time,
+            end_time=occurrence.end_time,
+            status=AppointmentStatus.CONFIRMED,
+            client_name=client_name,
+            client_phone=client_phone,
+            series_id=series_id
+        )
+        for occurrence in occurrences
+        if occurrence.is_free
+    ]
+    if not appointments:
+        return []
+    
+    db.add_all(appointments)
+    mark_appointments_busy(db, appointments)
+    db.flush()
+    add_reminders(db, appointments, reminder_hours)
+    
+    logger.info(
+        f"Создана серия {series_id} из {len(appointments)} записей "
+        f"для клиента {client_id} к мастеру {master_id}"
+    )
+    return appointments
@@ -0,0 +1,204 @@
+"""
+Статистика мастера: выручка, загрузка, отмены и популярные услуги
+
+Все показатели считаются агрегирующими запросами (SUM/COUNT + GROUP BY)
+в БД. Результат кэшируется на мастера и календарный день; кэш сбрасывается
+при завершении записи и успешной оплате.
+
+Кэш живет в памяти процесса. В многопроцессном режиме (bot.sharding)
+изменение сбрасывает кэш только в воркере, который его обработал
+(оплату - в воркере клиента), поэтому там запись кэша дополнительно
+устаревает через SHARDED_STATS_TTL_SECONDS.
+"""
+from datetime import datetime, date, time, timedelta
+from time import monotonic
+from sqlalchemy import func, case, literal_column
+from sqlalchemy.orm import Session
+from bot.config import SHARD_WORKERS
+from bot.models import Appointment, AppointmentStatus, Invoice, InvoiceArchive, PaymentStatus, Service
+from typing import Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Период для загрузки, отмен и популярных услуг
+STATS_PERIOD_DAYS = 30
+
+# Количество услуг в топе
+TOP_SERVICES_LIMIT = 5
+
+# Срок жизни записи кэша при нескольких воркерах (сброс виден не во всех)
+SHARDED_STATS_TTL_SECONDS = 60
+
+# Кэш: (master_id, день) -> (время расчета по time.monotonic, статистика)
+_stats_cache: Dict[Tuple[int, date], Tuple[float, Dict]] = {}
+
+
+def _minutes_between(db: Session, start, end):
+    """SQL-выражение: длительность интервала [start, end) в минутах"""
+    dialect = db.get_bind().dialect.name
+    
+    if dialect == "sqlite":
+        return func.round((func.julianday(end) - func.julianday(start)) * 1440)
+    if dialect == "postgresql":
+        return func.extract("epoch", end - start) / 60
+    return func.timestampdiff(literal_column("MINUTE"), start, end)
+
+
+def get_master_stats(db: Session, master_id: int, today: Optional[date] = None) -> Dict:
+    """
+    Статистика мастера с кэшированием на день
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        today: Текущая дата (по умолчанию - сегодня по часам мастера)
+    
+    Returns:
+        Словарь показателей (см. compute_master_stats)
+    """
+    if today is None:
+        from bot.utils.timezones import master_now
+        today = master_now(db, master_id).date()
+    key = (master_id, today)
+    
+    cached = _stats_cache.get(key)
+    if cached is not None and SHARD_WORKERS > 1 and monotonic() - cached[0] > SHARDED_STATS_TTL_SECONDS:
+        cached = None
+    
+    if cached is None:
+        # Записи за прошлые дни больше не нужны
+        invalidate_master_stats(master_id)
+        stats = compute_master_stats(db, master_id, today)
+        _stats_cache[key] = (monotonic(), stats)
+    else:
+        stats = cached[1]
+    
+    return stats
+
+
+def invalidate_master_stats(master_id: int):
+    """Сброс кэша статистики мастера"""
+    for key in [key for key in _stats_cache if key[0] == master_id]:
+        del _stats_cache[key]
+
+
+def compute_master_stats(db: Session, master_id: int, today: date) -> Dict:
+    """
+    Расчет статистики мастера
+    
+    Returns:
+        Словарь с ключами:
+        revenue_today, revenue_week, revenue_month, revenue_total - выручка по оплаченным чекам;
+        appointments_total, completed, cancelled, no_show - количество записей за период;
+        cancellation_rate, no_show_rate - доли от всех записей периода;
+        booked_minutes, scheduled_minutes, utilization - загрузка за период;
+        top_services - список (название, количество записей, сумма по прайсу)
+    """
+    from bot.utils.schedule import get_work_windows_for_range
+    from bot.utils.timezones import get_master_timezone, local_now, local_to_utc
+    
+    # Время записей - на часах мастера, время оплаты - в UTC
+    zone = get_master_timezone(db, master_id)
+    now = local_now(zone)
+    
+    day_start = datetime.combine(today, time(0, 0))
+    week_start = day_start - timedelta(days=6)
+    month_start = day_start - timedelta(days=29)
+    period_start = day_start - timedelta(days=STATS_PERIOD_DAYS)
+    
+    # Выручка по периодам - один запрос с условной агрегацией
+    revenue_row = db.query(
+        func.coalesce(func.sum(case((Invoice.paid_at >= local_to_utc(day_start, zone), Invoice.amount), else_=0)), 0),
+        func.coalesce(func.sum(case((Invoice.paid_at >= local_to_utc(week_start, zone), Invoice.amount), else_=0)), 0),
+        func.coalesce(func.sum(case((Invoice.paid_at >= local_to_utc(month_start, zone), Invoice.amount), else_=0)), 0),
+        func.coalesce(func.sum(Invoice.amount), 0)
+    ).filter(
+        Invoice.master_id == master_id,
+        Invoice.payment_status == PaymentStatus.SUCCEEDED
+    ).one()
+    
+    # Чеки, перенесенные в архив (bot.utils.retention), входят только в общую выручку
+    archived_revenue = db.query(
+        func.coalesce(func.sum(InvoiceArchive.amount), 0)
+    ).filter(
+        InvoiceArchive.master_id == master_id,
+        InvoiceArchive.payment_status == PaymentStatus.SUCCEEDED
+    ).scalar()
+    
+    # Записи периода по статусам (прошедшие дни до начала сегодняшнего);
+    # занятое время - по фактическим границам записей, а не по текущей
+    # длительности услуги, которую мастер мог изменить
+    status_rows = db.query(
+        Appointment.status,
+        func.count(Appointment.id),
+        func.coalesce(func.sum(_minutes_between(db, Appointment.start_time, Appointment.end_time)), 0),
+        func.sum(case((Appointment.end_time < now, 1), else_=0))
+    ).filter(
+        Appointment.master_id == master_id,
+        Appointment.start_time >= period_start,
+        Appointment.start_time < day_start
+    ).group_by(Appointment.status).all()
+    
+    counts = {}
+    booked_minutes = 0
+    no_show = 0
+    for status, count, minutes, finished in status_rows:
+        counts[status] = count
+        if status != AppointmentStatus.CANCELLED:
+            booked_minutes += int(minutes or 0)
+        # Подтвержденная, но не завершенная прошедшая запись считается неявкой
+        if status == AppointmentStatus.CONFIRMED:
+            no_show += int(finished or 0)
+    
+    appointments_total = sum(counts.values())
+    cancelled = counts.get(AppointmentStatus.CANCELLED, 0)
+    
+    # Запланированное рабочее время периода
+    windows = get_work_windows_for_range(
+        db, master_id, period_start.date(), (day_start - timedelta(days=1)).date()
+    )
+    scheduled_minutes = sum(
+        (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute)
+        for day_windows in windows.values()
+        for start, end in day_windows
+    )
+    
+    # Популярные услуги за тот же период
+    top_services = db.query(
+        Service.name,
+        func.count(Appointment.id).label("appointments"),
+        func.coalesce(func.sum(Service.price), 0)
+    ).join(
+        Service, Service.id == Appointment.service_id
+    ).filter(
+        Appointment.master_id == master_id,
+        Appointment.status != AppointmentStatus.CANCELLED,
+        Appointment.start_time >= period_start,
+        Appointment.start_time < day_start
+    ).group_by(
+        Service.id, Service.name
+    ).order_by(
+        func.count(Appointment.id).desc()
+    ).limit(TOP_SERVICES_LIMIT).all()
+    
+    stats = {
+        "revenue_today": float(revenue_row[0]),
+        "revenue_week": float(revenue_row[1]),
+        "revenue_month": float(revenue_row[2]),
+        "revenue_total": float(revenue_row[3]) + float(archived_revenue or 0),
+        "appointments_total": appointments_total,
+        "completed": counts.get(AppointmentStatus.COMPLETED, 0),
+        "cancelled": cancelled,
+        "no_show": no_show,
+        "cancellation_rate": cancelled / appointments_total if appointments_total else 0.0,
+        "no_show_rate": no_show / appointments_total if appointments_total else 0.0,
+        "booked_minutes": booked_minutes,
+        "scheduled_minutes": scheduled_minutes,
+        "utilization": booked_minutes / scheduled_minutes if scheduled_minutes else 0.0,
+        "top_services": [(name, count, float(total)) for name, count, total in top_services],
+    }
+    
+    logger.debug(f"Статистика мастера {master_id} пересчитана")
+    
+    return stats
@@ -0,0 +1,168 @@
+"""
+Часовые пояса мастеров
+
+Расписание, записи и маски доступности хранятся во времени мастера (как
+он их видит на часах), а все моменты, которые сравниваются с текущим
+временем или уходят в очереди (напоминания, outbox, аренды), - в UTC.
+Граница между ними проходит через функции этого модуля.
+
+Для каждого пояса один раз строится таблица переходов смещения от UTC на
+горизонт записи (OFFSET_TABLE_DAYS вперед). Перевод времени в цикле по
+слотам - это bisect по таблице, а не вызов pytz.localize на каждый слот.
+Вне горизонта таблицы используется pytz напрямую.
+"""
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+import pytz
+from bot.config import TIMEZONE
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Горизонт таблицы переходов: год записи вперед и запас на прошлое
+OFFSET_TABLE_DAYS = 400
+OFFSET_TABLE_PAST_DAYS = 7
+
+# Шаг поиска переходов; переходы чаще раза в 6 часов не встречаются
+OFFSET_SCAN_HOURS = 6
+
+# Максимальное смещение пояса от UTC (UTC+14 / UTC-12)
+MAX_UTC_OFFSET = timedelta(hours=14)
+
+# Пояса, предлагаемые мастеру в настройках
+COMMON_TIMEZONES = [
+    "Asia/Bishkek",
+    "Asia/Almaty",
+    "Asia/Tashkent",
+    "Europe/Moscow",
+    "Europe/Kaliningrad",
+    "Asia/Yekaterinburg",
+    "Asia/Novosibirsk",
+    "Asia/Vladivostok",
+    "UTC",
+]
+
+
+class OffsetTable(NamedTuple):
+    """Переходы смещения пояса: с utc_starts[i] действует offsets[i]"""
+    utc_starts: List[datetime]
+    local_starts: List[datetime]
+    offsets: List[timedelta]
+    valid_from: datetime
+    valid_until: datetime
+
+
+def is_valid_timezone(name: str) -> bool:
+    """Проверка имени пояса по базе tz"""
+    return name in pytz.all_timezones_set
+
+
+def get_zone(name: Optional[str]):
+    """Пояс pytz по имени; неизвестное имя заменяется на TIMEZONE из конфигурации"""
+    name = name or TIMEZONE
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        logger.warning(f"Неизвестный часовой пояс {name}, используется {TIMEZONE}")
+        return pytz.timezone(TIMEZONE) if is_valid_timezone(TIMEZONE) else pytz.utc
+
+
+def _utc_offset(zone, moment_utc: datetime) -> timedelta:
+    """Смещение пояса от UTC в момент moment_utc"""
+    return pytz.utc.localize(moment_utc).astimezone(zone).utcoffset()
+
+
+def _build_offset_table(name: str, start_day: date) -> OffsetTable:
+    """Построение таблицы переходов пояса на горизонт от start_day"""
+    zone = get_zone(name)
+    valid_from = datetime.combine(start_day, datetime.min.time()) - timedelta(days=OFFSET_TABLE_PAST_DAYS)
+    valid_until = valid_from + timedelta(days=OFFSET_TABLE_PAST_DAYS + OFFSET_TABLE_DAYS)
+    step = timedelta(hours=OFFSET_SCAN_HOURS)
+    
+    utc_starts = [valid_from]
+    offsets = [_utc_offset(zone, valid_from)]
+    
+    moment = valid_from
+    while moment < valid_until:
+        following = moment + step
+        offset = _utc_offset(zone, following)
+        if offset != offsets[-1]:
+            # Уточняем момент перехода до минуты бинарным поиском
+            low, high = moment, following
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if _utc_offset(zone, middle) == offsets[-1]:
+                    low = middle
+                else:
+                    high = middle
+            utc_starts.append(high.replace(second=0, microsecond=0))
+            offsets.append(offset)
+        moment = following
+    
+    return OffsetTable(
+        utc_starts=utc_starts,
+        local_starts=[start + offset for start, offset in zip(utc_starts, offsets)],
+        offsets=offsets,
+        valid_from=valid_from,
+        valid_until=valid_until,
+    )
+
+
+@lru_cache(maxsize=64)
+def _offset_table_cached(name: str, start_day: date) -> OffsetTable:
+    return _build_offset_table(name, start_day)
+
+
+def get_offset_table(name: Optional[str]) -> OffsetTable:
+    """Таблица переходов пояса (перестраивается раз в сутки)"""
+    return _offset_table_cached(name or TIMEZONE, datetime.utcnow().date())
+
+
+def utc_to_local(moment_utc: datetime, name: Optional[str] = None) -> datetime:
+    """Перевод наивного UTC во время пояса (наивное)"""
+    table = get_offset_table(name)
+    if not table.valid_from <= moment_utc < table.valid_until:
+        return moment_utc + _utc_offset(get_zone(name), moment_utc)
+    
+    index = bisect_right(table.utc_starts, moment_utc) - 1
+    return moment_utc + table.offsets[index]
+
+
+def local_to_utc(moment_local: datetime, name: Optional[str] = None) -> datetime:
+    """
+    Перевод наивного времени пояса в UTC
+    
+    Несуществующее время (перевод часов вперед) дает момент после перехода,
+    неоднозначное (перевод назад) - второе из двух.
+    """
+    table = get_offset_table(name)
+    if not table.local_starts[0] <= moment_local < table.valid_until:
+        zone = get_zone(name)
+        return zone.localize(moment_local).astimezone(pytz.utc).replace(tzinfo=None)
+    
+    index = max(bisect_right(table.local_starts, moment_local) - 1, 0)
+    return moment_local - table.offsets[index]
+
+
+def local_now(name: Optional[str] = None) -> datetime:
+    """Текущее время в поясе (наивное)"""
+    return utc_to_local(datetime.utcnow(), name)
+
+
+def master_timezone(master_profile) -> str:
+    """Пояс мастера: из профиля, а если не задан - TIMEZONE из конфигурации"""
+    return getattr(master_profile, "timezone", None) or TIMEZONE
+
+
+def get_master_timezone(db, master_id: int) -> str:
+    """Пояс мастера по ID"""
+    from bot.models import MasterProfile
+    
+    return master_timezone(db.get(MasterProfile, master_id))
+
+
+def master_now(db, master_id: int) -> datetime:
+    """Текущее время на часах мастера"""
+    return local_now(get_master_timezone(db, master_id))
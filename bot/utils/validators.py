@@ -3,7 +3,7 @@
 """
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from bot.models import Appointment, MasterProfile
+from bot.models import MasterProfile
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,34 +14,38 @@ def check_appointment_overlap(
     master_id: int,
     start_time: datetime,
     end_time: datetime,
-    exclude_appointment_id: int = None
+    exclude_appointment_id: int = None,
+    buffer_before_minutes: int = 0,
+    buffer_after_minutes: int = 0,
+    exclude_client_id: int = None
 ) -> bool:
     """
     Проверка пересечения записей
     
+    Сравниваются интервалы вместе с буферами: буфер новой записи не должен
+    задевать существующие записи и их буферы. Время, удерживаемое другими
+    клиентами (выбор времени, лист ожидания), тоже считается занятым.
+    
     Args:
         db: Сессия БД
         master_id: ID мастера
         start_time: Начало новой записи
         end_time: Конец новой записи
         exclude_appointment_id: ID записи для исключения (при редактировании)
+        buffer_before_minutes: Буфер перед новой записью в минутах
+        buffer_after_minutes: Буфер после новой записи в минутах
+        exclude_client_id: ID клиента, чьи удержания времени не учитываются
     
     Returns:
         True если есть пересечение, False если нет
     """
-    query = db.query(Appointment).filter(
-        Appointment.master_id == master_id,
-        Appointment.status != "cancelled",
-        # Проверка пересечения: новая запись начинается раньше, чем заканчивается существующая
-        # И новая запись заканчивается позже, чем начинается существующая
-        Appointment.start_time < end_time,
-        Appointment.end_time > start_time
-    )
-    
-    if exclude_appointment_id:
-        query = query.filter(Appointment.id != exclude_appointment_id)
+    from bot.utils.availability import busy_intervals
+    from bot.utils.holds import held_intervals
     
-    overlapping = query.first()
+    window_start = start_time - timedelta(minutes=buffer_before_minutes)
+    window_end = end_time + timedelta(minutes=buffer_after_minutes)
+    overlapping = busy_intervals(db, master_id, window_start, window_end, exclude_appointment_id)
+    overlapping += held_intervals(db, master_id, window_start, window_end, exclude_client_id)
     
     if overlapping:
         logger.warning(
@@ -49,22 +53,26 @@ def check_appointment_overlap(
             f"с {start_time} по {end_time}"
         )
     
-    return overlapping is not None
+    return bool(overlapping)
 
 
 def validate_time_slot(
     start_time: datetime,
     end_time: datetime,
     min_duration_minutes: int = 15,
-    max_advance_days: int = 365
+    max_advance_days: int = 365,
+    now: datetime = None
 ) -> tuple[bool, str]:
     """
     Валидация временного слота
     
+    Время слота и now должны быть в одном поясе (на часах мастера,
+    см. bot.utils.timezones.master_now); по умолчанию now - utcnow.
+    
     Returns:
         (is_valid, error_message)
     """
-    now = datetime.utcnow()
+    now = now or datetime.utcnow()
     
     # Проверка что время в будущем
     if start_time <= now:
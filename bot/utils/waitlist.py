@@ -0,0 +1,363 @@
+"""
+Лист ожидания: автоматическое предложение освободившегося времени
+
+Клиент, не нашедший свободного времени на дату, встает в очередь к мастеру
+на эту дату. При отмене записи освободившийся интервал предлагается
+первым по очереди клиентам, чья услуга в него помещается: кандидаты
+выбираются по индексу (master_id, date, status, created_at), то есть
+просматривается только очередь одной даты одного мастера, а не весь лист
+ожидания.
+
+Предложенное время держится за клиентом WAITLIST_OFFER_MINUTES: пока
+предложение активно, оно считается занятым для всех остальных клиентов
+(см. held_intervals). Если клиент отказался или не ответил вовремя, время
+предлагается следующему. Сообщения уходят через outbox в той же
+транзакции, что и отмена записи.
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from bot.config import LEADER_ELECTION
+from bot.models import MasterProfile, Service, WaitlistEntry, WaitlistStatus
+from bot.utils.i18n import format_datetime, t, user_language
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from typing import List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько минут предложенное время держится за клиентом
+WAITLIST_OFFER_MINUTES = 15
+
+# Сколько клиентов из очереди проверяется на одно освободившееся время
+WAITLIST_MATCH_LIMIT = 20
+
+# Интервал проверки истекших предложений
+WAITLIST_INTERVAL_MINUTES = 1
+
+# Сколько истекших предложений обрабатывается за один проход
+WAITLIST_EXPIRE_BATCH_SIZE = 200
+
+
+def join_waitlist(db: Session, client_id: int, master_id: int, service_id: int, day: date) -> bool:
+    """
+    Постановка клиента в лист ожидания (без commit)
+    
+    Повторная постановка на ту же дату и услугу не создает дубликат;
+    истекшая или отклоненная подписка снова встает в конец очереди.
+    
+    Returns:
+        True если клиент теперь ждет, False если у него уже активное предложение
+    """
+    from bot.database import insert_or_ignore
+    
+    now = datetime.utcnow()
+    if insert_or_ignore(db, WaitlistEntry, {
+        "client_id": client_id,
+        "master_id": master_id,
+        "service_id": service_id,
+        "date": day,
+        "status": WaitlistStatus.WAITING,
+        "created_at": now,
+    }):
+        return True
+    
+    entry = db.query(WaitlistEntry).filter(
+        WaitlistEntry.client_id == client_id,
+        WaitlistEntry.master_id == master_id,
+        WaitlistEntry.service_id == service_id,
+        WaitlistEntry.date == day
+    ).first()
+    
+    if entry is None or entry.status == WaitlistStatus.OFFERED:
+        return False
+    
+    if entry.status != WaitlistStatus.WAITING:
+        entry.status = WaitlistStatus.WAITING
+        entry.offer_start_time = None
+        entry.offer_expires_at = None
+        entry.created_at = now
+    return True
+
+
+def held_intervals(
+    db: Session,
+    master_id: int,
+    window_start: datetime,
+    window_end: datetime,
+    exclude_client_id: Optional[int] = None
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Интервалы, удерживаемые активными предложениями листа ожидания
+    
+    Интервал предложения - длительность услуги с ее буферами. Предложения
+    клиента exclude_client_id не учитываются: свое время клиенту доступно.
+    """
+    from bot.utils.availability import resolve_slot_rules
+    
+    query = db.query(
+        WaitlistEntry.offer_start_time,
+        Service
+    ).join(
+        Service, Service.id == WaitlistEntry.service_id
+    ).filter(
+        WaitlistEntry.master_id == master_id,
+        WaitlistEntry.date >= (window_start - timedelta(days=1)).date(),
+        WaitlistEntry.date <= window_end.date(),
+        WaitlistEntry.status == WaitlistStatus.OFFERED,
+        WaitlistEntry.offer_expires_at > datetime.utcnow()
+    )
+    
+    if exclude_client_id:
+        query = query.filter(WaitlistEntry.client_id != exclude_client_id)
+    
+    rows = query.all()
+    if not rows:
+        return []
+    
+    master_profile = db.get(MasterProfile, master_id)
+    intervals = []
+    for offer_start, service in rows:
+        rules = resolve_slot_rules(master_profile, service)
+        start_time = offer_start - timedelta(minutes=rules.buffer_before_minutes)
+        end_time = offer_start + timedelta(minutes=service.duration_minutes + rules.buffer_after_minutes)
+        if start_time < window_end and end_time > window_start:
+            intervals.append((start_time, end_time))
+    return intervals
+
+
+def _offer_keyboard(entry_id: int, language: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(t("waitlist_accept_button", language), callback_data=f"waitlist_accept_{entry_id}"),
+        InlineKeyboardButton(t("waitlist_decline_button", language), callback_data=f"waitlist_decline_{entry_id}")
+    ]])
+
+
+def offer_freed_slot(
+    db: Session,
+    master_id: int,
+    day: date,
+    freed_start: datetime,
+    freed_end: datetime
+) -> List[WaitlistEntry]:
+    """
+    Предложение освободившегося времени клиентам из очереди (без commit)
+    
+    Вызывается после отмены записи или снятия предложения в той же
+    транзакции. Клиенты перебираются в порядке очереди; каждому, чья услуга
+    помещается в свободное время рядом с освободившимся интервалом,
+    предлагается самое раннее такое начало. Предложение сразу удерживает
+    время, поэтому следующий клиент получает уже оставшееся.
+    
+    Args:
+        db: Сессия БД
+        master_id: ID мастера
+        day: Дата
+        freed_start: Начало освободившегося интервала (на часах мастера)
+        freed_end: Конец освободившегося интервала
+    
+    Returns:
+        Клиенты, которым отправлено предложение
+    """
+    from bot.utils.availability import QUANTUM_MINUTES, interval_to_mask, quantum_to_time, resolve_slot_rules
+    from bot.utils.outbox import enqueue_message
+    from bot.utils.schedule import get_available_start_mask
+    
+    # Отмена записи и снятие удержания должны быть видны запросам ниже
+    db.flush()
+    
+    candidates = db.query(WaitlistEntry).filter(
+        WaitlistEntry.master_id == master_id,
+        WaitlistEntry.date == day,
+        WaitlistEntry.status == WaitlistStatus.WAITING
+    ).order_by(WaitlistEntry.created_at, WaitlistEntry.id).limit(WAITLIST_MATCH_LIMIT).all()
+    
+    if not candidates:
+        return []
+    
+    master_profile = db.get(MasterProfile, master_id)
+    master_name = master_profile.business_name if master_profile else None
+    expires_at = datetime.utcnow() + timedelta(minutes=WAITLIST_OFFER_MINUTES)
+    offered = []
+    
+    for entry in candidates:
+        service = entry.service
+        if service is None or not service.is_active:
+            continue
+        
+        rules = resolve_slot_rules(master_profile, service)
+        start_mask = get_available_start_mask(
+            db,
+            master_id,
+            day,
+            service.duration_minutes,
+            step_minutes=rules.step_minutes,
+            buffer_before_minutes=rules.buffer_before_minutes,
+            buffer_after_minutes=rules.buffer_after_minutes,
+            exclude_client_id=entry.client_id
+        )
+        
+        # Только начала, при которых услуга задевает освободившийся интервал:
+        # остальное свободное время клиент и так видел при постановке в очередь
+        reach = timedelta(minutes=max(service.duration_minutes - QUANTUM_MINUTES, 0))
+        start_mask &= interval_to_mask(day, freed_start - reach, freed_end)
+        if not start_mask:
+            continue
+        
+        # Самый младший установленный бит - самое раннее начало
+        first_quantum = (start_mask & -start_mask).bit_length() - 1
+        offer_start = datetime.combine(day, quantum_to_time(first_quantum))
+        
+        entry.status = WaitlistStatus.OFFERED
+        entry.offer_start_time = offer_start
+        entry.offer_expires_at = expires_at
+        db.flush()
+        
+        language = user_language(entry.client)
+        enqueue_message(
+            db,
+            entry.client.telegram_id,
+            t(
+                "waitlist_offer",
+                language,
+                master=master_name or t("master_unnamed", language),
+                service=service.name,
+                when=format_datetime(offer_start, language),
+                minutes=WAITLIST_OFFER_MINUTES
+            ),
+            kind="waitlist",
+            dedup_key=f"waitlist:{entry.id}:offer:{offer_start.isoformat()}",
+            reply_markup=_offer_keyboard(entry.id, language)
+        )
+        offered.append(entry)
+        logger.info(f"Клиенту {entry.client_id} предложено время {offer_start} у мастера {master_id}")
+    
+    return offered
+
+
+def get_active_offer(db: Session, entry_id: int, client_id: int) -> Optional[WaitlistEntry]:
+    """Активное (не истекшее) предложение клиенту"""
+    return db.query(WaitlistEntry).filter(
+        WaitlistEntry.id == entry_id,
+        WaitlistEntry.client_id == client_id,
+        WaitlistEntry.status == WaitlistStatus.OFFERED,
+        WaitlistEntry.offer_expires_at > datetime.utcnow()
+    ).first()
+
+
+def _release_offer(db: Session, entry: WaitlistEntry, status: WaitlistStatus):
+    """Снятие предложения и передача времени следующему в очереди (без commit)"""
+    offer_start = entry.offer_start_time
+    entry.status = status
+    entry.offer_start_time = None
+    entry.offer_expires_at = None
+    
+    if offer_start is not None and entry.service is not None:
+        offer_end = offer_start + timedelta(minutes=entry.service.duration_minutes)
+        offer_freed_slot(db, entry.master_id, entry.date, offer_start, offer_end)
+
+
+def decline_offer(db: Session, entry: WaitlistEntry):
+    """Отказ клиента от предложенного времени (без commit)"""
+    _release_offer(db, entry, WaitlistStatus.DECLINED)
+
+
+def mark_booked(db: Session, client_id: int, master_id: int, start_time: datetime, end_time: datetime) -> int:
+    """
+    Закрытие подписок клиента на дату после записи к мастеру (без commit)
+    
+    Если клиенту было предложено другое время, чем то, на которое он
+    записался, предложенное время освобождается и сразу предлагается
+    следующему в очереди.
+    
+    Args:
+        db: Сессия БД
+        client_id: ID клиента
+        master_id: ID мастера
+        start_time: Начало созданной записи (на часах мастера)
+        end_time: Конец созданной записи
+    
+    Returns:
+        Количество закрытых подписок
+    """
+    entries = db.query(WaitlistEntry).filter(
+        WaitlistEntry.client_id == client_id,
+        WaitlistEntry.master_id == master_id,
+        WaitlistEntry.date == start_time.date(),
+        WaitlistEntry.status.in_([WaitlistStatus.WAITING, WaitlistStatus.OFFERED])
+    ).all()
+    
+    for entry in entries:
+        offer_start = entry.offer_start_time
+        if entry.status == WaitlistStatus.OFFERED and offer_start is not None and entry.service is not None:
+            offer_end = offer_start + timedelta(minutes=entry.service.duration_minutes)
+            # Клиент записался не на предложенное время - оно достается следующему
+            if not (offer_start < end_time and offer_end > start_time):
+                _release_offer(db, entry, WaitlistStatus.BOOKED)
+                continue
+        
+        entry.status = WaitlistStatus.BOOKED
+        entry.offer_start_time = None
+        entry.offer_expires_at = None
+    
+    return len(entries)
+
+
+def expire_offers(db: Session) -> int:
+    """
+    Снятие истекших предложений и подписок на прошедшие даты (без commit)
+    
+    Время истекшего предложения сразу предлагается следующему в очереди.
+    
+    Returns:
+        Количество снятых предложений
+    """
+    from bot.utils.timezones import MAX_UTC_OFFSET
+    
+    now = datetime.utcnow()
+    expired = db.query(WaitlistEntry).filter(
+        WaitlistEntry.status == WaitlistStatus.OFFERED,
+        WaitlistEntry.offer_expires_at <= now
+    ).order_by(WaitlistEntry.offer_expires_at).limit(WAITLIST_EXPIRE_BATCH_SIZE).all()
+    
+    for entry in expired:
+        _release_offer(db, entry, WaitlistStatus.EXPIRED)
+    
+    # Дата прошла во всех поясах - ждать больше нечего
+    db.execute(
+        update(WaitlistEntry)
+        .where(
+            WaitlistEntry.date < (now - MAX_UTC_OFFSET).date(),
+            WaitlistEntry.status.in_([WaitlistStatus.WAITING, WaitlistStatus.OFFERED])
+        )
+        .values(status=WaitlistStatus.EXPIRED)
+        .execution_options(synchronize_session=False)
+    )
+    
+    return len(expired)
+
+
+async def process_waitlist(bot: Bot, db_func):
+    """Периодическая обработка листа ожидания"""
+    from bot.utils.leases import try_acquire_leadership
+    from bot.utils.outbox import kick_outbox
+    
+    db = db_func() if callable(db_func) else db_func
+    
+    try:
+        if LEADER_ELECTION and not try_acquire_leadership(
+            db, "process_waitlist", ttl_seconds=WAITLIST_INTERVAL_MINUTES * 60 * 2
+        ):
+            return
+        
+        expired = expire_offers(db)
+        db.commit()
+        
+        if expired:
+            kick_outbox()
+            logger.info(f"Лист ожидания: снято истекших предложений: {expired}")
+    except Exception as e:
+        logger.error(f"Ошибка обработки листа ожидания: {e}")
+        db.rollback()
+    finally:
+        db.close()
@@ -0,0 +1,120 @@
+"""
+Бенчмарк расчета свободного времени на день: битовые маски против перебора
+
+Сравнивает прежний перебор datetime-слотов (цикл по стартам с проверкой
+каждой записи дня) с расчетом на масках 5-минутных квантов из
+bot.utils.availability. Обе реализации считают старты в памяти по одним и
+тем же рабочему окну и записям, результаты сверяются.
+
+Записи расширяются на буферы до и после, как в busy_intervals; замер
+повторяется для каждого шага стартов из --steps (по умолчанию 30, 15 и 5
+минут), чтобы видеть стоимость мелкой сетки.
+
+Запуск из корня репозитория:
+
+    python -m scripts.bench_availability --bookings 20 --steps 30 5 --buffer-after 10
+"""
+import argparse
+import os
+import random
+import timeit
+from datetime import date, datetime, time, timedelta
+from typing import List, Tuple
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from bot.utils.availability import (  # noqa: E402 - BOT_TOKEN нужен до импорта bot
+    QUANTUM_MINUTES, fit_mask, interval_to_mask, iter_quanta, minutes_to_mask, quantum_to_time, step_mask
+)
+
+DAY = date(2030, 1, 7)
+WORK_START = time(8, 0)
+WORK_END = time(22, 0)
+
+
+def make_bookings(count: int, seed: int = 1) -> List[Tuple[datetime, datetime]]:
+    """Непересекающиеся записи внутри рабочего окна, каждая занимает до половины своего отрезка"""
+    rng = random.Random(seed)
+    day_start = datetime.combine(DAY, WORK_START)
+    work_minutes = (WORK_END.hour - WORK_START.hour) * 60
+    slot_minutes = max(work_minutes // max(count, 1), QUANTUM_MINUTES)
+    bookings = []
+    for index in range(count):
+        start = day_start + timedelta(minutes=index * slot_minutes)
+        length = rng.choice(range(QUANTUM_MINUTES, max(slot_minutes // 2, QUANTUM_MINUTES) + 1, QUANTUM_MINUTES))
+        bookings.append((start, start + timedelta(minutes=length)))
+    return bookings
+
+
+def with_buffers(bookings, before_minutes: int, after_minutes: int) -> List[Tuple[datetime, datetime]]:
+    """Интервалы записей вместе с буферами"""
+    before = timedelta(minutes=before_minutes)
+    after = timedelta(minutes=after_minutes)
+    return [(start - before, end + after) for start, end in bookings]
+
+
+def loop_starts(bookings, duration_minutes: int, step_minutes: int) -> List[datetime]:
+    """Прежний алгоритм: перебор стартов с проверкой пересечения с каждой записью"""
+    starts = []
+    current_time = datetime.combine(DAY, WORK_START)
+    end_time = datetime.combine(DAY, WORK_END)
+    while current_time < end_time:
+        slot_end = current_time + timedelta(minutes=duration_minutes)
+        if slot_end > end_time:
+            break
+        if all(not (current_time < booked_end and slot_end > booked_start) for booked_start, booked_end in bookings):
+            starts.append(current_time)
+        current_time += timedelta(minutes=step_minutes)
+    return starts
+
+
+def mask_starts(bookings, duration_minutes: int, step_minutes: int) -> int:
+    """Расчет на масках, как в get_available_start_mask"""
+    first_quantum = (WORK_START.hour * 60 + WORK_START.minute) // QUANTUM_MINUTES
+    last_quantum = (WORK_END.hour * 60 + WORK_END.minute) // QUANTUM_MINUTES
+    work_mask = minutes_to_mask(WORK_START.hour * 60, WORK_END.hour * 60, inner=True)
+    busy_mask = 0
+    for booked_start, booked_end in bookings:
+        busy_mask |= interval_to_mask(DAY, booked_start, booked_end)
+    duration_quanta = -(-duration_minutes // QUANTUM_MINUTES)
+    start_mask = fit_mask(work_mask & ~busy_mask, duration_quanta)
+    return start_mask & step_mask(first_quantum, last_quantum, max(step_minutes // QUANTUM_MINUTES, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--bookings", type=int, default=20, help="записей за день")
+    parser.add_argument("--duration", type=int, default=60, help="длительность услуги, мин")
+    parser.add_argument("--steps", type=int, nargs="+", default=[30, 15, 5], help="шаги стартов, мин")
+    parser.add_argument("--buffer-before", type=int, default=0, help="буфер до записи, мин")
+    parser.add_argument("--buffer-after", type=int, default=0, help="буфер после записи, мин")
+    parser.add_argument("--repeat", type=int, default=2000, help="повторов замера")
+    args = parser.parse_args()
+    
+    bookings = with_buffers(make_bookings(args.bookings), args.buffer_before, args.buffer_after)
+    print(
+        f"Записей: {args.bookings}, услуга {args.duration} мин, "
+        f"буферы {args.buffer_before}/{args.buffer_after} мин"
+    )
+    
+    for step in args.steps:
+        expected = loop_starts(bookings, args.duration, step)
+        actual = [datetime.combine(DAY, quantum_to_time(q)) for q in iter_quanta(mask_starts(bookings, args.duration, step))]
+        assert actual == expected, f"маски и перебор дали разные старты (шаг {step} мин)"
+        
+        loop_seconds = min(timeit.repeat(
+            lambda: loop_starts(bookings, args.duration, step), number=args.repeat, repeat=3
+        ))
+        mask_seconds = min(timeit.repeat(
+            lambda: mask_starts(bookings, args.duration, step), number=args.repeat, repeat=3
+        ))
+        
+        print(
+            f"Шаг {step} мин, стартов {len(expected)}: "
+            f"перебор {loop_seconds / args.repeat * 1e6:.1f} мкс, "
+            f"маски {mask_seconds / args.repeat * 1e6:.1f} мкс на день ({loop_seconds / mask_seconds:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Бенчмарк рендера напоминаний: каталог i18n против прежних f-строк
+
+Строит --reminders записей в памяти (время начала разбросано по --days
+дням, язык клиента - ru/ky/en поровну) и замеряет:
+
+* прежний текст напоминания - f-строка с strftime для каждой записи;
+* build_reminder_message из bot.utils.notifications - шаблон каталога и
+  format_datetime с кэшем готовых строк даты и времени; отдельно с пустым
+  кэшем (первая пачка после запуска) и с заполненным.
+
+Выводится время на всю пачку и на одно напоминание.
+
+Запуск из корня репозитория:
+
+    python -m scripts.bench_i18n --reminders 10000
+"""
+import argparse
+import os
+import random
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from bot.utils.i18n import LANGUAGES, format_datetime  # noqa: E402 - BOT_TOKEN нужен до импорта bot
+from bot.utils.notifications import build_reminder_message  # noqa: E402
+
+
+def make_appointments(count: int, days: int, seed: int = 1):
+    """Записи с услугой и клиентом, как их видит build_reminder_message"""
+    rng = random.Random(seed)
+    languages = list(LANGUAGES)
+    start = datetime(2030, 1, 7, 9, 0)
+    services = [
+        SimpleNamespace(name=name, duration_minutes=duration)
+        for name, duration in (("Стрижка", 60), ("Маникюр", 90), ("Окрашивание волос", 120))
+    ]
+    return [
+        SimpleNamespace(
+            start_time=start + timedelta(days=rng.randrange(days), minutes=30 * rng.randrange(24)),
+            service=rng.choice(services),
+            client=SimpleNamespace(language=languages[index % len(languages)]),
+        )
+        for index in range(count)
+    ]
+
+
+def previous_reminder(appointment) -> str:
+    """Текст напоминания до каталога (только русский)"""
+    service = appointment.service
+    return (
+        f"🔔 Напоминание о записи\n\n"
+        f"📅 Дата и время: {appointment.start_time.strftime('%d.%m.%Y %H:%M')}\n"
+        f"🛠 Услуга: {service.name}\n"
+        f"⏱ Длительность: {service.duration_minutes} мин.\n\n"
+        f"Не забудьте о встрече!"
+    )
+
+
+def render_previous(appointments):
+    """Пачка напоминаний прежним кодом"""
+    for appointment in appointments:
+        previous_reminder(appointment)
+
+
+def render_catalog(appointments):
+    """Пачка напоминаний из каталога"""
+    for appointment in appointments:
+        build_reminder_message(appointment)
+
+
+def render_catalog_cold(appointments):
+    """Пачка напоминаний из каталога с пустым кэшем дат"""
+    format_datetime.cache_clear()
+    render_catalog(appointments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--reminders", type=int, default=10000, help="напоминаний в пачке")
+    parser.add_argument("--days", type=int, default=30, help="дней, по которым разбросаны записи")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов замера")
+    args = parser.parse_args()
+    
+    appointments = make_appointments(args.reminders, args.days)
+    print(f"Напоминаний: {args.reminders}, дней: {args.days}, языков: {len(LANGUAGES)}")
+    
+    for title, render in (
+        ("f-строки и strftime", render_previous),
+        ("каталог, пустой кэш дат", render_catalog_cold),
+        ("каталог, кэш дат заполнен", render_catalog),
+    ):
+        seconds = min(timeit.repeat(lambda render=render: render(appointments), number=1, repeat=args.repeat))
+        print(
+            f"{title:28} {seconds * 1000:7.1f} мс на пачку, "
+            f"{seconds / args.reminders * 1e6:5.2f} мкс на напоминание"
+        )
+
+
+if __name__ == "__main__":
+    main()
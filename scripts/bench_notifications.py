@@ -0,0 +1,127 @@
+"""
+Бенчмарк выборки готовых напоминаний при большой истории уведомлений
+
+Создает файл SQLite с --history отправленными уведомлениями и --pending
+неотправленными (часть из них уже пора отправлять) и замеряет запрос
+кандидатов, который выполняет claim_rows в process_pending_notifications:
+is_sent = false, scheduled_for <= now, свободная аренда, ORDER BY
+scheduled_for LIMIT NOTIFICATIONS_BATCH_SIZE.
+
+Замер выполняется с частичным индексом ix_notifications_pending_scheduled_for
+и без него; выводится план запроса SQLite.
+
+Запуск из корня репозитория:
+
+    python -m scripts.bench_notifications --history 1000000 --pending 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+INSERT_CHUNK = 50000
+
+
+def fill(db_path: str, history: int, pending: int):
+    """Схема и уведомления: история отправленных и очередь неотправленных"""
+    from sqlalchemy import create_engine, insert
+    from bot.models import Base, Notification, NotificationType
+    
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    table = Notification.__table__
+    now = datetime.utcnow()
+    
+    with engine.begin() as connection:
+        for offset in range(0, history, INSERT_CHUNK):
+            connection.execute(insert(table), [
+                {
+                    "appointment_id": index + 1,
+                    "notification_type": NotificationType.REMINDER,
+                    "scheduled_for": now - timedelta(minutes=index),
+                    "sent_at": now - timedelta(minutes=index),
+                    "is_sent": True,
+                    "created_at": now,
+                }
+                for index in range(offset, min(offset + INSERT_CHUNK, history))
+            ])
+        
+        # Половина очереди уже должна быть отправлена, половина - в будущем
+        connection.execute(insert(table), [
+            {
+                "appointment_id": history + index + 1,
+                "notification_type": NotificationType.REMINDER,
+                "scheduled_for": now + timedelta(minutes=index - pending // 2),
+                "is_sent": False,
+                "created_at": now,
+            }
+            for index in range(pending)
+        ])
+    
+    return engine
+
+
+def due_query(db):
+    """Запрос кандидатов claim_rows для напоминаний"""
+    from sqlalchemy import or_
+    from bot.models import Notification
+    from bot.utils.notifications import NOTIFICATIONS_BATCH_SIZE
+    
+    now = datetime.utcnow()
+    return db.query(Notification.id).filter(
+        Notification.is_sent == False,
+        Notification.scheduled_for <= now,
+        or_(Notification.lease_until.is_(None), Notification.lease_until < now)
+    ).order_by(Notification.scheduled_for).limit(NOTIFICATIONS_BATCH_SIZE)
+
+
+def measure(engine, repeat: int):
+    """План запроса, число строк и время одного выполнения в мс"""
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+    
+    with Session(bind=engine) as db:
+        query = due_query(db)
+        compiled = query.statement.compile(engine, compile_kwargs={"literal_binds": True})
+        plan = [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+        rows = len(query.all())
+        seconds = min(timeit.repeat(lambda: due_query(db).all(), number=repeat, repeat=3))
+    return plan, rows, seconds / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--history", type=int, default=1000000, help="отправленных уведомлений")
+    parser.add_argument("--pending", type=int, default=2000, help="неотправленных уведомлений")
+    parser.add_argument("--repeat", type=int, default=20, help="повторов замера")
+    args = parser.parse_args()
+    
+    from sqlalchemy import text
+    
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        engine = fill(os.path.join(directory, "notifications.db"), args.history, args.pending)
+        print(f"История: {args.history}, очередь: {args.pending}, "
+              f"заполнение за {time.perf_counter() - started:.1f} с")
+        
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+        plan, rows, indexed_ms = measure(engine, args.repeat)
+        print(f"С частичным индексом: {indexed_ms:.3f} мс, строк {rows}; план: {'; '.join(plan)}")
+        
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_notifications_pending_scheduled_for"))
+            connection.execute(text("ANALYZE"))
+        plan, rows, full_ms = measure(engine, args.repeat)
+        print(f"Без индекса:          {full_ms:.3f} мс, строк {rows}; план: {'; '.join(plan)}")
+        
+        print(f"Ускорение: {full_ms / indexed_ms:.0f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
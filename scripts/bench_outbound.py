@@ -0,0 +1,218 @@
+"""
+Нагрузочный тест исходящих запросов: задержка ответов пользователям во время рассылки
+
+Поднимает локальную заглушку Bot API (HTTP/1.1 с keep-alive, каждый ответ
+через --latency-ms) и направляет в нее ботов так же, как main.py:
+application.bot с пулом interactive и bulk_bot с пулом bulk, оба через
+OutboundRateLimiter и общую очередь bot.utils.outbound.
+
+Ответы пользователям идут потоком --interactive-rate в секунду, замеряется
+полное время вызова send_message (ожидание в очереди и HTTP). Сценарии:
+
+* без рассылки - базовая задержка;
+* рассылка - bulk_bot отправляет --broadcast сообщений классом broadcast,
+  --concurrency одновременно, как диспетчер outbox;
+* рассылка через один пул и один класс - как до разделения пулов и
+  приоритетов, для сравнения.
+
+Выводятся p50/p99 ответов, скорость рассылки и метрики пулов. Скрипт
+завершается с ошибкой, если p99 во время рассылки выше --target-ms.
+
+Запуск из корня репозитория:
+
+    python -m scripts.bench_outbound --duration 20 --broadcast 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from bot.utils.outbox import OUTBOX_SEND_CONCURRENCY  # noqa: E402 - BOT_TOKEN нужен до импорта bot
+
+TOKEN = "0:bench"
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+def _message(chat_id: int) -> dict:
+    """Минимальный объект Message для ответа send_message"""
+    return {"message_id": 1, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+
+
+async def serve_stub_api(latency: float):
+    """Заглушка Bot API: getMe и отправка сообщений, ответ через latency секунд"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length:
+                    await reader.readexactly(length)
+                
+                method = request_line.split()[1].decode().rsplit("/", 1)[-1]
+                result = BOT_USER if method == "getMe" else _message(0)
+                await asyncio.sleep(latency)
+                
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(payload) + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+    
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def run_interactive(bot, rate: float, duration: float, chat_base: int):
+    """Поток ответов пользователям; возвращает задержки в мс"""
+    latencies = []
+    
+    async def reply(chat_id: int):
+        started = time.perf_counter()
+        await bot.send_message(chat_id, "Запись подтверждена")
+        latencies.append((time.perf_counter() - started) * 1000)
+    
+    rng = random.Random(1)
+    tasks = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(reply(chat_base + rng.randrange(100))))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+async def run_broadcast(bot, messages: int, concurrency: int, priority: str, chat_base: int, sent: list):
+    """Рассылка по разным чатам с ограничением одновременных отправок"""
+    from bot.utils.outbound import priority_kwargs
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def send(chat_id: int):
+        async with semaphore:
+            await bot.send_message(chat_id, "Мастер опаздывает на 15 минут", **priority_kwargs(bot, priority))
+            sent.append(time.perf_counter())
+    
+    await asyncio.gather(*(send(chat_base + index) for index in range(messages)))
+
+
+def _percentile(samples, share: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * share), len(samples) - 1)]
+
+
+async def scenario(title: str, interactive_bot, bulk_bot, args, broadcast_priority, chat_base: int) -> float:
+    """Один сценарий; возвращает p99 ответов в мс"""
+    sent = []
+    broadcast = None
+    if bulk_bot is not None:
+        broadcast = asyncio.create_task(
+            run_broadcast(bulk_bot, args.broadcast, args.concurrency, broadcast_priority, chat_base + 1000, sent)
+        )
+        # Очередь рассылки успевает заполниться до первых ответов
+        await asyncio.sleep(0.5)
+    
+    started = time.perf_counter()
+    latencies = await run_interactive(interactive_bot, args.interactive_rate, args.duration, chat_base)
+    elapsed = time.perf_counter() - started
+    
+    line = (
+        f"{title:38} ответов {len(latencies):4}: p50 {_percentile(latencies, 0.5):7.1f} мс, "
+        f"p99 {_percentile(latencies, 0.99):7.1f} мс"
+    )
+    if broadcast is not None:
+        rate = sum(1 for moment in sent if moment >= started) / elapsed
+        line += f"; рассылка {rate:.1f} сообщ./с"
+        broadcast.cancel()
+        await asyncio.gather(broadcast, return_exceptions=True)
+    print(line)
+    return _percentile(latencies, 0.99)
+
+
+async def main_async(args):
+    from telegram.ext import ExtBot
+    from bot.utils.http_pools import build_request, get_pool_metrics
+    from bot.utils.outbound import (
+        OUTBOUND_RATE_PER_SECOND, PRIORITY_BROADCAST, PRIORITY_INTERACTIVE, PRIORITY_REMINDER,
+        OutboundRateLimiter
+    )
+    
+    server = await serve_stub_api(args.latency_ms / 1000)
+    port = server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/bot"
+    
+    interactive_bot = ExtBot(
+        TOKEN, base_url=base_url, request=build_request("interactive"),
+        rate_limiter=OutboundRateLimiter(PRIORITY_INTERACTIVE)
+    )
+    bulk_bot = ExtBot(
+        TOKEN, base_url=base_url, request=build_request("bulk"),
+        rate_limiter=OutboundRateLimiter(PRIORITY_REMINDER)
+    )
+    await interactive_bot.initialize()
+    await bulk_bot.initialize()
+    
+    print(
+        f"Лимит {OUTBOUND_RATE_PER_SECOND} запросов/с, ответов {args.interactive_rate}/с, "
+        f"заглушка API {args.latency_ms:.0f} мс, рассылка {args.broadcast} сообщений по {args.concurrency}"
+    )
+    
+    try:
+        await scenario("Без рассылки", interactive_bot, None, args, None, 100000)
+        p99 = await scenario("Рассылка", interactive_bot, bulk_bot, args, PRIORITY_BROADCAST, 200000)
+        await scenario(
+            "Рассылка через один пул и один класс", interactive_bot, interactive_bot, args,
+            PRIORITY_INTERACTIVE, 300000
+        )
+        
+        for pool_name, snapshot in get_pool_metrics().items():
+            print(
+                f"HTTP-пул {pool_name}: запросов {snapshot['requests']}, ошибок {snapshot['errors']}, "
+                f"p50 {snapshot['p50_ms']:.0f} мс, p99 {snapshot['p99_ms']:.0f} мс"
+            )
+    finally:
+        await interactive_bot.shutdown()
+        await bulk_bot.shutdown()
+        server.close()
+        await server.wait_closed()
+    
+    return p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--duration", type=float, default=20.0, help="длительность сценария, с")
+    parser.add_argument("--interactive-rate", type=float, default=3.0, help="ответов пользователям в секунду")
+    parser.add_argument("--broadcast", type=int, default=1000, help="сообщений рассылки")
+    parser.add_argument(
+        "--concurrency", type=int, default=OUTBOX_SEND_CONCURRENCY, help="одновременных отправок рассылки"
+    )
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="задержка ответа заглушки API, мс")
+    parser.add_argument("--target-ms", type=float, default=500.0, help="цель по p99 ответов во время рассылки, мс")
+    args = parser.parse_args()
+    
+    p99 = asyncio.run(main_async(args))
+    print(f"p99 ответов во время рассылки: {p99:.1f} мс (цель {args.target_ms:.0f} мс)")
+    if p99 > args.target_ms:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
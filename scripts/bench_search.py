@@ -0,0 +1,181 @@
+"""
+Генератор данных и бенчмарк поиска мастеров (bot.utils.search)
+
+Создает файл SQLite с --masters мастерами по --services услуг у каждого
+(по умолчанию 10 000 x 10 = 100 000 услуг): названия и описания
+собираются из словаря салонных услуг и районов, чтобы частые и редкие
+слова встречались как в реальных данных. Индекс master_search создается
+и заполняется так же, как миграция migrate_master_search.
+
+Затем замеряется search_masters на наборе запросов (частое слово,
+префикс, два слова, редкое слово, вторая страница) и выводятся медиана,
+p95 и максимум. Цель - до 20 мс на запрос.
+
+Запуск из корня репозитория:
+
+    python -m scripts.bench_search --masters 10000 --services 10
+    python -m scripts.bench_search --db search.db --keep   # сохранить набор данных
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+SERVICE_WORDS = [
+    "стрижка", "окрашивание", "мелирование", "укладка", "маникюр", "педикюр", "покрытие",
+    "наращивание", "ресниц", "бровей", "массаж", "спины", "лица", "чистка", "пилинг",
+    "депиляция", "шугаринг", "барбер", "бороды", "детская", "мужская", "женская",
+    "кератин", "ботокс", "волос", "ногтей", "гель", "лак", "макияж", "вечерний",
+]
+
+DISTRICTS = [
+    "Центр", "Джал", "Асанбай", "Восток-5", "Аламедин", "Тунгуч", "Кок-Жар",
+    "Магистраль", "Учкун", "Арча-Бешик", "Ала-Тоо", "Карагачевая роща",
+]
+
+SALON_WORDS = ["Студия", "Салон", "Бьюти", "Мастерская", "Барбершоп", "Нейл-бар", "Лаборатория красоты"]
+
+QUERIES = [
+    "стрижка",
+    "ман",
+    "окрашивание волос",
+    "массаж спины",
+    "барбершоп джал",
+    "лаборатория красоты",
+    "кератин",
+    "наращивание ресниц центр",
+]
+
+
+def generate(db_path: str, masters: int, services_per_master: int, seed: int = 1):
+    """Набор данных: пользователи, профили мастеров, услуги и индекс поиска"""
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import Session
+    from bot.models import Base, MasterProfile, Service, User, UserRole
+    from bot.utils.search import create_search_index, rebuild_search_index
+    
+    rng = random.Random(seed)
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__), [
+            {"id": index + 1, "telegram_id": 1000000 + index, "full_name": f"Мастер {index}",
+             "role": UserRole.MASTER, "created_at": now}
+            for index in range(masters)
+        ])
+        connection.execute(insert(MasterProfile.__table__), [
+            {
+                "id": index + 1,
+                "user_id": index + 1,
+                "unique_link": f"master{index}",
+                "business_name": f"{rng.choice(SALON_WORDS)} {rng.choice(DISTRICTS)} {index}",
+                "description": " ".join(rng.sample(SERVICE_WORDS, 4)) + f", район {rng.choice(DISTRICTS)}",
+                "created_at": now,
+                "updated_at": now,
+            }
+            for index in range(masters)
+        ])
+        connection.execute(insert(Service.__table__), [
+            {
+                "master_id": master + 1,
+                "name": " ".join(rng.sample(SERVICE_WORDS, rng.randint(1, 3))).capitalize(),
+                "price": rng.randrange(300, 5000, 50),
+                "duration_minutes": rng.choice([15, 30, 45, 60, 90, 120]),
+                "is_active": rng.random() > 0.05,
+                "is_hidden": rng.random() < 0.05,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for master in range(masters)
+            for _ in range(services_per_master)
+        ])
+    
+    # Индекс создается после загрузки и заполняется одним проходом, как при миграции
+    with Session(bind=engine) as db:
+        create_search_index(db)
+        rebuild_search_index(db)
+        db.commit()
+    
+    return engine
+
+
+def measure(engine, repeat: int):
+    """Время запросов: (запрос, страница) -> список замеров в мс, число найденных"""
+    from sqlalchemy.orm import Session
+    from bot.utils.search import search_masters
+    
+    timings = {}
+    with Session(bind=engine) as db:
+        for query in QUERIES:
+            for page in (0, 1):
+                found, _ = search_masters(db, query, page=page)
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    search_masters(db, query, page=page)
+                    samples.append((time.perf_counter() - started) * 1000)
+                    # Профили из identity map сессии не должны ускорять следующий замер
+                    db.expunge_all()
+                timings[(query, page)] = (samples, len(found))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--masters", type=int, default=10000, help="мастеров")
+    parser.add_argument("--services", type=int, default=10, help="услуг у мастера")
+    parser.add_argument("--repeat", type=int, default=50, help="повторов каждого запроса")
+    parser.add_argument("--db", help="файл БД (по умолчанию временный)")
+    parser.add_argument("--keep", action="store_true", help="не удалять файл БД")
+    parser.add_argument("--target-ms", type=float, default=20.0, help="цель по p95, мс")
+    args = parser.parse_args()
+    
+    directory = None
+    db_path = args.db
+    if db_path is None:
+        directory = tempfile.mkdtemp()
+        db_path = os.path.join(directory, "search.db")
+    elif os.path.exists(db_path):
+        os.remove(db_path)
+    
+    started = time.perf_counter()
+    engine = generate(db_path, args.masters, args.services)
+    print(
+        f"Мастеров: {args.masters}, услуг: {args.masters * args.services}, "
+        f"генерация и индекс за {time.perf_counter() - started:.1f} с"
+    )
+    
+    all_samples = []
+    for (query, page), (samples, found) in measure(engine, args.repeat).items():
+        all_samples.extend(samples)
+        samples.sort()
+        print(
+            f"{query!r:30} стр. {page}: найдено {found:2}, медиана {statistics.median(samples):.2f} мс, "
+            f"p95 {samples[int(len(samples) * 0.95) - 1]:.2f} мс, максимум {samples[-1]:.2f} мс"
+        )
+    
+    all_samples.sort()
+    p95 = all_samples[int(len(all_samples) * 0.95) - 1]
+    print(f"Все запросы: p95 {p95:.2f} мс, максимум {all_samples[-1]:.2f} мс (цель {args.target_ms:.0f} мс)")
+    
+    engine.dispose()
+    if args.keep:
+        print(f"Набор данных сохранен: {db_path}")
+    else:
+        os.remove(db_path)
+        if directory:
+            os.rmdir(directory)
+    
+    if p95 > args.target_ms:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Бенчмарк многопроцессного режима: пропускная способность на 1/2/4/8 воркерах
+
+Повторяет путь обновления в bot.sharding без Telegram: процесс приема
+раскладывает обновления по очередям воркеров через shard_for_update и
+Update.to_dict, воркер восстанавливает Update.de_json и выполняет работу
+обработчика - расчет свободного времени на --days дней (прежний перебор
+слотов, см. scripts.bench_availability) и рендер текста из каталога i18n.
+
+Выводится число обновлений в секунду и ускорение относительно одного
+воркера. Ускорение ограничено числом ядер машины (os.cpu_count()).
+
+Запуск из корня репозитория:
+
+    python -m scripts.bench_sharding --updates 4000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from telegram import Chat, Message, Update, User  # noqa: E402 - BOT_TOKEN нужен до импорта bot
+
+from bot.sharding import SHARD_QUEUE_SIZE, shard_for_update  # noqa: E402
+from scripts.bench_availability import loop_starts, make_bookings  # noqa: E402
+
+CHATS = 5000
+
+
+def make_updates(count: int):
+    """Сообщения из CHATS разных личных чатов"""
+    updates = []
+    for index in range(count):
+        chat_id = 100000 + index % CHATS
+        updates.append(Update(
+            update_id=index + 1,
+            message=Message(
+                message_id=index + 1,
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=chat_id, type=Chat.PRIVATE),
+                from_user=User(id=chat_id, first_name="Client", is_bot=False),
+                text="/start",
+            ),
+        ))
+    return updates
+
+
+def handle(data: dict, days: int, bookings) -> int:
+    """Работа обработчика над одним обновлением"""
+    from bot.utils.i18n import format_datetime, t
+    
+    update = Update.de_json(data, None)
+    starts = 0
+    for _ in range(days):
+        starts += len(loop_starts(bookings, 60, 30))
+    t("appointment_new", "ru", when=format_datetime(update.message.date), service="Стрижка",
+      client=update.effective_user.first_name, phone_line="")
+    return starts
+
+
+def worker(queue, results, days: int, bookings_per_day: int):
+    """Процесс-воркер: обработка обновлений до None"""
+    import bot.utils.i18n  # noqa: F401 - импорт до начала замера
+    
+    bookings = make_bookings(bookings_per_day)
+    results.put("ready")
+    handled = 0
+    while True:
+        data = queue.get()
+        if data is None:
+            break
+        handle(data, days, bookings)
+        handled += 1
+    results.put(handled)
+
+
+def run(updates, workers: int, days: int, bookings_per_day: int) -> float:
+    """Прогон на заданном числе воркеров; возвращает время в секундах"""
+    import multiprocessing
+    
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(workers)]
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(queue, results, days, bookings_per_day))
+        for queue in queues
+    ]
+    for process in processes:
+        process.start()
+    
+    # Замер начинается, когда все воркеры запущены и импортировали модули
+    for _ in processes:
+        results.get()
+    
+    started = time.perf_counter()
+    for update in updates:
+        queues[shard_for_update(update, workers)].put(update.to_dict())
+    for queue in queues:
+        queue.put(None)
+    handled = sum(results.get() for _ in processes)
+    elapsed = time.perf_counter() - started
+    
+    for process in processes:
+        process.join()
+    
+    assert handled == len(updates), "обработаны не все обновления"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--updates", type=int, default=4000, help="обновлений за прогон")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="числа воркеров")
+    parser.add_argument("--days", type=int, default=7, help="дней расчета свободного времени на обновление")
+    parser.add_argument("--bookings", type=int, default=20, help="записей за день")
+    args = parser.parse_args()
+    
+    updates = make_updates(args.updates)
+    print(f"Ядер: {os.cpu_count()}, обновлений: {args.updates}, дней на обновление: {args.days}")
+    
+    baseline = None
+    for workers in args.workers:
+        elapsed = run(updates, workers, args.days, args.bookings)
+        rate = args.updates / elapsed
+        baseline = baseline or rate
+        print(f"Воркеров: {workers}: {rate:,.0f} обновлений/с ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Проверка планировщика исходящих запросов и отправки outbox по приоритетам
+
+Без обращения к Telegram проверяет:
+
+* WFQ: запросы четырех классов, поставленные одновременно (рассылка
+  первой), выходят из очереди по весам - интерактивные в начале, доли
+  классов в первой сотне близки к PRIORITY_WEIGHTS;
+* интервал чата: фоновые сообщения в один чат разведены на
+  chat_interval, интерактивный ответ в тот же чат не ждет;
+* process_outbox: оплата и предложение листа ожидания, поставленные после
+  рассылки, уходят первыми; пачка отправляется одновременно; сообщения в
+  занятый чат откладываются, а не задерживают пачку.
+
+Запуск из корня репозитория:
+
+    python -m scripts.check_outbound
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+
+def _setup_env(db_path: str):
+    """Окружение: отдельный файл БД, фиктивный токен"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("BOT_TOKEN", "0:check")
+
+
+async def check_wfq(errors: list):
+    """Порядок выдачи разрешений при конкуренции классов"""
+    from bot.utils.outbound import (
+        PRIORITY_BROADCAST, PRIORITY_INTERACTIVE, PRIORITY_PAYMENT, PRIORITY_REMINDER, PRIORITY_WEIGHTS,
+        OutboundScheduler
+    )
+    
+    scheduler = OutboundScheduler(rate_per_second=1000, burst=1, chat_interval=0)
+    # Запас на всплеск израсходован - все следующие запросы встают в очередь
+    await scheduler.acquire(PRIORITY_BROADCAST)
+    
+    order = []
+    
+    async def request(priority: str):
+        await scheduler.acquire(priority)
+        order.append(priority)
+    
+    counts = {PRIORITY_BROADCAST: 200, PRIORITY_REMINDER: 100, PRIORITY_PAYMENT: 40, PRIORITY_INTERACTIVE: 20}
+    await asyncio.gather(*(request(priority) for priority, count in counts.items() for _ in range(count)))
+    
+    last_position = {priority: max(i for i, granted in enumerate(order) if granted == priority) for priority in counts}
+    first = Counter(order[:100])
+    print(
+        "WFQ: последний запрос класса на позиции "
+        + ", ".join(f"{priority} {last_position[priority] + 1}" for priority in counts)
+    )
+    print(
+        "WFQ: доли в первых 100 - "
+        + ", ".join(f"{priority} {first[priority]} (вес {PRIORITY_WEIGHTS[priority]})" for priority in counts)
+    )
+    
+    if last_position[PRIORITY_INTERACTIVE] >= 40:
+        errors.append(f"интерактивные запросы выходят поздно: до позиции {last_position[PRIORITY_INTERACTIVE] + 1}")
+    if not first[PRIORITY_PAYMENT] > first[PRIORITY_REMINDER] > first[PRIORITY_BROADCAST] > 0:
+        errors.append(f"доли классов не соответствуют весам: {dict(first)}")
+
+
+async def check_chat_interval(errors: list):
+    """Интервал между фоновыми сообщениями в один чат"""
+    from bot.utils.outbound import PRIORITY_INTERACTIVE, PRIORITY_REMINDER, OutboundScheduler
+    
+    interval = 0.2
+    scheduler = OutboundScheduler(rate_per_second=1000, burst=10, chat_interval=interval)
+    
+    granted = []
+    for _ in range(4):
+        await scheduler.acquire(PRIORITY_REMINDER, chat_id=1)
+        granted.append(time.monotonic())
+    gaps = [later - earlier for earlier, later in zip(granted, granted[1:])]
+    
+    started = time.monotonic()
+    await scheduler.acquire(PRIORITY_INTERACTIVE, chat_id=1)
+    interactive_wait = time.monotonic() - started
+    
+    print(
+        f"Чат: интервалы фоновых сообщений {', '.join(f'{gap:.3f}' for gap in gaps)} с, "
+        f"ожидание ответа {interactive_wait * 1000:.1f} мс, chat_delay {scheduler.chat_delay(1):.2f} с"
+    )
+    
+    if min(gaps) < interval * 0.9:
+        errors.append(f"фоновые сообщения в чат чаще интервала: {gaps}")
+    if interactive_wait > interval / 2:
+        errors.append(f"интерактивный ответ ждал интервала чата: {interactive_wait:.3f} с")
+    if scheduler.chat_delay(1) <= 0:
+        errors.append("chat_delay не учитывает занятый чат")
+
+
+class RecordingBot:
+    """Бот без сети: отправка проходит через OutboundRateLimiter и записывается"""
+    
+    def __init__(self, latency: float):
+        from bot.utils.outbound import PRIORITY_REMINDER, OutboundRateLimiter
+        
+        self.rate_limiter = OutboundRateLimiter(PRIORITY_REMINDER)
+        self.latency = latency
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def _deliver(self, chat_id: int, text: str):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        self.sent.append((text, chat_id, time.monotonic()))
+    
+    async def send_message(self, chat_id: int, text: str, reply_markup=None, rate_limit_args=None):
+        return await self.rate_limiter.process_request(
+            self._deliver, (chat_id, text), {}, "sendMessage", {"chat_id": chat_id}, rate_limit_args
+        )
+
+
+async def check_process_outbox(errors: list, broadcast: int):
+    """Отправка outbox: приоритет при выборке, одновременная отправка, занятые чаты"""
+    from bot.database import SessionLocal, init_db
+    from bot.models import OutboxMessage
+    from bot.utils.outbound import get_scheduler
+    from bot.utils.outbox import enqueue_message, process_outbox
+    
+    init_db()
+    db = SessionLocal()
+    try:
+        # Рассылка поставлена раньше всего остального
+        for index in range(broadcast):
+            enqueue_message(db, 100000 + index, "broadcast", kind="broadcast")
+        for index in range(3):
+            enqueue_message(db, 7, "appointment", kind="appointment")
+        enqueue_message(db, 5, "payment", kind="payment")
+        enqueue_message(db, 6, "waitlist", kind="waitlist")
+        db.commit()
+    finally:
+        db.close()
+    
+    bot = RecordingBot(latency=0.04)
+    started = time.monotonic()
+    first_pass = await process_outbox(bot, SessionLocal)
+    first_pass_seconds = time.monotonic() - started
+    
+    # Отложенное сообщение сохраняет next_attempt_at и после отправки
+    db = SessionLocal()
+    try:
+        deferred = db.query(OutboxMessage).filter(
+            OutboxMessage.chat_id == 7,
+            OutboxMessage.next_attempt_at.isnot(None)
+        ).count()
+    finally:
+        db.close()
+    
+    # Отложенные сообщения уходят следующими проходами диспетчера
+    for _ in range(5):
+        await asyncio.sleep(get_scheduler().chat_interval)
+        await process_outbox(bot, SessionLocal)
+    
+    order = [text for text, _, _ in bot.sent]
+    chat_times = [moment for _, chat_id, moment in bot.sent if chat_id == 7]
+    chat_gaps = [later - earlier for earlier, later in zip(chat_times, chat_times[1:])]
+    
+    print(
+        f"Outbox: первый проход {first_pass} сообщений за {first_pass_seconds:.2f} с, "
+        f"одновременно до {bot.max_in_flight}, отложено {deferred}"
+    )
+    print(
+        f"Outbox: позиции - payment {order.index('payment') + 1}, waitlist {order.index('waitlist') + 1}, "
+        f"первое appointment {order.index('appointment') + 1}, всего {len(order)}; "
+        f"интервалы в один чат {', '.join(f'{gap:.2f}' for gap in chat_gaps)} с"
+    )
+    
+    if len(order) != broadcast + 5:
+        errors.append(f"отправлено {len(order)} из {broadcast + 5}")
+    if max(order.index("payment"), order.index("waitlist")) >= 5:
+        errors.append("оплата и лист ожидания не обогнали рассылку")
+    if bot.max_in_flight < 2:
+        errors.append("пачка outbox отправляется последовательно")
+    if deferred != 2:
+        errors.append(f"в занятый чат отложено {deferred} сообщений вместо 2")
+    if chat_gaps and min(chat_gaps) < get_scheduler().chat_interval * 0.9:
+        errors.append(f"сообщения в один чат чаще интервала: {chat_gaps}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--broadcast", type=int, default=60, help="сообщений рассылки в outbox")
+    args = parser.parse_args()
+    
+    errors = []
+    with tempfile.TemporaryDirectory() as directory:
+        _setup_env(os.path.join(directory, "outbound.db"))
+        asyncio.run(check_wfq(errors))
+        asyncio.run(check_chat_interval(errors))
+        asyncio.run(check_process_outbox(errors, args.broadcast))
+        
+        from bot.database import engine
+        engine.dispose()
+    
+    if errors:
+        print("ОШИБКА: " + "; ".join(errors))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Проверка аренды строк несколькими экземплярами бота на одной локальной БД
+
+Создает файл SQLite, ставит в outbox --messages сообщений и запускает
+--workers процессов. Каждый процесс со своим WORKER_ID одновременно
+пытается стать лидером и разбирает outbox пачками через claim_rows, как
+process_outbox, помечая сообщения отправленными без обращения к Telegram.
+
+Проверяется, что каждое сообщение взято ровно одним экземпляром, все
+сообщения обработаны, работа распределилась (хотя бы два экземпляра
+взяли не меньше четверти равной доли) и лидер при одновременном захвате
+ровно один.
+
+Запуск из корня репозитория:
+
+    python -m scripts.check_workers --workers 4 --messages 2000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BATCH_SIZE = 20
+
+
+def _setup_env(db_path: str):
+    """Окружение процесса: отдельный файл БД, фиктивный токен"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("BOT_TOKEN", "0:check")
+
+
+def prepare(db_path: str, messages: int):
+    """Схема и сообщения outbox"""
+    _setup_env(db_path)
+    from bot.database import SessionLocal, init_db
+    from bot.utils.outbox import enqueue_message
+    
+    init_db()
+    db = SessionLocal()
+    try:
+        for index in range(messages):
+            enqueue_message(db, chat_id=index, text=f"message {index}", dedup_key=f"check:{index}")
+        db.commit()
+    finally:
+        db.close()
+
+
+def worker(db_path: str, number: int, barrier, results):
+    """Экземпляр бота: захват лидерства и разбор outbox"""
+    _setup_env(db_path)
+    from datetime import datetime
+    from sqlalchemy import or_
+    from bot.database import SessionLocal
+    from bot.models import OutboxMessage, OutboxStatus
+    from bot.utils.leases import claim_rows, release_row, try_acquire_leadership
+    
+    worker_id = f"check-worker-{number}"
+    db = SessionLocal()
+    claimed = []
+    
+    try:
+        barrier.wait()
+        leader = try_acquire_leadership(db, "check_workers", ttl_seconds=600, worker_id=worker_id)
+        
+        while True:
+            batch = claim_rows(
+                db,
+                OutboxMessage,
+                [
+                    OutboxMessage.status == OutboxStatus.PENDING,
+                    or_(OutboxMessage.next_attempt_at.is_(None), OutboxMessage.next_attempt_at <= datetime.utcnow())
+                ],
+                OutboxMessage.id,
+                BATCH_SIZE,
+                worker_id=worker_id
+            )
+            if not batch:
+                break
+            
+            for message in batch:
+                message.status = OutboxStatus.SENT
+                message.sent_at = datetime.utcnow()
+                release_row(message)
+                claimed.append(message.id)
+            db.commit()
+    finally:
+        db.close()
+    
+    results.put((number, leader, claimed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=4, help="количество процессов")
+    parser.add_argument("--messages", type=int, default=2000, help="сообщений в outbox")
+    args = parser.parse_args()
+    
+    # Процессы запускаются начисто, чтобы DATABASE_URL был задан до импорта bot
+    context = multiprocessing.get_context("spawn")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "workers.db")
+        prepare(db_path, args.messages)
+        
+        barrier = context.Barrier(args.workers)
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(db_path, number, barrier, results))
+            for number in range(args.workers)
+        ]
+        
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        reports = [results.get(timeout=300) for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        
+        from bot.database import SessionLocal
+        from bot.models import OutboxMessage, OutboxStatus
+        db = SessionLocal()
+        try:
+            pending = db.query(OutboxMessage).filter(OutboxMessage.status != OutboxStatus.SENT).count()
+        finally:
+            db.close()
+    
+    claims = Counter(message_id for _, _, claimed in reports for message_id in claimed)
+    duplicates = sorted(message_id for message_id, count in claims.items() if count > 1)
+    leaders = [number for number, leader, _ in reports if leader]
+    # Экземпляр считается работавшим, если взял хотя бы четверть равной доли
+    working = [number for number, _, claimed in reports if len(claimed) * args.workers * 4 >= args.messages]
+    
+    for number, leader, claimed in sorted(reports):
+        print(f"Экземпляр {number}: {len(claimed)} сообщений{' (лидер)' if leader else ''}")
+    print(f"Всего: {len(claims)} из {args.messages} за {elapsed:.2f} с")
+    
+    errors = []
+    if duplicates:
+        errors.append(f"сообщения взяты повторно: {duplicates[:10]}")
+    if pending or len(claims) != args.messages:
+        errors.append(f"не обработано сообщений: {args.messages - len(claims)}")
+    if args.workers > 1 and len(working) < 2:
+        errors.append(f"сообщения разобрал один экземпляр: {working}")
+    if len(leaders) != 1:
+        errors.append(f"лидеров: {len(leaders)}")
+    
+    if errors:
+        print("ОШИБКА: " + "; ".join(errors))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()